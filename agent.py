@@ -3,10 +3,33 @@ import subprocess
 import os
 import sys
 import logging
-from datetime import datetime, timedelta
-from openai import OpenAI
+import time
+import asyncio
+import atexit
+import threading
+from concurrent.futures import CancelledError
+from datetime import datetime
+from openai import OpenAI, AsyncOpenAI
 import config
 from snapshot_manager import SnapshotManager
+import docker_api
+from sandbox_executor import SandboxExecutor
+from sandbox_pool import SandboxPool
+from job_manager import JobManager
+from skill_zygote import SkillZygote
+from command_cache import CommandCache
+from context_builder import ContextBuilder, file_fingerprint
+from memory_index import MemoryIndex, format_entries
+from skill_index import SkillIndex
+from working_memory import WorkingMemoryJournal
+from memory_store import MemoryStore
+from memory_distiller import MemoryDistiller
+from session_summarizer import SessionSummarizer
+from token_counter import count_tokens, TokenLedger
+from python_kernel import PythonKernel
+from feedback_compactor import FeedbackCompactor
+from execution_scheduler import ExecutionScheduler, SpeculativeDispatcher, block_title
+from turn_engine import TurnEngine, ConsoleRenderer
 
 # 配置运行时日志
 logging.basicConfig(
@@ -19,7 +42,11 @@ logging.basicConfig(
 logger = logging.getLogger("AliceAgent")
 
 class AliceAgent:
-    def __init__(self, model_name=None, prompt_path=None):
+    def __init__(self, model_name=None, prompt_path=None, deferred_startup=False):
+        """
+        deferred_startup: 为 True 时不在构造阶段检查 Docker 环境与提炼记忆，
+                          由调用方随后调用 start_background() 在后台线程中完成 (TUI 桥接层使用)
+        """
         logger.info(f"正在初始化 AliceAgent (模型: {model_name or config.MODEL_NAME})")
         self.model_name = model_name or config.MODEL_NAME
         self.prompt_path = prompt_path or config.DEFAULT_PROMPT_PATH
@@ -31,7 +58,16 @@ class AliceAgent:
             base_url=config.BASE_URL,
             api_key=config.API_KEY
         )
+        # 对话主循环使用的异步客户端 (见 turn_engine.py)
+        self.async_client = AsyncOpenAI(
+            base_url=config.BASE_URL,
+            api_key=config.API_KEY
+        )
+        self._console_loop = None # 控制台模式复用同一个事件循环，保证异步客户端的连接池可以复用
         self.messages = []
+        # 上下文刷新会整体替换 self.messages；被中断回合的刷新线程无法取消，
+        # 下一回合开始前须经由此锁等待其结束 (见 refresh_context_if_stale)
+        self._context_lock = threading.RLock()
         
         # 权限与路径安全
         self.project_root = os.getcwd() 
@@ -39,88 +75,362 @@ class AliceAgent:
         # 容器执行引擎配置 (常驻容器模式)
         self.docker_image = "alice-sandbox:latest"
         self.container_name = "alice-sandbox-instance"
-        self._ensure_docker_environment()
+        # 沙盒就绪事件：代码块只有在真正需要容器时才等待它
+        self.sandbox_ready = threading.Event()
+        self.sandbox_error = None
+        self.sandbox_pool = None # 启用容器池时 (SANDBOX_POOL_SIZE > 0) 的池与本会话的租约
+        self.sandbox_lease = None
+        # Docker Engine API 客户端 (Socket 不可用时为 None，回退到 docker CLI)
+        self.docker_api = docker_api.connect() if config.DOCKER_API_ENABLED else None
+        self.executor = SandboxExecutor(self.container_name, use_daemon=config.EXEC_DAEMON_ENABLED, api=self.docker_api)
+        # 可选的持久化 Python 内核 (首次执行 python 代码块时才真正启动)
+        self.kernel = None
+        if config.PYTHON_KERNEL_ENABLED:
+            self.kernel = PythonKernel(self.container_name, self.executor, memory_limit_mb=config.PYTHON_KERNEL_MEMORY_MB)
         
+        # 可选的技能预热进程 (沙盒就绪后启动)：技能脚本 fork 自预先导入了重量级模块的进程
+        self.skill_zygote = None
+        if config.SKILL_ZYGOTE_ENABLED:
+            self.skill_zygote = SkillZygote(self.executor, config.SKILL_ZYGOTE_PRELOAD.split(","))
+
+        # 只读命令的结果缓存 (按挂载目录中文件的 mtime/size 校验)
+        self.command_cache = None
+        if config.COMMAND_CACHE_MAX_BYTES > 0:
+            self.command_cache = CommandCache(
+                mounts={
+                    "skills": os.path.join(self.project_root, "skills"),
+                    "alice_output": os.path.abspath(config.ALICE_OUTPUT_DIR),
+                },
+                max_bytes=config.COMMAND_CACHE_MAX_BYTES
+            )
+
+        # 后台任务 (background 标注的代码块)：每个任务独占一条逐次 exec 通道，不受回合中断影响
+        self.job_manager = JobManager(
+            self._new_job_executor,
+            log_dir=os.path.join(config.ALICE_OUTPUT_DIR, "jobs"),
+            timeout=config.JOB_TIMEOUT or None,
+            on_finish=self._on_job_finished
+        )
+        atexit.register(self.job_manager.cancel_all)
+
+        # 代码块调度器 (默认串行，parallel 标注的块并发执行)
+        self.scheduler = ExecutionScheduler(self._run_block, max_workers=config.PARALLEL_MAX_WORKERS)
+
+        # 工具反馈压缩器
+        self.feedback_compactor = FeedbackCompactor(
+            round_budget=config.FEEDBACK_TOKEN_BUDGET,
+            spill_dir=os.path.join(config.ALICE_OUTPUT_DIR, "feedback")
+        )
+
         # 内存快照管理器
-        self.snapshot_mgr = SnapshotManager()
+        self.snapshot_mgr = SnapshotManager(
+            use_inotify=config.SNAPSHOT_INOTIFY,
+            cache_path=os.path.join(self.project_root, ".alice_cache", "skills.json")
+        )
+        self.skill_index = SkillIndex(
+            embed=(lambda texts: self._embed_texts(texts, config.SKILL_EMBEDDING_MODEL)) if config.SKILL_EMBEDDING_MODEL else None,
+            embedding_path=os.path.join(self.project_root, ".alice_cache", "skill_embeddings.json")
+        )
+        self.skill_ranking_active = False # 技能较多时按当前输入只注入相关技能
+        self.skill_context = ""
+        # 上下文构建器：各组件按文件指纹缓存，工具循环中只重建发生变化的部分
+        self.context_builder = ContextBuilder()
+        # 前缀缓存布局 (PROMPT_CACHE_LAYOUT) 的状态：末尾实时状态消息，以及前缀中冻结的索引快照
+        self.volatile_context = None
+        self._stable_key = None
+        self._stable_index_text = ""
+        # 记忆检索索引：记忆超出注入预算时按当前用户输入检索相关条目
+        self.memory_index = MemoryIndex(
+            {"ltm": self.memory_path, "stm": self.stm_path},
+            embed=self._embed_texts if config.MEMORY_EMBEDDING_MODEL else None,
+            embedding_path=os.path.join(self.project_root, ".alice_cache", "memory_embeddings.json")
+        )
+        self.memory_query = ""
+        self.memory_recall_active = False
+        # 记忆文件的读改写需与后台提炼互斥
+        self.memory_lock = threading.Lock()
+        # 长期/短期记忆库 (SQLite)，memory/ 下的 markdown 文件为其生成的视图
+        self.memory_store = MemoryStore(config.MEMORY_DB_PATH, self.memory_path, self.stm_path)
+        # 后台逐日提炼过期的短期记忆 (可使用更便宜的模型)
+        self.memory_distiller = MemoryDistiller(
+            self.memory_store, self.client, config.DISTILL_MODEL_NAME or self.model_name,
+            lock=self.memory_lock,
+            on_update=self._on_memory_distilled,
+            interval=config.DISTILL_INTERVAL,
+            spacing=config.DISTILL_SPACING
+        )
+        # 会话滚动摘要：截断时被移出的消息在后台合并为摘要 (可使用更便宜的模型)
+        self.session_summarizer = SessionSummarizer(
+            self.client,
+            config.SESSION_SUMMARY_MODEL_NAME or config.DISTILL_MODEL_NAME or self.model_name,
+            max_tokens=config.SESSION_SUMMARY_MAX_TOKENS,
+            on_update=self._on_session_summary
+        ) if config.SESSION_SUMMARY_ENABLED else None
+        # 即时对话背景：追加式日志为准，working_memory.md 为渲染出的视图
+        self.working_memory_journal = WorkingMemoryJournal(
+            self.working_memory_path,
+            os.path.join(self.project_root, ".alice_cache", "working_memory"),
+            max_rounds=config.WORKING_MEMORY_MAX_ROUNDS
+        )
+        # 按上下文组件的 token 统计，会话结束时把累计报告写入运行日志
+        self.token_ledger = TokenLedger()
+        self.context_tokens = {}
+        atexit.register(lambda: logger.info(f"Token 分项统计\n{self.token_ledger.report()}") if self.token_ledger.requests else None)
         self.interrupted = False
         
         # 确保输出目录存在
         os.makedirs(config.ALICE_OUTPUT_DIR, exist_ok=True)
-        
-        # 启动时管理记忆（滚动与提炼）
-        self.manage_memory()
-        
+
+        self._context_stale = False # 后台任务更新了记忆文件，下一回合开始前需刷新上下文
+        # TUI 桥接模式下 stdout 承载 JSON 协议 (由 tui_bridge.emit 加锁写出)，执行提示只写日志
+        self.console_output = not deferred_startup
+
+        if not deferred_startup:
+            try:
+                self._ensure_docker_environment(print)
+            except RuntimeError as e:
+                print(e)
+                sys.exit(1)
+            self.sandbox_ready.set()
+            if self.skill_zygote:
+                threading.Thread(target=self.skill_zygote.start, name="alice-zygote-init", daemon=True).start()
+            # 短期记忆的滚动与提炼在后台逐日进行，不阻塞启动
+            self.memory_distiller.start(print)
+
         self._refresh_context()
 
-    def _ensure_docker_environment(self):
-        """确保 Docker 环境就绪，实现核心隔离与自动化唤醒"""
+    def start_background(self, on_progress=None):
+        """
+        分阶段启动：沙盒环境检查与记忆提炼在后台线程中进行，不阻塞首次交互
+        on_progress(task, detail): 可选的进度回调，task 为 "sandbox" / "memory"，detail 为空字符串表示该任务已结束
+        """
+        def progress_of(task):
+            return lambda detail: on_progress(task, detail) if on_progress else None
+        threading.Thread(target=self._prepare_sandbox, args=(progress_of("sandbox"),), name="alice-sandbox-init", daemon=True).start()
+        self.memory_distiller.start(progress_of("memory"))
+
+    def _prepare_sandbox(self, progress):
+        started = datetime.now()
         try:
-            # 1. 检查 Docker 引擎
-            res = subprocess.run("docker --version", shell=True, capture_output=True)
-            if res.returncode != 0:
-                print("错误: 系统未检测到 Docker。Alice 需要 Docker 环境来确保执行安全与持久化。")
-                sys.exit(1)
-            
-            # 2. 检查并自动构建镜像
-            res = subprocess.run(f"docker image inspect {self.docker_image}", shell=True, capture_output=True)
-            if res.returncode != 0:
-                print(f"[系统]: 未找到 Docker 镜像 {self.docker_image}，正在启动全自动构建流程...")
-                print(f"[系统]: 这可能需要几分钟，请稍候...")
-                build_cmd = f"docker build -t {self.docker_image} -f Dockerfile.sandbox ."
-                # 实时输出构建进度
-                process = subprocess.Popen(build_cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
-                for line in process.stdout:
-                    print(f"  [Docker Build]: {line.strip()}")
-                process.wait()
-                
-                if process.returncode != 0:
-                    print(f"错误: Docker 镜像构建失败。请检查 Dockerfile.sandbox 或网络连接。")
-                    sys.exit(1)
-                print(f"[系统]: 镜像 {self.docker_image} 构建成功。")
-
-            # 3. 检查/启动常驻容器 (最小化权限挂载模式)
-            res = subprocess.run(f"docker ps -a --filter name={self.container_name} --format '{{{{.Status}}}}'", shell=True, capture_output=True, text=True)
-            status = res.stdout.lower()
-
-            if not status:
-                # 确保关键目录存在 (用于物理隔离挂载)
-                os.makedirs(os.path.join(self.project_root, "skills"), exist_ok=True)
-                os.makedirs(config.ALICE_OUTPUT_DIR, exist_ok=True)
-
-                print(f"[系统]: 正在初始化 Alice 常驻实验室容器 (最小权限隔离模式)...")
-                start_cmd = [
-                    "docker", "run", "-d",
-                    "--name", self.container_name,
-                    "--restart", "always",
-                    # 仅同步技能库和输出目录，隔离记忆、人设及源代码
-                    "-v", f"{os.path.join(self.project_root, 'skills')}:/app/skills",
-                    "-v", f"{os.path.abspath(config.ALICE_OUTPUT_DIR)}:/app/alice_output",
-                    "-w", "/app",
-                    self.docker_image,
-                    "tail", "-f", "/dev/null"
-                ]
-                subprocess.run(" ".join(start_cmd), shell=True, check=True)
-                print(f"[系统]: 容器已成功初始化。记忆与人设文件已实现物理隔离保护。")
-            elif "up" not in status:
+            self._ensure_docker_environment(progress)
+            logger.info(f"沙盒环境就绪，耗时 {(datetime.now() - started).total_seconds():.2f}s")
+        except Exception as e:
+            self.sandbox_error = str(e)
+            logger.error(f"沙盒环境初始化失败: {e}")
+            progress(f"沙盒初始化失败: {e}")
+            return
+        finally:
+            self.sandbox_ready.set()
+        progress("")
+        # 预热执行守护进程，首个代码块无需再付出握手开销
+        self.executor.warm_up()
+        if self.skill_zygote:
+            self.skill_zygote.start()
+
+    def refresh_context_if_stale(self):
+        """
+        后台任务更新过记忆文件时刷新上下文 (在回合开始前、改动 self.messages 之前调用)
+        即使无需刷新也会获取上下文锁，从而等待上一个被中断回合遗留的刷新线程结束
+        """
+        with self._context_lock:
+            if self._context_stale:
+                self._context_stale = False
+                self._refresh_context()
+
+    def wait_for_sandbox(self):
+        """
+        等待后台沙盒初始化完成 (期间可被中断)
+        返回 None 表示就绪，否则返回可直接反馈给模型的错误信息
+        """
+        if not self.sandbox_ready.is_set():
+            logger.info("代码块正在等待沙盒环境就绪...")
+        while not self.sandbox_ready.wait(0.1):
+            if self.interrupted:
+                return "[已中断，未执行]"
+        if self.sandbox_error:
+            return f"错误: 沙盒环境不可用 ({self.sandbox_error})"
+        return None
+
+    def _ensure_docker_environment(self, progress=print):
+        """
+        确保 Docker 环境就绪，实现核心隔离与自动化唤醒
+        优先经由 Docker Engine API 完成检查与启动，不可用时回退到 docker CLI
+        progress(detail): 进度回调；环境不可用时抛出 RuntimeError
+        """
+        api = self.docker_api
+        if api and not api.ping():
+            logger.warning("Docker API 不可达，回退到 docker CLI。")
+            api = self.docker_api = self.executor.api = None
+
+        try:
+            if config.SANDBOX_POOL_SIZE > 0:
+                if not api:
+                    logger.warning("沙盒容器池需要 Docker Engine API，回退到单个常驻容器。")
+                elif self._lease_pool_container(api, progress):
+                    return
+
+            # 1. 常驻容器已在运行时直接就绪 (最常见的情形，只需一次调用)
+            status = self._container_status(api)
+            if status == "running":
+                return
+
+            progress("正在检查沙盒环境...")
+            if status:
                 # 容器存在但没运行，启动它
-                print(f"[系统]: 正在唤醒 Alice 常驻实验室容器...")
-                subprocess.run(f"docker start {self.container_name}", shell=True, check=True)
-            
+                progress("正在唤醒 Alice 常驻实验室容器...")
+                if api:
+                    api.start_container(self.container_name)
+                else:
+                    subprocess.run(["docker", "start", self.container_name], check=True, capture_output=True)
+                return
+
+            # 2. 检查并自动构建镜像
+            self._ensure_image(api, progress)
+
+            # 3. 创建常驻容器 (最小化权限挂载模式)
+            progress("正在初始化 Alice 常驻实验室容器 (最小权限隔离模式)...")
+            binds = self._container_binds()
+            if api:
+                api.create_container(self.container_name, self._container_config(binds))
+                api.start_container(self.container_name)
+            else:
+                start_cmd = ["docker", "run", "-d", "--name", self.container_name, "--restart", "always"]
+                for bind in binds:
+                    start_cmd += ["-v", bind]
+                start_cmd += ["-w", "/app", self.docker_image, "tail", "-f", "/dev/null"]
+                subprocess.run(start_cmd, check=True, capture_output=True)
+            progress("容器已成功初始化。记忆与人设文件已实现物理隔离保护。")
+        except RuntimeError:
+            raise
         except Exception as e:
-            print(f"初始化 Docker 环境时出错: {e}")
-            sys.exit(1)
+            raise RuntimeError(f"初始化 Docker 环境时出错: {e}")
+
+    def _ensure_image(self, api, progress):
+        """检查沙盒镜像，不存在时自动构建"""
+        if api:
+            has_image = api.inspect_image(self.docker_image) is not None
+        else:
+            has_image = subprocess.run(["docker", "image", "inspect", self.docker_image], capture_output=True).returncode == 0
+        if has_image:
+            return
+        progress(f"未找到 Docker 镜像 {self.docker_image}，正在启动全自动构建流程 (这可能需要几分钟)...")
+        # 构建需要打包上下文目录，仍交给 docker CLI
+        build_cmd = f"docker build -t {self.docker_image} -f Dockerfile.sandbox ."
+        # 实时输出构建进度
+        process = subprocess.Popen(build_cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        for line in process.stdout:
+            if line.strip():
+                progress(f"[Docker Build]: {line.strip()}")
+        process.wait()
+
+        if process.returncode != 0:
+            raise RuntimeError("错误: Docker 镜像构建失败。请检查 Dockerfile.sandbox 或网络连接。")
+        progress(f"镜像 {self.docker_image} 构建成功。")
+
+    def _container_binds(self):
+        """仅同步技能库和输出目录，隔离记忆、人设及源代码"""
+        # 确保关键目录存在 (用于物理隔离挂载)
+        os.makedirs(os.path.join(self.project_root, "skills"), exist_ok=True)
+        os.makedirs(config.ALICE_OUTPUT_DIR, exist_ok=True)
+        return [
+            f"{os.path.join(self.project_root, 'skills')}:/app/skills",
+            f"{os.path.abspath(config.ALICE_OUTPUT_DIR)}:/app/alice_output",
+        ]
+
+    def _container_config(self, binds):
+        """Engine API 的容器创建配置 (常驻容器与池容器共用)"""
+        return {
+            "Image": self.docker_image,
+            "Cmd": ["tail", "-f", "/dev/null"],
+            "WorkingDir": "/app",
+            "HostConfig": {
+                "Binds": binds,
+                "RestartPolicy": {"Name": "always"},
+            },
+        }
+
+    def _lease_pool_container(self, api, progress):
+        """
+        从预热的容器池中租用一个容器，本会话的所有代码块都在其中执行，进程退出时归还
+        等待超过 SANDBOX_POOL_ACQUIRE_TIMEOUT 仍无空闲容器时返回 False，由调用方回退到单个常驻容器
+        """
+        self._ensure_image(api, progress)
+        self.sandbox_pool = SandboxPool(
+            api, self._container_config(self._container_binds()),
+            size=config.SANDBOX_POOL_SIZE,
+            max_uses=config.SANDBOX_POOL_MAX_USES,
+            lease_dir=os.path.join(self.project_root, ".alice_cache", "sandbox_pool")
+        )
+        progress(f"正在预热沙盒容器池 ({config.SANDBOX_POOL_SIZE} 个)...")
+        self.sandbox_pool.ensure_warm()
+        progress("正在租用沙盒容器...")
+        try:
+            lease = self.sandbox_pool.acquire(timeout=config.SANDBOX_POOL_ACQUIRE_TIMEOUT)
+        except TimeoutError as e:
+            logger.warning(f"{e}，回退到单个常驻容器。")
+            progress("沙盒容器池已被占满，改用单个常驻容器...")
+            return False
+        self.sandbox_lease = lease
+        # 执行引擎与内核尚未建立到容器的通道，此时切换容器名即可
+        self.container_name = self.executor.container_name = lease.container_name
+        if self.kernel:
+            self.kernel.container_name = lease.container_name
+        atexit.register(self.release_sandbox)
+        logger.info(f"沙盒容器池指标: {self.sandbox_pool.metrics()}")
+        return True
+
+    def release_sandbox(self):
+        """归还租用的池容器 (进程意外退出时文件锁由内核释放，下次租出前补做重置)"""
+        lease, self.sandbox_lease = self.sandbox_lease, None
+        if lease:
+            self.job_manager.cancel_all()
+            # 先断开到容器的执行通道，再由重置脚本清理残留进程
+            self.executor.cancel_all()
+            self.executor.close()
+            if self.kernel:
+                self.kernel.shutdown()
+            lease.release()
+
+    def _container_status(self, api):
+        """返回常驻容器状态 (running / exited ...)，容器不存在时返回空字符串"""
+        if api:
+            info = api.inspect_container(self.container_name)
+            return info["State"]["Status"].lower() if info else ""
+        try:
+            res = subprocess.run(
+                ["docker", "inspect", "-f", "{{.State.Status}}", self.container_name],
+                capture_output=True, text=True
+            )
+        except FileNotFoundError:
+            raise RuntimeError("错误: 系统未检测到 Docker。Alice 需要 Docker 环境来确保执行安全与持久化。")
+        if res.returncode != 0:
+            # 区分「容器不存在」与「Docker 引擎不可用」
+            if subprocess.run(["docker", "version"], capture_output=True).returncode != 0:
+                raise RuntimeError("错误: Docker 引擎未运行或当前用户无权访问。")
+            return ""
+        return res.stdout.strip().lower()
 
     def _refresh_context(self):
         """刷新上下文，分离人格设定 (System) 与记忆背景 (User)"""
+        with self._context_lock:
+            self._rebuild_context()
+
+    def _rebuild_context(self):
         logger.info("正在刷新上下文索引...")
-        self.system_prompt = self._load_prompt()
-        self.memory_content = self._load_file_content(self.memory_path, "暂无长期记忆。")
-        self.stm_content = self._load_file_content(self.stm_path, "暂无近期记忆。")
-        self.working_memory_content = self._load_file_content(self.working_memory_path, "暂无即时对话背景。")
-        self.todo_content = self._load_file_content(self.todo_path, "暂无活跃任务。")
-        self.snapshot_mgr.refresh() # 刷新快照
-        self.index_text = self.snapshot_mgr.get_index_text()
+        cb = self.context_builder
+        self.system_prompt = cb.file_component("prompt", self.prompt_path, self._load_prompt)
+        memory_raw = cb.file_component("memory", self.memory_path, lambda: self._load_file_content(self.memory_path, "暂无长期记忆。"))
+        stm_raw = cb.file_component("stm", self.stm_path, lambda: self._load_file_content(self.stm_path, "暂无近期记忆。"))
+        self.memory_content, self.stm_content = cb.component(
+            "memory_recall",
+            lambda: (file_fingerprint(self.memory_path), file_fingerprint(self.stm_path), self.memory_query),
+            lambda: self._recall_memory(memory_raw, stm_raw)
+        )
+        self.working_memory_content = cb.file_component("working_memory", self.working_memory_path, lambda: self._load_file_content(self.working_memory_path, "暂无即时对话背景。"))
+        self.todo_content = cb.file_component("todo", self.todo_path, lambda: self._load_file_content(self.todo_path, "暂无活跃任务。"))
+        self.index_text = cb.component("snapshot", self._poll_snapshot, self._snapshot_index_text)
+        self.skill_context = cb.component("skill_recall", lambda: (self.snapshot_mgr.version, self.memory_query), self._recall_skills)
+        job_context = cb.component("jobs", None, self._job_context)
         
         # 1. 构造 System Message (仅放人格设定和环境信息)
         env_context = (
@@ -144,16 +454,25 @@ class AliceAgent:
         ]
         files_list_str = "\n".join([f"- {f}" for f in loaded_files])
 
-        memory_context_content = (
-            f"【记忆与背景信息注入】\n"
-            f"以下是你当前存储的记忆和任务状态，请作为后续对话的参考：\n\n"
-            f"### 长期记忆 (来自 {self.memory_path})\n{self.memory_content}\n\n"
-            f"### 短期记忆 (最近 7 天，来自 {self.stm_path})\n{self.stm_content}\n\n"
-            f"### 即时对话背景 (来自 {self.working_memory_path})\n{self.working_memory_content}\n\n"
-            f"### 当前任务清单 (来自 {self.todo_path})\n{self.todo_content}\n\n"
-            f"### 核心资产索引快照\n{self.index_text}\n\n"
-            f"--- 记忆注入结束，请开始/继续你的助理工作 ---"
-        )
+        if config.PROMPT_CACHE_LAYOUT:
+            memory_context_content, self.volatile_context = self._build_cacheable_context(job_context)
+        else:
+            memory_context_content, self.volatile_context = self._build_classic_context(job_context), None
+
+        # 构建时统计各组件的 token 数 (历史与工具反馈在请求时统计，见 token_breakdown)
+        cacheable = config.PROMPT_CACHE_LAYOUT
+        self.context_tokens = self.token_ledger.measure({
+            "系统提示词": system_content,
+            "长期记忆": self.memory_content,
+            "短期记忆": self.stm_content,
+            "技能索引": self._stable_index_text if cacheable else self.index_text,
+            "索引变化": self._index_delta(self._stable_index_text, self.index_text) if cacheable else "",
+            "即时对话背景": self.working_memory_content,
+            "任务清单": self.todo_content,
+            "后台任务": job_context,
+            "会话摘要": self.session_summarizer.summary if self.session_summarizer else "",
+            "相关技能": self.skill_context,
+        })
 
         # 3. 更新消息序列
         # 保持 messages[0] 为 system, messages[1] 为 memory context
@@ -166,11 +485,197 @@ class AliceAgent:
             # 核心优化：截断原始历史，防止上下文爆炸
             # 仅保留最近的 4 条原始对话（约 2 轮），旧的历史由 Summarized Memory (messages[1]) 覆盖
             recent_raw_messages = [m for m in self.messages if "【记忆与背景信息注入】" not in str(m.get("content", ""))]
-            if len(recent_raw_messages) > 4:
+            # 前缀缓存布局下分段截断：超过 8 条才一次性截回最近 4 条，其余轮次只追加，保持请求前缀不变
+            limit = 8 if config.PROMPT_CACHE_LAYOUT else 4
+            if len(recent_raw_messages) > limit:
+                # 被移出的消息交给后台摘要，不阻塞本回合
+                if self.session_summarizer:
+                    self.session_summarizer.evict(recent_raw_messages[:-4])
                 recent_raw_messages = recent_raw_messages[-4:]
             
             # 重新组装：System(0) + Memory Context(1) + Recent Raw(2+)
             self.messages = [system_msg, memory_msg] + [m for m in recent_raw_messages if m.get("role") != "system"]
+        logger.info(f"上下文刷新完成，{cb.report()}")
+
+    def _build_classic_context(self, job_context):
+        """全部记忆与状态放在同一条消息中 (PROMPT_CACHE_LAYOUT=false)"""
+        return (
+            f"【记忆与背景信息注入】\n"
+            f"以下是你当前存储的记忆和任务状态，请作为后续对话的参考：\n\n"
+            f"### 长期记忆 (来自 {self.memory_path})\n{self.memory_content}\n\n"
+            f"### 短期记忆 (最近 7 天，来自 {self.stm_path})\n{self.stm_content}\n\n"
+            f"### 即时对话背景 (来自 {self.working_memory_path})\n{self.working_memory_content}\n\n"
+            f"### 当前任务清单 (来自 {self.todo_path})\n{self.todo_content}\n\n"
+            f"### 后台任务\n{job_context}\n\n"
+            f"{self._session_summary_section()}"
+            f"### 核心资产索引快照\n{self.index_text}\n\n"
+            f"{self._skill_section()}"
+            f"--- 记忆注入结束，请开始/继续你的助理工作 ---"
+        )
+
+    def _build_cacheable_context(self, job_context):
+        """
+        前缀缓存友好的布局：返回 (记忆消息, 实时状态消息)
+        记忆消息只含变化缓慢的长期/短期记忆与会话开始时的技能索引快照，跨轮次逐字节不变，
+        可以命中服务端的前缀 (KV) 缓存；即时对话背景、任务清单、后台任务与索引变化放进
+        请求末尾的实时状态消息 (见 request_messages)。
+        """
+        # 长期/短期记忆变化时前缀本就失效，顺带把最新的索引并入前缀
+        stable_key = (self.memory_content, self.stm_content)
+        if self._stable_key != stable_key:
+            self._stable_key = stable_key
+            self._stable_index_text = self.index_text
+
+        memory_context_content = (
+            f"【记忆与背景信息注入】\n"
+            f"以下是你当前存储的记忆，请作为后续对话的参考 (即时对话背景、任务清单等实时状态见对话末尾的【实时状态】消息)：\n\n"
+            f"### 长期记忆 (来自 {self.memory_path})\n{self.memory_content}\n\n"
+            f"### 短期记忆 (最近 7 天，来自 {self.stm_path})\n{self.stm_content}\n\n"
+            f"### 核心资产索引快照\n{self._stable_index_text}\n\n"
+            f"--- 记忆注入结束，请开始/继续你的助理工作 ---"
+        )
+
+        volatile_parts = [
+            "【实时状态】(每轮更新，与上文记忆冲突时以此为准)",
+            f"### 即时对话背景 (来自 {self.working_memory_path})\n{self.working_memory_content}",
+            f"### 当前任务清单 (来自 {self.todo_path})\n{self.todo_content}",
+            f"### 后台任务\n{job_context}",
+        ]
+        summary = self._session_summary_section()
+        if summary:
+            volatile_parts.append(summary.strip())
+        skills = self._skill_section()
+        if skills:
+            volatile_parts.append(skills.strip())
+        delta = self._index_delta(self._stable_index_text, self.index_text)
+        if delta:
+            volatile_parts.append(f"### 核心资产索引变化 (相对于上文快照)\n{delta}")
+        return memory_context_content, "\n\n".join(volatile_parts)
+
+    def _session_summary_section(self):
+        """本次会话中已移出上下文的早先对话摘要 (尚无摘要时为空)"""
+        summary = self.session_summarizer.summary if self.session_summarizer else ""
+        if not summary:
+            return ""
+        return f"### 本次会话早先的对话摘要 (已移出上下文，执行过的命令与结果无需重复执行)\n{summary}\n\n"
+
+    def _skill_section(self):
+        """与当前输入相关的技能 (未按相关性注入时为空，技能已全部列在索引快照中)"""
+        if not self.skill_ranking_active:
+            return ""
+        return f"### 与当前输入相关的技能 (按相关性排序，其余技能可用 `toolkit search <关键词>` 检索)\n{self.skill_context}\n\n"
+
+    def _on_session_summary(self):
+        self._context_stale = True
+
+    @staticmethod
+    def _index_delta(baseline, current):
+        """两份索引文本之间新增/更新与移除的条目"""
+        old_lines = {l for l in baseline.splitlines() if l.startswith("- ")}
+        new_lines = [l for l in current.splitlines() if l.startswith("- ")]
+        added = [l for l in new_lines if l not in old_lines]
+        removed = old_lines - set(new_lines)
+        parts = []
+        if added:
+            parts.append("新增/更新:\n" + "\n".join(added))
+        if removed:
+            parts.append("已移除或已变化:\n" + "\n".join(sorted(removed)))
+        return "\n".join(parts)
+
+    def token_breakdown(self):
+        """
+        本次请求的分项 token 数，返回 (总数, [(组件, token 数), ...] 按从大到小排序)，并计入会话累计
+        「其他」为各消息中的标题、说明等包装文本
+        """
+        counts = dict(self.context_tokens)
+        history = tool_feedback = 0
+        for m in self.messages[2:]:
+            n = count_tokens(str(m.get("content", "")))
+            if m.get("role") == "user" and str(m.get("content", "")).startswith("容器执行反馈"):
+                tool_feedback += n
+            else:
+                history += n
+        counts["对话历史"] = history
+        counts["工具反馈"] = tool_feedback
+        total = sum(count_tokens(str(m.get("content", ""))) for m in self.request_messages())
+        counts["其他"] = max(total - sum(counts.values()), 0)
+        self.token_ledger.record(counts)
+        return total, sorted(((k, v) for k, v in counts.items() if v), key=lambda kv: -kv[1])
+
+    def request_messages(self):
+        """本轮模型请求的消息序列：稳定前缀 + 末尾的实时状态消息 (实时状态不写入对话历史)"""
+        if not self.volatile_context:
+            return self.messages
+        return self.messages + [{"role": "user", "content": self.volatile_context}]
+
+    def set_memory_query(self, text):
+        """设置本回合的检索词 (当前用户输入)；记忆或技能按相关性注入时，回合开始前需重新检索"""
+        self.memory_query = text
+        if self.memory_recall_active or self.skill_ranking_active:
+            self._context_stale = True
+
+    def _sync_memory_index(self):
+        """记忆文件写入后增量更新检索索引 (仅在按相关性注入时维护，否则留到首次检索时同步)"""
+        if self.memory_recall_active:
+            self.memory_index.sync()
+
+    def _embed_texts(self, texts, model=None):
+        response = self.client.embeddings.create(model=model or config.MEMORY_EMBEDDING_MODEL, input=texts)
+        return [item.embedding for item in response.data]
+
+    def _recall_memory(self, memory_raw, stm_raw):
+        """
+        返回注入上下文的 (长期记忆, 短期记忆)
+        总量在 MEMORY_RECALL_TOKEN_BUDGET 以内时全量注入；超出时只注入与当前用户输入最相关的条目，
+        提示词大小不再随记忆条目数增长。
+        """
+        budget = config.MEMORY_RECALL_TOKEN_BUDGET
+        if budget <= 0 or count_tokens(memory_raw) + count_tokens(stm_raw) <= budget:
+            self.memory_recall_active = False
+            return memory_raw, stm_raw
+
+        self.memory_recall_active = True
+        self.memory_index.sync()
+        entries = self.memory_index.search(self.memory_query, config.MEMORY_RECALL_TOP_K, budget) if self.memory_query else []
+        if not entries:
+            entries = self.memory_index.recent(config.MEMORY_RECALL_TOP_K, budget)
+        logger.info(f"记忆检索: 注入 {len(entries)} 条，约 {sum(e.tokens for e in entries)} tokens")
+
+        def view(source, path, empty_msg):
+            picked = [e for e in entries if e.source == source]
+            note = f"(记忆较多，以下仅为与当前对话相关的 {len(picked)}/{self.memory_index.count(source)} 条，完整内容可查阅 {path})"
+            return f"{note}\n{format_entries(picked) if picked else empty_msg}"
+        return view("ltm", self.memory_path, "无相关长期记忆。"), view("stm", self.stm_path, "无相关近期记忆。")
+
+    def _poll_snapshot(self):
+        """增量刷新技能快照 (只重新解析有变化的 SKILL.md)，以快照版本号作为上下文组件的指纹"""
+        self.snapshot_mgr.refresh()
+        return self.snapshot_mgr.version
+
+    def _skill_ranking_enabled(self):
+        top_k = config.SKILL_INJECT_TOP_K
+        return top_k > 0 and len(self.snapshot_mgr.skills) > top_k
+
+    def _snapshot_index_text(self):
+        """技能较多时索引快照不再逐条列出技能，相关技能由 _recall_skills 按当前输入注入"""
+        return self.snapshot_mgr.get_index_text(include_skills=not self._skill_ranking_enabled())
+
+    def _recall_skills(self):
+        """
+        返回注入上下文的相关技能列表
+        技能数不超过 SKILL_INJECT_TOP_K 时全部列在索引快照中，这里返回空；超出时只列出与当前输入最相关的
+        SKILL_INJECT_TOP_K 个，提示词大小不再随技能库增长。
+        """
+        if not self._skill_ranking_enabled():
+            self.skill_ranking_active = False
+            return ""
+        self.skill_ranking_active = True
+        self.skill_index.sync(self.snapshot_mgr.skills)
+        docs = self.skill_index.search(self.memory_query, config.SKILL_INJECT_TOP_K) if self.memory_query else []
+        logger.info(f"技能检索: 注入 {len(docs)}/{self.skill_index.count()} 个技能")
+        if not docs:
+            return "未找到与当前输入相关的技能。"
+        return "\n".join(f"- **{d.name}** (`{d.path}`): {d.description}" for d in docs)
 
     def _load_prompt(self):
         try:
@@ -182,81 +687,10 @@ class AliceAgent:
             print(f"加载提示词失败: {e}")
             return "你是一个 AI 助手。"
 
-    def manage_memory(self):
-        """管理短期记忆滚动和长期记忆提炼"""
-        if not os.path.exists(self.stm_path):
-            return
-
-        try:
-            with open(self.stm_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-
-            lines = content.split('\n')
-            sections = {}
-            current_date = None
-            
-            # 解析日期小节
-            for line in lines:
-                match = re.match(r'^## (\d{4}-\d{2}-\d{2})', line)
-                if match:
-                    current_date = match.group(1)
-                    sections[current_date] = [line]
-                elif current_date:
-                    sections[current_date].append(line)
-
-            if not sections:
-                return
-
-            # 计算过期日期（7天前）
-            sorted_dates = sorted(sections.keys())
-            today = datetime.now().date()
-            expiry_limit = today - timedelta(days=7)
-            
-            to_prune = [d for d in sorted_dates if datetime.strptime(d, '%Y-%m-%d').date() < expiry_limit]
-            
-            if to_prune:
-                print(f"[系统]: 发现过期短期记忆 ({len(to_prune)} 天)，正在启动提炼流程...")
-                
-                # 提取过期内容进行总结
-                pruned_content = ""
-                for d in to_prune:
-                    pruned_content += "\n".join(sections[d]) + "\n"
-                
-                # 调用 LLM 进行提炼
-                distill_prompt = (
-                    f"你是一个记忆提炼专家。以下是用户最近 7 天的短期记忆记录：\n\n{content}\n\n"
-                    f"请重点分析即将被删除的旧记忆：\n{pruned_content}\n\n"
-                    "请根据这 7 天的整体背景，结合旧记忆，提炼出具有长期价值的：\n"
-                    "1. 用户的新习惯或偏好变更。\n"
-                    "2. 重要的项目决策或里程碑进展。\n"
-                    "3. 用户提到的重要个人事实。\n\n"
-                    "请以 Markdown 列表格式输出提炼结果，保持简洁。如果没有值得记录的长期价值，请回复“无重要更新”。"
-                )
-                
-                response = self.client.chat.completions.create(
-                    model=self.model_name,
-                    messages=[{"role": "user", "content": distill_prompt}]
-                )
-                summary = response.choices[0].message.content.strip()
-                
-                if summary and "无重要更新" not in summary:
-                    # 写入长期记忆
-                    with open(self.memory_path, 'a', encoding='utf-8') as f:
-                        f.write(f"\n\n### 自动提炼记忆 ({datetime.now().strftime('%Y-%m-%d')})\n{summary}\n")
-                    print("[系统]: 长期记忆已更新。")
-                
-                # 更新短期记忆 file（移除过期日期）
-                remaining_content = lines[0:2] # 保持标题和描述
-                for d in sorted_dates:
-                    if d not in to_prune:
-                        remaining_content.extend(sections[d])
-                
-                with open(self.stm_path, 'w', encoding='utf-8') as f:
-                    f.write("\n".join(remaining_content))
-                print(f"[系统]: 已清理过期短期记忆。")
-
-        except Exception as e:
-            print(f"记忆管理过程中出错: {e}")
+    def _on_memory_distilled(self):
+        """后台提炼完成一天：更新检索索引，下一回合开始前刷新上下文"""
+        self._sync_memory_index()
+        self._context_stale = True
 
     def _load_file_content(self, path, default_msg):
         try:
@@ -296,17 +730,56 @@ class AliceAgent:
             if not skill:
                 return f"技能 '{skill_name}' 未在注册表中。请尝试执行 `toolkit refresh`。"
             
+            metadata = skill.get("metadata") or {}
+            if metadata:
+                lines = [f"### 技能 '{skill_name}' 配置信息 (内存注册表)"]
+                lines.append(f"- **name**: {metadata.get('name') or skill_name}")
+                lines.append(f"- **description**: {skill['description']}")
+                for key, value in metadata.items():
+                    if key in ("name", "description"):
+                        continue
+                    if isinstance(value, dict):
+                        value = ", ".join(f"{k}={v}" for k, v in value.items())
+                    elif isinstance(value, list):
+                        value = ", ".join(str(v) for v in value)
+                    lines.append(f"- **{key}**: {value}")
+                lines.append(f"\n*(提示: 如需完整用法，请直接查看 {skill['path']})*")
+                return "\n".join(lines)
             yaml_content = skill.get("yaml", "").strip()
             if yaml_content:
+                # front matter 无法解析时展示原文
                 return f"### 技能 '{skill_name}' 配置信息 (内存注册表)\n```yaml\n---\n{yaml_content}\n---\n```\n*(提示: 如需完整用法，请直接查看 {skill['path']})*"
             return f"技能 '{skill_name}' 注册信息不完整，缺少元数据。"
-        
-        elif args[0] == "refresh":
+
+        elif args[0] == "search" and len(args) > 1:
+            query = " ".join(args[1:])
             self.snapshot_mgr.refresh()
+            self.skill_index.sync(self.snapshot_mgr.skills)
+            docs = self.skill_index.search(query, config.SKILL_INJECT_TOP_K or 8)
+            if not docs:
+                return f"未找到与 '{query}' 相关的技能。可执行 `toolkit list` 查看全部技能。"
+            results = [f"- **{d.name}**: {d.description}" for d in docs]
+            return f"### 与 '{query}' 相关的技能 (按相关性排序，共 {self.skill_index.count()} 个技能)\n" + "\n".join(results)
+
+        elif args[0] == "refresh":
+            self.snapshot_mgr.refresh(full=True)
             count = len(self.snapshot_mgr.skills)
             return f"技能注册表已刷新，共发现并注册 {count} 个技能。"
             
-        return "未知 toolkit 指令。用法: `toolkit list`, `toolkit info <skill_name>`, `toolkit refresh`"
+        return "未知 toolkit 指令。用法: `toolkit list`, `toolkit info <skill_name>`, `toolkit search <关键词>`, `toolkit refresh`"
+
+    def handle_reset(self):
+        """处理内置 reset 指令，重启持久化 Python 内核"""
+        if not self.kernel:
+            return "当前未启用持久化 Python 内核 (PYTHON_KERNEL_ENABLED=false)，每个 python 代码块本就独立运行。"
+        not_ready = self.wait_for_sandbox()
+        if not_ready:
+            return not_ready
+        try:
+            self.kernel.restart()
+            return "Python 内核已重启，所有全局变量与已导入模块均已清空。"
+        except Exception as e:
+            return f"重启 Python 内核失败: {str(e)}"
 
     def handle_todo(self, content):
         """处理内置 todo 指令，在宿主机更新任务清单文件"""
@@ -317,6 +790,88 @@ class AliceAgent:
         except Exception as e:
             return f"更新任务清单失败: {str(e)}"
 
+    def _new_job_executor(self):
+        # 任务日志由 JobManager 经实时回调完整写入，执行器不再截断回显或另行落盘
+        return SandboxExecutor(self.container_name, use_daemon=False, api=self.docker_api,
+                               stream_all_output=True)
+
+    def _on_job_finished(self, job):
+        # 完成通知在下一回合开始前注入上下文
+        self._context_stale = True
+
+    def start_job(self, command, is_python_code=False):
+        """以后台任务方式执行代码块，立即返回任务 ID"""
+        is_safe, warning = self.is_safe_command(command)
+        if not is_safe:
+            logger.warning(f"指令被安全审查拦截: {command}")
+            return warning
+        not_ready = self.wait_for_sandbox()
+        if not_ready:
+            return not_ready
+        if self.skill_zygote and not is_python_code:
+            command = self.skill_zygote.rewrite(command)
+        if self.command_cache:
+            self.command_cache.bump()
+        job = self.job_manager.start(command, is_python_code=is_python_code)
+        return (
+            f"已作为后台任务启动: {job.id}\n"
+            f"完整输出: {job.log_path}\n"
+            f"使用 `job status {job.id}` / `job tail {job.id}` 查看进度，任务结束时会自动通知你。"
+        )
+
+    def handle_job(self, args):
+        """处理内置 job 指令：status / tail / wait / cancel"""
+        jm = self.job_manager
+        usage = "用法: `job status [任务ID]`, `job tail <任务ID> [行数]`, `job wait <任务ID> [秒数]`, `job cancel <任务ID>`"
+        if not args:
+            return usage
+        op, rest = args[0], args[1:]
+
+        if op == "status":
+            if not rest:
+                if not jm.jobs:
+                    return "当前没有后台任务。"
+                return "\n".join(j.summary() for j in jm.jobs.values())
+            job = jm.get(rest[0])
+            if job is None:
+                return f"未找到后台任务 {rest[0]}。"
+            return f"{job.summary()}\n完整输出: {job.log_path}"
+
+        if op not in ("tail", "wait", "cancel"):
+            return f"未知 job 指令。{usage}"
+        if not rest:
+            return f"错误: job {op} 需要提供任务 ID。"
+        job = jm.get(rest[0])
+        if job is None:
+            return f"未找到后台任务 {rest[0]}。"
+
+        if op == "tail":
+            lines = int(rest[1]) if len(rest) > 1 and rest[1].isdigit() else 50
+            return f"{job.summary()}\n{jm.tail(job.id, lines) or '[暂无输出]'}"
+
+        if op == "wait":
+            # 与前台代码块相同的等待上限，期间可被中断
+            limit = min(int(rest[1]), 120) if len(rest) > 1 and rest[1].isdigit() else 120
+            deadline = time.monotonic() + limit
+            while not job.done.wait(0.1):
+                if self.interrupted:
+                    return "[已中断等待，任务仍在后台运行]"
+                if time.monotonic() > deadline:
+                    return f"{job.summary()}\n[等待 {limit} 秒后任务仍在运行]\n{jm.tail(job.id, 20)}"
+            return f"{job.summary()}\n{jm.tail(job.id, 50) or '[无输出]'}"
+
+        if jm.cancel(job.id):
+            job.done.wait(5)
+            return f"已中断后台任务 {job.id}。"
+        return f"后台任务 {job.id} 已结束，无需中断。"
+
+    def _job_context(self):
+        """上下文中的后台任务段落：运行中的任务与新近结束任务的通知"""
+        lines = [f"- 运行中: {j.summary()}" for j in self.job_manager.running()]
+        for job in self.job_manager.drain_notifications():
+            lines.append(f"- 【已结束】{job.summary()}，最后输出:\n```\n{self.job_manager.tail(job.id, 10)}\n```")
+        return "\n".join(lines) if lines else "暂无后台任务。"
+
     def _update_working_memory(self, user_text, assistant_thinking, assistant_content):
         """更新即时记忆 (Working Memory)，过滤掉代码块，保持最近 N 轮"""
         def filter_code(text):
@@ -331,7 +886,7 @@ class AliceAgent:
         if not clean_user and not clean_content and not clean_thinking:
             return
 
-        new_entry = f"--- ROUND ---\n"
+        new_entry = ""
         if clean_user:
             new_entry += f"USER: {clean_user}\n"
         if clean_thinking:
@@ -340,40 +895,15 @@ class AliceAgent:
             new_entry += f"ALICE_RESPONSE: {clean_content}\n"
         
         try:
-            os.makedirs(os.path.dirname(self.working_memory_path), exist_ok=True)
-            content = ""
-            if os.path.exists(self.working_memory_path):
-                with open(self.working_memory_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-            
-            # 分割现有的轮次
-            rounds = re.split(r'^--- ROUND ---\n', content, flags=re.MULTILINE)
-            rounds = [r.strip() for r in rounds if r.strip()]
-            
-            rounds.append(new_entry.replace("--- ROUND ---\n", "").strip())
-            
-            # 保持轮数限制
-            max_rounds = config.WORKING_MEMORY_MAX_ROUNDS
-            if len(rounds) > max_rounds:
-                rounds = rounds[-max_rounds:]
-            
-            final_content = "# Alice 的即时对话背景 (Working Memory)\n\n"
-            for r in rounds:
-                final_content += f"--- ROUND ---\n{r}\n\n"
-            
-            with open(self.working_memory_path, 'w', encoding='utf-8') as f:
-                f.write(final_content)
+            # 追加到日志并原子地重新渲染最近 N 轮，开销与历史总量无关
+            self.working_memory_journal.append(new_entry.strip())
         except Exception as e:
             print(f"更新即时记忆失败: {e}")
 
     def handle_memory(self, content, target="stm"):
-        """处理内置 memory 指令，确保写入宿主机 memory/ 目录"""
+        """处理内置 memory 指令，写入记忆库并重新生成 memory/ 下的 markdown 视图"""
         now = datetime.now()
         date_str = now.strftime("%Y-%m-%d")
-        time_str = now.strftime("%H:%M")
-        
-        target_path = self.stm_path if target == "stm" else self.memory_path
-        os.makedirs(os.path.dirname(target_path), exist_ok=True)
 
         # 清洗内容，避免重复的日期前缀
         clean_content = content.strip()
@@ -384,49 +914,27 @@ class AliceAgent:
             entry_prefix = f"[{date_str}] "
 
         try:
-            if target == "stm":
-                if not os.path.exists(target_path):
-                    with open(target_path, "w", encoding="utf-8") as f:
-                        f.write("# Alice 的短期记忆 (最近 7 天)\n\n")
-                
-                with open(target_path, "r", encoding="utf-8") as f:
-                    lines = f.readlines()
-                
-                has_date_header = any(line.strip() == f"## {date_str}" for line in lines)
-                
-                with open(target_path, "a", encoding="utf-8") as f:
-                    if not has_date_header:
-                        f.write(f"\n## {date_str}\n")
-                    f.write(f"- [{time_str}] {clean_content}\n")
-                return f"已成功更新短期记忆。"
-            else:
-                # LTM 经验教训追加逻辑
-                if not os.path.exists(target_path):
-                    with open(target_path, "w", encoding="utf-8") as f:
-                        f.write("# Alice 的长期记忆\n")
-
-                with open(target_path, "r", encoding="utf-8") as f:
-                    full_text = f.read()
-
-                lessons_header = "## 经验教训"
-                entry = f"- {entry_prefix}{clean_content}\n"
-
-                if lessons_header in full_text:
-                    parts = full_text.split(lessons_header)
-                    # 插入到标题下方
-                    new_content = parts[0] + lessons_header + "\n" + entry + parts[1].lstrip()
-                    with open(target_path, "w", encoding="utf-8") as f:
-                        f.write(new_content)
+            # 与后台记忆提炼互斥，避免提炼写回时覆盖新记忆
+            with self.memory_lock:
+                if target == "stm":
+                    self.memory_store.add_stm(clean_content, now)
+                    self._sync_memory_index()
+                    return f"已成功更新短期记忆。"
                 else:
-                    with open(target_path, "a", encoding="utf-8") as f:
-                        f.write(f"\n{lessons_header}\n{entry}")
-                return f"已成功更新长期记忆经验教训。"
+                    # LTM 经验教训 (最新的排在最前)
+                    self.memory_store.add_lesson(f"{entry_prefix}{clean_content}")
+                    self._sync_memory_index()
+                    return f"已成功更新长期记忆经验教训。"
         except Exception as e:
             return f"更新记忆失败: {str(e)}"
 
     def interrupt(self):
-        """发送中断信号"""
+        """发送中断信号：取消排队中的代码块，并硬中断容器内正在执行的进程组"""
         self.interrupted = True
+        self.scheduler.cancel_pending()
+        self.executor.cancel_all()
+        if self.kernel:
+            self.kernel.interrupt()
 
     def is_safe_command(self, command):
         """安全审查：仅拦截危险的 rm 指令"""
@@ -435,7 +943,11 @@ class AliceAgent:
             return False, "为了系统安全，禁止在容器内使用 rm 指令。如需删除文件，请通过其他方式操作。"
         return True, ""
 
-    def execute_command(self, command, is_python_code=False):
+    def execute_command(self, command, is_python_code=False, on_output=None):
+        """
+        执行单个代码块
+        on_output(stream, data): 可选回调，容器输出会逐行实时推送 (内置指令不触发)
+        """
         logger.info(f"执行指令 ({'Python' if is_python_code else 'Bash'}): {command[:200]}...")
         # 0. 安全审查 (容器指令审查)
         is_safe, warning = self.is_safe_command(command)
@@ -448,6 +960,9 @@ class AliceAgent:
             cmd_strip = command.strip()
             if cmd_strip.startswith("toolkit"):
                 return self.handle_toolkit(cmd_strip.split()[1:])
+
+            if cmd_strip == "job" or cmd_strip.startswith("job "):
+                return self.handle_job(cmd_strip.split()[1:])
             
             if cmd_strip.startswith("update_prompt"):
                 # 提取 update_prompt 之后的所有内容
@@ -457,6 +972,9 @@ class AliceAgent:
                     return self.handle_update_prompt(content)
                 return "错误: update_prompt 需要提供新的提示词内容。"
 
+            if cmd_strip == "reset":
+                return self.handle_reset()
+
             if cmd_strip.startswith("todo"):
                 content_match = re.search(r'["\'](.*?)["\']', cmd_strip, re.DOTALL)
                 if content_match:
@@ -490,136 +1008,119 @@ class AliceAgent:
                     return content
                 # 如果缓存读取失败，继续走 Docker exec 流程
 
-        # 2. 准备 Docker 执行指令 (采用 List 模式避免 Shell 转义陷阱)
-        display_name = "Docker 常驻容器"
-        full_command = [
-            "docker", "exec",
-            "-w", "/app",
-            self.container_name
-        ]
-        
-        if is_python_code:
-            full_command += ["python3", "-c", command]
-        else:
-            full_command += ["bash", "-c", command]
+        # 2. 只读命令的结果缓存：命中时无需进入容器；其余命令可能写入容器，使整个工作目录范围的缓存失效
+        cache_key = None
+        if self.command_cache:
+            if not is_python_code:
+                cache_key = self.command_cache.key_for(command, allow_container_scope=not self.job_manager.running())
+            if cache_key:
+                cached = self.command_cache.get(cache_key)
+                if cached is not None:
+                    return cached
+            else:
+                self.command_cache.bump()
 
-        print(f"\n[Alice 正在执行 ({display_name})]: {command[:100]}{'...' if len(command) > 100 else ''}")
+        # 3. 交由容器执行器执行 (常驻守护进程优先，必要时回退到 docker exec)
+        not_ready = self.wait_for_sandbox()
+        if not_ready:
+            return not_ready
+        display_name = "Docker 常驻容器"
+        notice = f"[Alice 正在执行 ({display_name})]: {command[:100]}{'...' if len(command) > 100 else ''}"
+        logger.info(notice)
+        if self.console_output:
+            print(f"\n{notice}")
         
+        if self.skill_zygote and not is_python_code:
+            command = self.skill_zygote.rewrite(command)
         try:
-            result = subprocess.run(
-                full_command,
-                shell=False, # 核心修复：禁用宿主机 Shell 解析
-                capture_output=True,
-                text=True,
-                timeout=120,
-                env=os.environ
-            )
+            if is_python_code and self.kernel:
+                result = self.kernel.run(command, timeout=120, on_output=on_output)
+            else:
+                result = self.executor.run(command, is_python_code=is_python_code, timeout=120, on_output=on_output)
+            if result["timed_out"]:
+                return "错误: 执行超时。"
             
-            output = result.stdout
-            if result.stderr:
-                logger.error(f"指令执行产生标准错误: {result.stderr}")
-                output += f"\n[标准错误输出]:\n{result.stderr}"
-            if result.returncode != 0:
-                logger.error(f"指令执行失败，返回码: {result.returncode}")
-                output += f"\n[执行失败，退出状态码: {result.returncode}]"
+            output = result["stdout"]
+            if result["stderr"]:
+                logger.error(f"指令执行产生标准错误: {result['stderr']}")
+                output += f"\n[标准错误输出]:\n{result['stderr']}"
+            if result["returncode"] != 0:
+                logger.error(f"指令执行失败，返回码: {result['returncode']}")
+                output += f"\n[执行失败，退出状态码: {result['returncode']}]"
             
             logger.debug(f"指令执行结果回显长度: {len(output)}")
-            return output if output else "[命令执行成功，无回显内容]"
-        except subprocess.TimeoutExpired:
-            return "错误: 执行超时。"
+            output = output if output else "[命令执行成功，无回显内容]"
+            if cache_key and result["returncode"] == 0 and not result["log_path"]:
+                self.command_cache.put(cache_key, output)
+            return output
         except Exception as e:
             return f"执行过程中出错: {str(e)}"
+        finally:
+            # 执行期间完成的写入同样要让此前缓存的结果失效
+            if self.command_cache and not cache_key:
+                self.command_cache.bump()
+
+    def _run_block(self, block):
+        if self.interrupted:
+            return "[已中断，未执行]"
+        if "background" in block["flags"]:
+            return self.start_job(block["code"], is_python_code=block["lang"] == "python")
+        return self.execute_command(block["code"], is_python_code=block["lang"] == "python", on_output=block.get("on_output"))
+
+    def new_speculative_dispatcher(self, on_output=None):
+        """创建流式提前派发器，派发的代码块与正常执行共用同一调度器"""
+        return SpeculativeDispatcher(lambda b: self.scheduler.submit(dict(b, on_output=on_output)))
+
+    def submit_code_blocks(self, blocks, on_output=None, speculative=None):
+        """
+        按调度规则提交一轮回复中的所有代码块
+        speculative: 可选的 SpeculativeDispatcher，已提前派发且与最终回复一致的块直接复用其结果
+        返回 Future 列表，顺序与模型书写顺序一致
+        """
+        futures = speculative.reconcile(blocks) if speculative else [None] * len(blocks)
+        return [f or self.scheduler.submit(dict(b, on_output=on_output)) for b, f in zip(blocks, futures)]
+
+    def collect_code_results(self, blocks, futures):
+        """
+        取回已完成的代码块结果
+        返回 [(标题, 输出文本), ...]
+        """
+        results = []
+        for block, future in zip(blocks, futures):
+            try:
+                res = future.result()
+            except CancelledError:
+                res = "[已取消，未执行]"
+            except Exception as e:
+                res = f"执行过程中出错: {str(e)}"
+            results.append((block_title(block), res))
+        return results
+
+    def build_tool_feedback(self, results):
+        """
+        将本轮所有代码块的执行结果压缩并拼装为「容器执行反馈」消息
+        results: [(标题, 输出文本), ...]
+        """
+        parts = []
+        for title, output, saved in self.feedback_compactor.compact(results):
+            note = f" (反馈压缩节省约 {saved} tokens)" if saved else ""
+            parts.append(f"{title}{note}\n{output}")
+        return "容器执行反馈：\n" + "\n\n".join(parts)
 
     def chat(self, user_input):
+        """控制台模式的一轮对话，与 TUI 桥接层共用同一个回合引擎；Ctrl+C 会取消当前回合"""
         logger.info(f"收到用户输入: {user_input[:100]}...")
-        self.messages.append({"role": "user", "content": user_input})
-        
-        while True:
-            extra_body = {"enable_thinking": True}
-            response = self.client.chat.completions.create(
-                model=self.model_name,
-                messages=self.messages,
-                stream=True,
-                stream_options={"include_usage": True},
-                extra_body=extra_body
-            )
+        if self._console_loop is None:
+            self._console_loop = asyncio.new_event_loop()
+        loop = self._console_loop
 
-            full_content = ""
-            thinking_content = ""
-            done_thinking = False
-            
-            print(f"\n{'='*20} Alice 正在思考 ({self.model_name}) {'='*20}")
-            
-            for chunk in response:
-                if self.interrupted:
-                    logger.info("检测到中断信号，停止生成。")
-                    break
-                if chunk.choices:
-                    choice = chunk.choices[0]
-                    delta = getattr(choice, 'delta', None) or choice
-                    
-                    # 极度兼容的读取函数
-                    def get_val(obj, names):
-                        for name in names:
-                            res = getattr(obj, name, None)
-                            if res: return res
-                            if isinstance(obj, dict):
-                                res = obj.get(name)
-                                if res: return res
-                            if hasattr(obj, 'model_extra') and obj.model_extra:
-                                res = obj.model_extra.get(name)
-                                if res: return res
-                        return ""
-
-                    # 兼容多种模型的思考字段
-                    think_names = ['reasoning_content', 'reasoningContent', 'reasoning', 'thought', 'thought_content', 'thoughtContent']
-                    t_chunk = get_val(delta, think_names)
-                    if not t_chunk: t_chunk = get_val(choice, think_names)
-                    
-                    if t_chunk:
-                        logger.debug(f"Thinking Chunk: {t_chunk}")
-                        print(t_chunk, end='', flush=True)
-                        thinking_content += t_chunk
-                    
-                    c_chunk = get_val(delta, ['content'])
-                    if c_chunk: # 移除 elif，防止同一 chunk 中包含两种内容时丢失正文首字
-                        logger.debug(f"Content Chunk: {c_chunk}")
-                        if not done_thinking:
-                            print('\n\n' + "="*20 + " Alice 的回答 " + "="*20 + '\n')
-                            done_thinking = True
-                        print(c_chunk, end='', flush=True)
-                        full_content += c_chunk
-
-            # 提取代码块
-            python_codes = re.findall(r'```python\s*\n?(.*?)\s*```', full_content, re.DOTALL)
-            bash_commands = re.findall(r'```bash\s*\n?(.*?)\s*```', full_content, re.DOTALL)
-            
-            if not python_codes and not bash_commands:
-                self.messages.append({"role": "assistant", "content": full_content})
-                break
-                
-            self.messages.append({"role": "assistant", "content": full_content})
-            results = []
-            
-            for code in python_codes:
-                if self.interrupted: break
-                res = self.execute_command(code.strip(), is_python_code=True)
-                results.append(f"Python 代码执行结果:\n{res}")
-            
-            for cmd in bash_commands:
-                if self.interrupted: break
-                res = self.execute_command(cmd.strip(), is_python_code=False)
-                results.append(f"Shell 命令 `{cmd.strip()}` 的结果:\n{res}")
-            
-            if self.interrupted:
-                self.interrupted = False
-                break
-
-            feedback = "\n\n".join(results)
-            self.messages.append({"role": "user", "content": f"容器执行反馈：\n{feedback}"})
-            
-            # 刷新上下文
-            self._refresh_context()
-                
-            logger.info("系统快照已更新，反馈给 Alice。")
-            print(f"\n{'-'*40}\n系统快照已更新，结果已反馈给 Alice，继续生成中...")
+        engine = TurnEngine(self, emit=ConsoleRenderer(self.model_name))
+        task = loop.create_task(engine.run_turn(user_input))
+        try:
+            loop.run_until_complete(task)
+        except KeyboardInterrupt:
+            engine.interrupt()
+            try:
+                loop.run_until_complete(task)
+            except asyncio.CancelledError:
+                pass
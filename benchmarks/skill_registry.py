@@ -0,0 +1,101 @@
+"""
+技能注册表启动耗时基准：对比无缓存 (逐个读取解析 SKILL.md) 与使用 .alice_cache/skills.json 缓存的启动
+
+用法 (在项目根目录执行，不需要沙盒容器):
+    python benchmarks/skill_registry.py [--skills 500] [--changed 5] [--runs 5]
+
+在临时目录中生成指定数量的合成技能，分别测量:
+  冷启动    没有注册表缓存，所有 SKILL.md 都需要读取并解析 front matter
+  热启动    缓存与磁盘一致，只 stat 不读文件
+  部分变化  修改 --changed 个 SKILL.md 后启动，只重新解析变化的文件
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from snapshot_manager import SnapshotManager
+
+SKILL_TEMPLATE = """---
+name: skill-{i:04d}
+description: "合成技能 {i}：用于测试注册表启动耗时，描述中包含: 冒号与引号。"
+license: MIT
+allowed-tools: [bash, python]
+metadata:
+  author: benchmark
+  version: 1.0.{i}
+  category: synthetic
+---
+
+# skill-{i:04d}
+
+{body}
+"""
+
+
+def make_skills(root, count):
+    body = "\n".join(f"- 第 {n} 行用法说明，模拟真实技能文档的正文长度。" for n in range(150))
+    for i in range(count):
+        skill_dir = os.path.join(root, "skills", f"skill-{i:04d}")
+        os.makedirs(skill_dir)
+        with open(os.path.join(skill_dir, "SKILL.md"), "w", encoding="utf-8") as f:
+            f.write(SKILL_TEMPLATE.format(i=i, body=body))
+
+
+def touch_skills(root, count, round_no):
+    """修改前 count 个技能的描述 (大小与 mtime 都会变化)"""
+    for i in range(count):
+        path = os.path.join(root, "skills", f"skill-{i:04d}", "SKILL.md")
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(f"\n<!-- 修改 {round_no} -->\n")
+
+
+def startup(cache_path):
+    start = time.perf_counter()
+    mgr = SnapshotManager(core_paths=["skills"], cache_path=cache_path)
+    elapsed = (time.perf_counter() - start) * 1000
+    return elapsed, len(mgr.skills)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="技能注册表启动耗时基准 (无缓存 vs 磁盘缓存)")
+    parser.add_argument("--skills", type=int, default=500)
+    parser.add_argument("--changed", type=int, default=5)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="alice-skill-bench-")
+    cwd = os.getcwd()
+    try:
+        make_skills(root, args.skills)
+        os.chdir(root) # SnapshotManager 使用相对路径
+        cache_path = os.path.join(root, ".alice_cache", "skills.json")
+        results = {"冷启动": [], "热启动": [], "部分变化": []}
+        count = 0
+        for run in range(args.runs):
+            if os.path.exists(cache_path):
+                os.remove(cache_path)
+            elapsed, count = startup(cache_path)
+            results["冷启动"].append(elapsed)
+            results["热启动"].append(startup(cache_path)[0])
+            touch_skills(root, args.changed, run)
+            results["部分变化"].append(startup(cache_path)[0])
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(root, ignore_errors=True)
+
+    print(f"\n合成技能 {args.skills} 个 (注册 {count} 个)，部分变化 {args.changed} 个，每项 {args.runs} 次 (毫秒)")
+    print(f"{'场景':<10}{'中位数':>10}{'最小':>10}{'最大':>10}")
+    for name, samples in results.items():
+        print(f"{name:<10}{statistics.median(samples):>10.1f}{min(samples):>10.1f}{max(samples):>10.1f}")
+    cold, warm = statistics.median(results["冷启动"]), statistics.median(results["热启动"])
+    print(f"\n热启动加速: {cold / warm:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+技能启动耗时基准：对比普通 python 进程 (冷启动) 与经由技能预热进程 (zygote) fork 启动
+
+用法 (在项目根目录执行，需沙盒容器已在运行):
+    python benchmarks/skill_startup.py [--container alice-sandbox-instance] [--runs 5]
+
+每个技能以 --help / 无参数方式调用，只测量「导入依赖 + 解析参数」的启动开销；
+计时在容器内完成，不包含 docker exec 本身的开销。
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+import docker_api
+from sandbox_executor import SandboxExecutor
+from skill_zygote import SkillZygote, CONTAINER_SCRIPT, CONTAINER_SOCKET
+
+# (名称, 技能调用)
+SKILL_CALLS = [
+    ("akshare", "skills/akshare/akshare_tool.py --help"),
+    ("xlsx/recalc", "skills/xlsx/recalc.py"),
+    ("playwright/browser_tool", "skills/playwright_browser/browser_tool.py --help"),
+    ("playwright/scraper", "skills/playwright_browser/scraper.py --help"),
+]
+
+# 在容器内计时 (毫秒)，输出最后一行为耗时
+_TIMED = 'start=$(date +%s%N); {cmd} >/dev/null 2>&1; echo $(( ($(date +%s%N) - start) / 1000000 ))'
+
+
+def measure(executor, cmd, runs):
+    samples = []
+    for _ in range(runs):
+        result = executor.run(_TIMED.format(cmd=cmd), timeout=120)
+        samples.append(int(result["stdout"].strip().splitlines()[-1]))
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="技能启动耗时基准 (冷启动 vs 预热进程)")
+    parser.add_argument("--container", default="alice-sandbox-instance")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--preload", default=config.SKILL_ZYGOTE_PRELOAD)
+    args = parser.parse_args()
+
+    api = docker_api.connect() if config.DOCKER_API_ENABLED else None
+    executor = SandboxExecutor(args.container, use_daemon=config.EXEC_DAEMON_ENABLED, api=api)
+    zygote = SkillZygote(executor, args.preload.split(","))
+    if not zygote.start():
+        print("技能预热进程启动失败")
+        sys.exit(1)
+
+    # 预热进程在预加载完成后才开始监听，能连上即视为就绪
+    print(f"等待预热进程预加载 {zygote.preload} ...")
+    probe = f"python3 -c \"import socket; socket.socket(socket.AF_UNIX).connect('{CONTAINER_SOCKET}')\""
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        ready = executor.run(probe, timeout=10)
+        if ready["returncode"] == 0:
+            break
+        time.sleep(0.5)
+
+    print(f"\n{'技能':<28}{'冷启动 (ms)':>14}{'预热进程 (ms)':>16}{'加速比':>10}")
+    print("-" * 68)
+    for name, call in SKILL_CALLS:
+        cold = statistics.median(measure(executor, f"python {call}", args.runs))
+        warm = statistics.median(measure(executor, f"python3 {CONTAINER_SCRIPT} run {call}", args.runs))
+        speedup = f"{cold / warm:.1f}x" if warm else "-"
+        print(f"{name:<28}{cold:>14.0f}{warm:>16.0f}{speedup:>10}")
+    print(f"\n(每项取 {args.runs} 次运行的中位数)")
+    executor.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+import os
+import shlex
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger("CommandCache")
+
+# 无副作用的只读命令 (仅缓存不含管道、重定向、变量与通配符的单条简单命令)
+READ_ONLY_COMMANDS = {"ls", "cat", "head", "tail", "wc", "file", "du", "tree", "md5sum", "sha256sum"}
+
+# 只读的技能脚本：作用范围是整个容器工作目录
+READ_ONLY_SCRIPTS = {"skills/file_explorer/explorer.py"}
+
+# 需要带参数值的选项 (参数值不是路径)
+OPTIONS_WITH_VALUE = {
+    "head": {"-n", "-c"},
+    "tail": {"-n", "-c"},
+    "du": {"-d"},
+    "tree": {"-L", "-I", "-P"},
+    "ls": {"-I", "-w"},
+}
+
+# 会让命令不返回或结果随时间变化的选项
+VOLATILE_OPTIONS = {"tail": {"-f", "-F", "--follow"}}
+
+_UNSAFE_CHARS = set(";&|<>`$(){}*?[]~!\\\n")
+
+# 目录指纹最多统计的条目数，超出则不缓存 (避免为大目录付出过高的遍历开销)
+MAX_FINGERPRINT_ENTRIES = 2000
+
+# 容器工作目录 (skills/ 与 alice_output/ 挂载于其下)
+CONTAINER_ROOT = "/app"
+
+
+class CommandCache:
+    """
+    只读工具命令的结果缓存
+    缓存键 = 规范化后的命令 + 所涉及路径的 (mtime, size) 指纹。skills/ 与 alice_output/ 是绑定挂载目录，
+    宿主机与容器看到的是同一份文件，因此在宿主机上 stat 即可判断结果是否仍然有效，无需进入容器。
+    作用于整个容器工作目录 (如 `ls`、explorer.py --tree) 的命令，指纹中额外包含一个「容器写入纪元」：
+    每执行一次非只读命令纪元加一，后台任务运行期间此类命令不缓存。
+    按 LRU 淘汰，总字节数不超过 max_bytes。
+    """
+    def __init__(self, mounts, max_bytes=8 * 1024 * 1024, max_entry_bytes=None):
+        self.mounts = mounts # {"skills": 宿主机路径, "alice_output": 宿主机路径}
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes or max_bytes // 8
+        self.epoch = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict() # key -> 输出文本
+        self._size = 0
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # 缓存键
+    # ------------------------------------------------------------------
+    def _parse(self, command):
+        """解析只读命令，返回 (argv, 容器内相对路径列表) 或 None；"." 表示整个工作目录"""
+        if any(c in _UNSAFE_CHARS for c in command):
+            return None
+        try:
+            argv = shlex.split(command)
+        except ValueError:
+            return None
+        if not argv:
+            return None
+
+        name = argv[0]
+        if name in ("python", "python3"):
+            if len(argv) > 1 and argv[1] in READ_ONLY_SCRIPTS:
+                return argv, ["."]
+            return None
+        if name not in READ_ONLY_COMMANDS:
+            return None
+
+        paths = []
+        args = iter(argv[1:])
+        for arg in args:
+            if arg in VOLATILE_OPTIONS.get(name, ()):
+                return None
+            if arg in OPTIONS_WITH_VALUE.get(name, ()):
+                next(args, None)
+            elif not arg.startswith("-"):
+                paths.append(arg)
+        if not paths:
+            if name != "ls":
+                return None # 读取 stdin 的命令
+            paths = ["."]
+        return argv, paths
+
+    def _host_path(self, path):
+        """容器内路径 -> 宿主机路径，不在挂载目录内时返回 None"""
+        if path.startswith(CONTAINER_ROOT + "/"):
+            path = path[len(CONTAINER_ROOT) + 1:]
+        elif os.path.isabs(path):
+            return None
+        path = os.path.normpath(path)
+        head, _, rest = path.partition(os.sep)
+        if head not in self.mounts:
+            return None
+        return os.path.join(self.mounts[head], rest) if rest else self.mounts[head]
+
+    def _fingerprint(self, host_path, budget):
+        """路径的 (mtime, size) 指纹，目录递归统计；遇到符号链接或条目过多时返回 None"""
+        try:
+            st = os.lstat(host_path)
+        except FileNotFoundError:
+            return ("missing",)
+        except OSError:
+            return None
+        if os.path.islink(host_path):
+            return None
+        entries = [("", st.st_mtime_ns, st.st_size)]
+        if not os.path.isdir(host_path):
+            return tuple(entries)
+        for root, dirs, files in os.walk(host_path):
+            dirs.sort()
+            for name in sorted(dirs + files):
+                full = os.path.join(root, name)
+                try:
+                    est = os.lstat(full)
+                except OSError:
+                    return None
+                if os.path.islink(full):
+                    return None
+                entries.append((os.path.relpath(full, host_path), est.st_mtime_ns, est.st_size))
+                budget[0] -= 1
+                if budget[0] < 0:
+                    return None
+        return tuple(entries)
+
+    def key_for(self, command, allow_container_scope=True):
+        """返回命令的缓存键，命令不可缓存时返回 None"""
+        parsed = self._parse(command.strip())
+        if parsed is None:
+            return None
+        argv, paths = parsed
+        budget = [MAX_FINGERPRINT_ENTRIES]
+        prints = []
+        for path in paths:
+            if os.path.normpath(path) in (".", CONTAINER_ROOT):
+                if not allow_container_scope:
+                    return None
+                # 工作目录下宿主机可见的部分按指纹校验，其余部分依赖容器写入纪元
+                prints.append(("epoch", self.epoch))
+                for mount in sorted(self.mounts):
+                    prints.append((mount, self._fingerprint(self.mounts[mount], budget)))
+            else:
+                host_path = self._host_path(path)
+                if host_path is None:
+                    return None
+                prints.append((path, self._fingerprint(host_path, budget)))
+        if any(fp is None for _, fp in prints):
+            return None
+        return (tuple(argv), tuple(prints))
+
+    # ------------------------------------------------------------------
+    # 读写
+    # ------------------------------------------------------------------
+    def get(self, key):
+        with self._lock:
+            output = self._entries.get(key)
+            if output is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            stats = self._stats_text()
+        logger.info(f"命令缓存{'命中' if output is not None else '未命中'}: {' '.join(key[0])[:100]} ({stats})")
+        return output
+
+    def put(self, key, output):
+        size = len(output.encode("utf-8"))
+        if size > self.max_entry_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old.encode("utf-8"))
+            self._entries[key] = output
+            self._size += size
+            while self._size > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted.encode("utf-8"))
+
+    def bump(self):
+        """容器内执行了可能产生写入的命令：作用于整个工作目录的缓存条目随之失效"""
+        self.epoch += 1
+
+    def _stats_text(self):
+        total = self.hits + self.misses
+        rate = self.hits / total * 100 if total else 0
+        return f"命中 {self.hits} / 未命中 {self.misses}，命中率 {rate:.0f}%，{len(self._entries)} 条 {self._size} 字节"
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries), "bytes": self._size, "epoch": self.epoch}
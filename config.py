@@ -26,6 +26,9 @@ DEFAULT_PROMPT_PATH = "prompts/alice.md"
 # 记忆文件路径
 MEMORY_FILE_PATH = "memory/alice_memory.md"
 
+# 记忆库 (SQLite)：长期/短期记忆的存储，对应的 markdown 文件由其生成
+MEMORY_DB_PATH = "memory/alice_memory.db"
+
 # 任务清单路径
 TODO_FILE_PATH = "memory/todo.md"
 
@@ -38,3 +41,69 @@ WORKING_MEMORY_MAX_ROUNDS = int(get_env_var("WORKING_MEMORY_MAX_ROUNDS", 30))
 
 # 输出目录
 ALICE_OUTPUT_DIR = "alice_output"
+
+# 容器执行守护进程 (复用单条 docker exec 通道，失败时自动回退)
+EXEC_DAEMON_ENABLED = get_env_var("EXEC_DAEMON_ENABLED", "true").lower() == "true"
+
+# 持久化 Python 内核 (可选)：```python 代码块共享同一解释器，变量在块之间保留
+PYTHON_KERNEL_ENABLED = get_env_var("PYTHON_KERNEL_ENABLED", "false").lower() == "true"
+PYTHON_KERNEL_MEMORY_MB = int(get_env_var("PYTHON_KERNEL_MEMORY_MB", 4096))
+
+# 工具输出捕获上限 (字节)：超出部分仅保留头尾，完整日志落盘到 alice_output/logs/
+TOOL_OUTPUT_MAX_BYTES = int(get_env_var("TOOL_OUTPUT_MAX_BYTES", 256 * 1024))
+
+# 工具反馈压缩：每轮「容器执行反馈」的总 token 预算，按代码块分配
+FEEDBACK_TOKEN_BUDGET = int(get_env_var("FEEDBACK_TOKEN_BUDGET", 8000))
+
+# 代码块并发执行：标注了 parallel 的代码块可共享的最大工作线程数
+PARALLEL_MAX_WORKERS = int(get_env_var("PARALLEL_MAX_WORKERS", 4))
+
+# 流式提前执行 (可选)：代码块一闭合即派发执行，不等整条回复生成完毕
+SPECULATIVE_EXECUTION = get_env_var("SPECULATIVE_EXECUTION", "false").lower() == "true"
+
+# Docker Engine API：直接经由 Unix Socket 与守护进程通信 (Socket 不可用时自动回退到 docker CLI)
+DOCKER_API_ENABLED = get_env_var("DOCKER_API_ENABLED", "true").lower() == "true"
+
+# 沙盒容器池 (可选，需 Docker Engine API)：预热 N 个容器，每个会话独占租用一个，0 表示使用单个常驻容器
+SANDBOX_POOL_SIZE = int(get_env_var("SANDBOX_POOL_SIZE", 0))
+# 池容器累计被租用多少次后重建 (丢弃累积的 pip 包等状态)
+SANDBOX_POOL_MAX_USES = int(get_env_var("SANDBOX_POOL_MAX_USES", 50))
+# 等待空闲池容器的最长时间 (秒)，超时 (如其他 Alice 进程占满了所有容器) 则回退到单个常驻容器
+SANDBOX_POOL_ACQUIRE_TIMEOUT = int(get_env_var("SANDBOX_POOL_ACQUIRE_TIMEOUT", 30))
+
+# 后台任务 (```bash background)：单个任务的最长运行时间 (秒)，0 表示不限
+JOB_TIMEOUT = int(get_env_var("JOB_TIMEOUT", 6 * 3600))
+
+# 技能预热进程 (可选)：容器内常驻 fork server 预先导入重量级模块，`python skills/xxx.py` 调用从中 fork 启动
+SKILL_ZYGOTE_ENABLED = get_env_var("SKILL_ZYGOTE_ENABLED", "false").lower() == "true"
+SKILL_ZYGOTE_PRELOAD = get_env_var("SKILL_ZYGOTE_PRELOAD", "pandas,numpy,openpyxl,akshare,playwright.async_api")
+
+# 只读命令结果缓存 (ls / cat / head / wc / explorer.py 等) 的总字节上限，0 表示关闭
+COMMAND_CACHE_MAX_BYTES = int(get_env_var("COMMAND_CACHE_MAX_BYTES", 8 * 1024 * 1024))
+
+# 前缀缓存友好的提示词布局：记忆消息跨轮次保持不变，即时对话背景/任务清单等实时状态放在请求末尾
+PROMPT_CACHE_LAYOUT = get_env_var("PROMPT_CACHE_LAYOUT", "true").lower() == "true"
+
+# 记忆检索：长期+短期记忆超过该 token 预算时，只注入与当前输入最相关的条目 (0 表示始终全量注入)
+MEMORY_RECALL_TOKEN_BUDGET = int(get_env_var("MEMORY_RECALL_TOKEN_BUDGET", 2000))
+MEMORY_RECALL_TOP_K = int(get_env_var("MEMORY_RECALL_TOP_K", 20))
+# 可选的向量检索模型 (OpenAI 兼容 embeddings 接口)，留空则仅使用 BM25
+MEMORY_EMBEDDING_MODEL = get_env_var("MEMORY_EMBEDDING_MODEL", "")
+
+# 后台记忆提炼：使用的模型 (留空则与对话模型相同，可配置更便宜的模型)、检查间隔与逐日提炼的间隔 (秒)
+DISTILL_MODEL_NAME = get_env_var("DISTILL_MODEL_NAME", "")
+DISTILL_INTERVAL = int(get_env_var("DISTILL_INTERVAL", 3600))
+DISTILL_SPACING = int(get_env_var("DISTILL_SPACING", 5))
+
+# 会话滚动摘要：上下文截断时被移出的消息在后台合并为摘要 (模型留空则依次回退到 DISTILL_MODEL_NAME、对话模型)
+SESSION_SUMMARY_ENABLED = get_env_var("SESSION_SUMMARY_ENABLED", "true").lower() == "true"
+SESSION_SUMMARY_MODEL_NAME = get_env_var("SESSION_SUMMARY_MODEL_NAME", "")
+SESSION_SUMMARY_MAX_TOKENS = int(get_env_var("SESSION_SUMMARY_MAX_TOKENS", 800))
+
+# 技能按相关性注入：技能数超过 SKILL_INJECT_TOP_K 时，每轮只注入与当前输入最相关的 K 个 (0 表示始终列出全部)
+SKILL_INJECT_TOP_K = int(get_env_var("SKILL_INJECT_TOP_K", 8))
+# 技能检索的向量模型，默认与记忆检索相同 (留空则仅使用 BM25)
+SKILL_EMBEDDING_MODEL = get_env_var("SKILL_EMBEDDING_MODEL", MEMORY_EMBEDDING_MODEL)
+
+# 技能快照使用 inotify 监听 skills/ 变化 (仅 Linux，不可用时自动退回按 mtime 检查)
+SNAPSHOT_INOTIFY = get_env_var("SNAPSHOT_INOTIFY", "true").lower() == "true"
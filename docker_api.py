@@ -0,0 +1,282 @@
+import os
+import json
+import select
+import socket
+import struct
+import logging
+import threading
+import http.client
+from urllib.parse import quote, urlencode
+
+logger = logging.getLogger("DockerAPI")
+
+DEFAULT_SOCKET_PATH = "/var/run/docker.sock"
+
+# 多路复用流的帧头：1 字节流类型 + 3 字节填充 + 4 字节大端长度
+_FRAME_HEADER = struct.Struct(">BxxxL")
+_STREAM_NAMES = {1: "stdout", 2: "stderr"}
+
+
+class DockerAPIError(Exception):
+    """Docker Engine API 返回了非预期的状态码"""
+    def __init__(self, status, message):
+        super().__init__(f"Docker API 错误 ({status}): {message}")
+        self.status = status
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    """经由 Unix Socket 的 HTTP 连接"""
+    def __init__(self, socket_path, timeout=None):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        self.sock = sock
+
+
+def _connection_dropped(conn):
+    """空闲的长连接是否已被对端关闭 (可读即意味着收到了 EOF 或多余数据，均不能再复用)"""
+    if conn.sock is None:
+        return True
+    try:
+        readable, _, _ = select.select([conn.sock], [], [], 0)
+    except (OSError, ValueError):
+        return True
+    return bool(readable)
+
+
+def socket_path_from_env():
+    """按 DOCKER_HOST 解析 Docker 守护进程的 Unix Socket 路径，非 unix:// 地址返回 None"""
+    host = os.environ.get("DOCKER_HOST", "")
+    if not host:
+        return DEFAULT_SOCKET_PATH
+    if host.startswith("unix://"):
+        return host[len("unix://"):]
+    return None
+
+
+class ExecStream:
+    """
+    exec 的输出流 (独占一条连接)
+    Docker 在非 TTY 模式下把 stdout / stderr 复用在同一条流上，按帧头拆分。
+    """
+    def __init__(self, conn, response, sock):
+        self.conn = conn
+        self.response = response
+        # 响应没有 Content-Length 时 getresponse() 会把连接交给响应并清空 conn.sock，这里保留原始 socket 供 close() 使用
+        self.sock = sock
+
+    def _read_exact(self, n):
+        buf = b""
+        while len(buf) < n:
+            data = self.response.read(n - len(buf))
+            if not data:
+                return None
+            buf += data
+        return buf
+
+    def frames(self):
+        """逐帧产出 (流名称, 数据)，流结束或连接被关闭时停止"""
+        try:
+            while True:
+                header = self._read_exact(_FRAME_HEADER.size)
+                if header is None:
+                    return
+                stream_type, size = _FRAME_HEADER.unpack(header)
+                data = self._read_exact(size) if size else b""
+                if data is None:
+                    return
+                name = _STREAM_NAMES.get(stream_type)
+                if name:
+                    yield name, data
+        except (OSError, ValueError, http.client.HTTPException):
+            # close() 从其他线程关闭连接时会打断阻塞中的读取
+            return
+
+    def close(self):
+        """关闭连接 (可从其他线程调用，用于中断阻塞中的读取)"""
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.response.close()
+        self.conn.close()
+
+
+class DockerAPI:
+    """
+    Docker Engine API 客户端
+    直接通过 /var/run/docker.sock 与守护进程通信，控制类请求复用同一条长连接，
+    避免每次调用 docker CLI 都要启动一个 Go 进程、解析配置并重新建立连接。
+    exec 的输出流各自占用独立连接，不阻塞控制请求。
+    """
+    def __init__(self, socket_path=DEFAULT_SOCKET_PATH, timeout=30):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _new_connection(self, timeout=None):
+        return _UnixHTTPConnection(self.socket_path, timeout=timeout)
+
+    def _request(self, method, path, body=None, params=None):
+        """
+        发送一个控制请求，返回 (状态码, 解析后的 JSON 或 None)
+        复用的长连接失效时自动重连重试一次，但仅限请求尚未送达、或幂等的 GET 在送达后遇到对端断开；
+        超时与非 GET 请求送达后的失败不重试，避免重复创建容器或重复执行命令。
+        """
+        if params:
+            path = f"{path}?{urlencode(params)}"
+        payload = json.dumps(body).encode("utf-8") if body is not None else None
+        headers = {"Content-Type": "application/json"} if payload is not None else {}
+
+        with self._lock:
+            for attempt in (1, 2):
+                if self._conn is not None and _connection_dropped(self._conn):
+                    self._conn.close()
+                    self._conn = None
+                reused = self._conn is not None
+                if self._conn is None:
+                    self._conn = self._new_connection(timeout=self.timeout)
+                sent = False
+                try:
+                    self._conn.request(method, path, body=payload, headers=headers)
+                    sent = True
+                    resp = self._conn.getresponse()
+                    data = resp.read()
+                    break
+                except (OSError, http.client.HTTPException) as e:
+                    self._conn.close()
+                    self._conn = None
+                    stale = reused and not isinstance(e, TimeoutError) and (
+                        not sent or (method == "GET" and isinstance(e, ConnectionError)))
+                    if attempt == 2 or not stale:
+                        raise
+        if not data:
+            return resp.status, None
+        try:
+            return resp.status, json.loads(data)
+        except ValueError:
+            return resp.status, data.decode("utf-8", errors="replace")
+
+    @staticmethod
+    def _check(status, data, expected):
+        if status not in expected:
+            message = data.get("message") if isinstance(data, dict) else data
+            raise DockerAPIError(status, message)
+        return data
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # ------------------------------------------------------------------
+    # 守护进程 / 镜像 / 容器
+    # ------------------------------------------------------------------
+    def ping(self):
+        """守护进程是否可达"""
+        try:
+            status, _ = self._request("GET", "/_ping")
+        except (OSError, ValueError, http.client.HTTPException):
+            # 半开连接上的 RemoteDisconnected / BadStatusLine 等同样视为不可达，调用方回退到 docker CLI
+            return False
+        return status == 200
+
+    def inspect_image(self, name):
+        """返回镜像详情，不存在时返回 None"""
+        status, data = self._request("GET", f"/images/{quote(name, safe='')}/json")
+        if status == 404:
+            return None
+        return self._check(status, data, (200,))
+
+    def inspect_container(self, name):
+        """返回容器详情，不存在时返回 None"""
+        status, data = self._request("GET", f"/containers/{quote(name, safe='')}/json")
+        if status == 404:
+            return None
+        return self._check(status, data, (200,))
+
+    def create_container(self, name, config):
+        """按 Engine API 的容器配置创建容器，返回容器 ID"""
+        status, data = self._request("POST", "/containers/create", body=config, params={"name": name})
+        return self._check(status, data, (201,))["Id"]
+
+    def start_container(self, name):
+        status, data = self._request("POST", f"/containers/{quote(name, safe='')}/start")
+        # 304 表示容器本就在运行
+        self._check(status, data, (204, 304))
+
+    def remove_container(self, name, force=False):
+        """删除容器，不存在时静默返回"""
+        params = {"force": "true"} if force else None
+        status, data = self._request("DELETE", f"/containers/{quote(name, safe='')}", params=params)
+        self._check(status, data, (204, 404))
+
+    # ------------------------------------------------------------------
+    # exec
+    # ------------------------------------------------------------------
+    def exec_create(self, container, cmd, workdir=None, env=None):
+        """创建 exec 实例 (不分配 TTY，不接 stdin)，返回 exec ID"""
+        config = {
+            "AttachStdin": False,
+            "AttachStdout": True,
+            "AttachStderr": True,
+            "Tty": False,
+            "Cmd": cmd,
+        }
+        if workdir:
+            config["WorkingDir"] = workdir
+        if env:
+            config["Env"] = [f"{k}={v}" for k, v in env.items()]
+        status, data = self._request("POST", f"/containers/{quote(container, safe='')}/exec", body=config)
+        return self._check(status, data, (201,))["Id"]
+
+    def exec_start(self, exec_id, detach=False):
+        """
+        启动 exec 实例
+        detach=False 时返回 ExecStream (独占一条新连接)，detach=True 时立即返回 None
+        """
+        body = {"Detach": detach, "Tty": False}
+        if detach:
+            status, data = self._request("POST", f"/exec/{exec_id}/start", body=body)
+            self._check(status, data, (200, 204))
+            return None
+
+        # 输出流可能持续很久，不设读超时，由调用方负责超时与关闭
+        conn = self._new_connection(timeout=None)
+        try:
+            conn.request("POST", f"/exec/{exec_id}/start", body=json.dumps(body).encode("utf-8"),
+                         headers={"Content-Type": "application/json"})
+            sock = conn.sock
+            resp = conn.getresponse()
+        except Exception:
+            conn.close()
+            raise
+        if resp.status != 200:
+            data = resp.read().decode("utf-8", errors="replace")
+            conn.close()
+            raise DockerAPIError(resp.status, data)
+        return ExecStream(conn, resp, sock)
+
+    def exec_inspect(self, exec_id):
+        """返回 exec 实例状态 (含 Running / ExitCode / Pid)"""
+        status, data = self._request("GET", f"/exec/{exec_id}/json")
+        return self._check(status, data, (200,))
+
+
+def connect(socket_path=None):
+    """按环境变量创建客户端；Socket 不存在 (如远程 DOCKER_HOST) 时返回 None，调用方应回退到 docker CLI"""
+    socket_path = socket_path or socket_path_from_env()
+    if not socket_path or not os.path.exists(socket_path):
+        logger.info("未找到 Docker Socket，使用 docker CLI。")
+        return None
+    return DockerAPI(socket_path)
@@ -0,0 +1,193 @@
+import re
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+logger = logging.getLogger("ExecutionScheduler")
+
+# 代码块围栏后可附加的调度标注，例如 ```bash parallel / ```bash background
+BLOCK_FLAGS = {"parallel", "background"}
+
+_BLOCK_RE = re.compile(r'```(python|bash)([ \t]+[^\n`]*)?\s*\n?(.*?)\s*```', re.DOTALL)
+
+
+def extract_code_blocks(text):
+    """
+    按源码顺序提取回复中的可执行代码块
+    返回 [{"lang": "python" | "bash", "code": str, "flags": set}, ...]
+    """
+    blocks = []
+    for match in _BLOCK_RE.finditer(text):
+        lang, info, code = match.group(1), (match.group(2) or "").strip(), match.group(3)
+        words = info.split()
+        if words and all(w in BLOCK_FLAGS for w in words):
+            flags = set(words)
+        else:
+            # 围栏同一行上的不是标注而是代码本身 (如 ```bash ls```)
+            flags = set()
+            code = f"{info} {code}".strip() if info else code
+        blocks.append({"lang": lang, "code": code.strip(), "flags": flags})
+    return blocks
+
+
+def block_title(block):
+    """生成执行反馈中的代码块标题"""
+    if block["lang"] == "python":
+        return "Python 代码执行结果:"
+    return f"Shell 命令 `{block['code']}` 的结果:"
+
+
+class ExecutionScheduler:
+    """
+    代码块执行调度器
+    - 默认按源码顺序串行执行：每个普通块都要等待之前提交的所有块完成
+    - 标注了 parallel 的块只需等待上一个普通块，彼此之间在有界线程池中并发执行
+    - 结果通过 Future 按提交顺序取回，因此反馈顺序始终与模型书写顺序一致
+    """
+    def __init__(self, run_block, max_workers=4):
+        self.run_block = run_block
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="alice-exec")
+        self._lock = threading.Lock()
+        self._barrier = None # 最近一个普通 (串行) 块的 Future
+        self._since_barrier = [] # 屏障之后提交的并发块
+        self._pending = [] # 已提交但尚未启动的块
+
+    def submit(self, block):
+        """提交一个代码块，返回其结果 Future"""
+        future = Future()
+        with self._lock:
+            if "parallel" in block["flags"]:
+                deps = [self._barrier] if self._barrier else []
+                self._since_barrier.append(future)
+            else:
+                deps = ([self._barrier] if self._barrier else []) + self._since_barrier
+                self._barrier = future
+                self._since_barrier = []
+            self._pending.append(future)
+
+        remaining = [len(deps)]
+        dep_lock = threading.Lock()
+
+        def launch():
+            with self._lock:
+                if future in self._pending:
+                    self._pending.remove(future)
+            if not future.set_running_or_notify_cancel():
+                return
+            self.pool.submit(self._run, block, future)
+
+        def on_dep_done(_):
+            with dep_lock:
+                remaining[0] -= 1
+                ready = remaining[0] == 0
+            if ready:
+                launch()
+
+        if not deps:
+            launch()
+        for dep in deps:
+            dep.add_done_callback(on_dep_done)
+        return future
+
+    def _run(self, block, future):
+        try:
+            future.set_result(self.run_block(block))
+        except BaseException as e:
+            logger.error(f"代码块执行异常: {e}")
+            future.set_exception(e)
+
+    def run_all(self, blocks):
+        """提交一批代码块并按源码顺序返回结果"""
+        futures = [self.submit(b) for b in blocks]
+        return [f.result() for f in futures]
+
+    def cancel_pending(self):
+        """取消所有尚未开始执行的块"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        for future in pending:
+            future.cancel()
+        return len(pending)
+
+    def shutdown(self):
+        self.cancel_pending()
+        self.pool.shutdown(wait=False)
+
+
+def _block_key(block):
+    return (block["lang"], block["code"], frozenset(block["flags"]))
+
+
+class SpeculativeDispatcher:
+    """
+    流式生成期间的提前派发器
+    模型每闭合一个 ```python / ```bash 代码块就立即提交执行，把工具耗时隐藏在生成时间之后。
+    是否派发以已接收正文的完整解析为准 (与回合结束时 extract_code_blocks 的结果一致)，只按源码顺序派发
+    下标为 len(dispatched) 的块，StreamManager 的围栏识别有误时也不会跳过或重排代码块。
+    回合结束时用最终解析出的代码块对账：前缀一致的复用已有结果；其余尚未开始的取消，已开始的绝不重复执行。
+    """
+    def __init__(self, submit):
+        self.submit = submit # (block) -> Future
+        self.dispatched = [] # [(block, future), ...]
+        self.cancelled = False
+        self.text = "" # 目前已接收的正文
+
+    def feed(self, chunk):
+        """追加流式正文 (须在 StreamManager 处理该分片之前调用)"""
+        self.text += chunk
+
+    def dispatch_text(self, block_text):
+        """StreamManager 的代码块闭合回调；block_text 只作为触发信号，派发内容以完整正文的解析为准"""
+        if self.cancelled:
+            return
+        blocks = extract_code_blocks(self.text)
+        for (spec, _), block in zip(self.dispatched, blocks):
+            if _block_key(spec) != _block_key(block):
+                # 已派发的块与正文解析不一致：停止提前派发，其余交给回合结束时按最终回复执行
+                logger.warning(f"提前派发的代码块与正文解析不一致，停止提前派发: {spec['code'][:100]}")
+                self.cancelled = True
+                return
+        for block in blocks[len(self.dispatched):]:
+            if "background" in block["flags"]:
+                # 后台任务一经启动便无法随回复撤回，且本身立即返回，无需提前派发；其后的块也不再提前派发
+                self.cancelled = True
+                return
+            logger.info(f"提前派发代码块 ({block['lang']}): {block['code'][:100]}")
+            self.dispatched.append((block, self.submit(block)))
+
+    def cancel_all(self):
+        """中断时取消全部提前派发的代码块"""
+        self.cancelled = True
+        for _, future in self.dispatched:
+            future.cancel()
+
+    def reconcile(self, final_blocks):
+        """
+        与最终代码块对账
+        返回与 final_blocks 等长的 Future 列表，未能复用的位置为 None (由调用方重新提交)
+        前缀之外的提前派发块：尚未开始的取消；已开始的不能撤回，若最终回复中仍有相同的块则复用其结果
+        (不重复执行)，否则只记录警告。调度器按提交顺序排队，之后提交的普通块会等待它们结束。
+        """
+        futures = [None] * len(final_blocks)
+        matched = 0
+        for i, block in enumerate(final_blocks):
+            if i >= len(self.dispatched):
+                break
+            spec, future = self.dispatched[i]
+            if _block_key(spec) != _block_key(block):
+                break
+            futures[i] = future
+            matched += 1
+
+        for spec, future in self.dispatched[matched:]:
+            if future.cancel():
+                logger.warning(f"提前派发的代码块未出现在最终回复的相同位置，已取消: {spec['code'][:100]}")
+                continue
+            for i in range(matched, len(final_blocks)):
+                if futures[i] is None and _block_key(final_blocks[i]) == _block_key(spec):
+                    futures[i] = future
+                    logger.warning(f"提前派发的代码块已开始执行，复用其结果而不重复执行: {spec['code'][:100]}")
+                    break
+            else:
+                logger.warning(f"提前派发的代码块已开始执行但未出现在最终回复中: {spec['code'][:100]}")
+        return futures
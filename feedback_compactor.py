@@ -0,0 +1,169 @@
+import os
+import re
+import logging
+import itertools
+from datetime import datetime
+from token_counter import count_tokens
+
+logger = logging.getLogger("FeedbackCompactor")
+
+# ANSI 颜色/光标控制序列与 OSC 序列
+_ANSI_RE = re.compile(r'\x1b\[[0-9;?]*[ -/]*[@-~]|\x1b\][^\x07\x1b]*(?:\x07|\x1b\\)|\x1b[@-Z\\-_]')
+# 常见进度条行：tqdm / pip / wget / curl 等
+_PROGRESS_RE = re.compile(
+    r'^\s*(?:'
+    r'\d{1,3}%\s*\|.*|'                           # tqdm:  45%|████      | 45/100
+    r'.*[━█▉▊▋▌▍▎▏#=>]{5,}.*\d{1,3}(?:\.\d+)?%|'   # 各类字符进度条 + 百分比
+    r'\s*\d{1,3}(?:\.\d+)?%\s*$|'                  # 纯百分比
+    r'.*\d+(?:\.\d+)?\s*[kKMG]i?B/s.*'             # 下载速率行
+    r')\s*$'
+)
+
+_file_ids = itertools.count(1)
+
+
+class FeedbackCompactor:
+    """
+    工具反馈压缩管线
+    在把「容器执行反馈」送回模型前依次执行：
+    1. 剥离 ANSI 控制序列与进度条 (\\r 覆写的中间帧只保留最后一帧)
+    2. 折叠连续重复的行
+    3. 按 token 预算做头尾截断，完整内容落盘并在反馈中给出路径
+    整轮反馈共享一个 token 预算，按「小块先满足、剩余均分」的方式分配给各代码块。
+    """
+    def __init__(self, round_budget=8000, min_block_budget=200, spill_dir="alice_output/feedback"):
+        self.round_budget = round_budget
+        self.min_block_budget = min_block_budget
+        self.spill_dir = spill_dir
+
+    # ------------------------------------------------------------------
+    # 清洗
+    # ------------------------------------------------------------------
+    def clean(self, text):
+        text = _ANSI_RE.sub('', text)
+        lines = []
+        for line in text.split('\n'):
+            # 回车覆写：终端上只会看到最后一帧
+            if '\r' in line:
+                frames = [f for f in line.split('\r') if f.strip()]
+                line = frames[-1] if frames else ''
+            lines.append(line)
+        lines = self._drop_progress(lines)
+        return '\n'.join(self._collapse_repeats(lines))
+
+    def _drop_progress(self, lines):
+        """连续的进度条行只保留最后一行"""
+        result = []
+        for line in lines:
+            if _PROGRESS_RE.match(line) and result and _PROGRESS_RE.match(result[-1]):
+                result[-1] = line
+            else:
+                result.append(line)
+        return result
+
+    def _collapse_repeats(self, lines):
+        result = []
+        prev, repeats = None, 0
+        for line in lines:
+            if line == prev and line.strip():
+                repeats += 1
+                continue
+            if repeats:
+                result.append(f"...[上一行重复 {repeats} 次]")
+            result.append(line)
+            prev, repeats = line, 0
+        if repeats:
+            result.append(f"...[上一行重复 {repeats} 次]")
+        return result
+
+    # ------------------------------------------------------------------
+    # 截断
+    # ------------------------------------------------------------------
+    def _spill(self, text):
+        os.makedirs(self.spill_dir, exist_ok=True)
+        filename = f"feedback-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(_file_ids)}.txt"
+        path = os.path.join(self.spill_dir, filename)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return path
+
+    def _cut_chars(self, text, budget, from_end=False):
+        """单行过长时按字符比例截取"""
+        tokens = max(count_tokens(text), 1)
+        keep = max(int(len(text) * budget / tokens), 0)
+        return text[-keep:] if from_end and keep else text[:keep]
+
+    def truncate(self, text, budget, full_text=None):
+        """按 token 预算保留头部 (60%) 与尾部 (40%)，中间替换为落盘指针"""
+        total = count_tokens(text)
+        if total <= budget:
+            return text
+
+        lines = text.split('\n')
+        head_budget = int(budget * 0.6)
+        tail_budget = budget - head_budget
+
+        head, used = [], 0
+        for line in lines:
+            t = count_tokens(line) + 1
+            if used + t > head_budget:
+                if not head:
+                    head.append(self._cut_chars(line, head_budget))
+                break
+            head.append(line)
+            used += t
+
+        tail, used = [], 0
+        for line in reversed(lines[len(head):]):
+            t = count_tokens(line) + 1
+            if used + t > tail_budget:
+                if not tail:
+                    tail.append(self._cut_chars(line, tail_budget, from_end=True))
+                break
+            tail.append(line)
+            used += t
+        tail.reverse()
+
+        omitted = max(len(lines) - len(head) - len(tail), 0)
+        path = self._spill(full_text if full_text is not None else text)
+        marker = f"...[已省略 {omitted} 行 (约 {total - budget} tokens)，完整输出已保存至 {path}]..."
+        return '\n'.join(head + [marker] + tail)
+
+    # ------------------------------------------------------------------
+    # 整轮压缩
+    # ------------------------------------------------------------------
+    def _allocate(self, sizes):
+        """
+        在整轮预算内分配各块额度：需求小的块先被完全满足，剩余额度由其余块均分
+        每块至少 min_block_budget (块数过多时下调为均分额度)，各块之和不超过 round_budget
+        """
+        budgets = [0] * len(sizes)
+        if not sizes:
+            return budgets
+        remaining = self.round_budget
+        floor = min(self.min_block_budget, self.round_budget // len(sizes))
+        order = sorted(range(len(sizes)), key=lambda i: sizes[i])
+        for n, i in enumerate(order):
+            share = min(max(remaining // (len(order) - n), floor), remaining)
+            budgets[i] = min(sizes[i], share)
+            remaining -= budgets[i]
+        return budgets
+
+    def compact(self, blocks):
+        """
+        blocks: [(标题, 输出文本), ...]
+        返回 [(标题, 压缩后文本, 节省的 token 数), ...]，顺序不变
+        """
+        cleaned = [self.clean(output) for _, output in blocks]
+        sizes = [count_tokens(text) for text in cleaned]
+        budgets = self._allocate(sizes)
+
+        result = []
+        for (title, output), text, budget in zip(blocks, cleaned, budgets):
+            compacted = self.truncate(text, budget, full_text=output)
+            saved = max(count_tokens(output) - count_tokens(compacted), 0)
+            result.append((title, compacted, saved))
+        total_saved = sum(r[2] for r in result)
+        if total_saved:
+            logger.info(f"工具反馈压缩完成: {len(blocks)} 个代码块，共节省约 {total_saved} tokens")
+        return result
@@ -0,0 +1,179 @@
+import re
+import json
+
+# PyYAML 为可选依赖：未安装时使用下面的精简解析器 (覆盖 SKILL.md 中常见的写法)
+try:
+    import yaml
+    _Loader = getattr(yaml, "CSafeLoader", None) or yaml.SafeLoader # 优先使用 libyaml 加速
+except ImportError:
+    yaml = None
+
+_FRONT_MATTER_RE = re.compile(r'^---[ \t]*\r?\n(.*?)\r?\n---[ \t]*(?:\r?\n|$)', re.DOTALL)
+
+
+def split_front_matter(content):
+    """返回 (front matter 原文, 正文)；没有 front matter 时原文为空字符串"""
+    match = _FRONT_MATTER_RE.match(content)
+    if not match:
+        return "", content
+    return match.group(1), content[match.end():]
+
+
+def parse_front_matter(content):
+    """
+    解析 markdown 文件开头的 YAML front matter，返回 (字典, 原文)
+    解析失败或没有 front matter 时返回 ({}, 原文)
+    """
+    raw, _ = split_front_matter(content)
+    if not raw.strip():
+        return {}, raw
+    try:
+        data = yaml.load(raw, Loader=_Loader) if yaml is not None else _parse_block(raw.splitlines(), 0, 0)[0]
+    except Exception:
+        return {}, raw
+    if not isinstance(data, dict):
+        return {}, raw
+    # 统一为可 JSON 序列化的值 (如 YAML 日期)，便于写入注册表缓存
+    return json.loads(json.dumps(data, ensure_ascii=False, default=str)), raw
+
+
+# ----------------------------------------------------------------------
+# 精简 YAML 解析器：映射、列表 (块式与 [a, b])、带引号的字符串、| / > 块文本、# 注释
+# ----------------------------------------------------------------------
+def _indent(line):
+    return len(line) - len(line.lstrip(" "))
+
+
+def _skip(line):
+    stripped = line.strip()
+    return not stripped or stripped.startswith("#")
+
+
+def _scalar(text):
+    text = text.strip()
+    if not text:
+        return None
+    if text[0] == '"' and text.endswith('"') and len(text) > 1:
+        try:
+            return json.loads(text)
+        except ValueError:
+            return text[1:-1]
+    if text[0] == "'" and text.endswith("'") and len(text) > 1:
+        return text[1:-1].replace("''", "'")
+    if text.startswith("[") and text.endswith("]"):
+        return [_scalar(item) for item in _split_flow(text[1:-1])]
+    text = re.sub(r'\s+#.*$', '', text) # 行尾注释
+    lowered = text.lower()
+    if lowered in ("true", "yes"):
+        return True
+    if lowered in ("false", "no"):
+        return False
+    if lowered in ("null", "~"):
+        return None
+    if re.fullmatch(r'-?\d+', text):
+        return int(text)
+    if re.fullmatch(r'-?\d+\.\d+', text):
+        return float(text)
+    return text
+
+
+def _split_flow(text):
+    """按顶层逗号切分 [a, "b, c"]"""
+    items, buf, quote = [], "", None
+    for ch in text:
+        if quote:
+            buf += ch
+            if ch == quote:
+                quote = None
+        elif ch in "\"'":
+            quote = ch
+            buf += ch
+        elif ch == ",":
+            items.append(buf)
+            buf = ""
+        else:
+            buf += ch
+    if buf.strip():
+        items.append(buf)
+    return [item for item in items if item.strip()]
+
+
+def _block_scalar(lines, i, parent_indent, style):
+    """| 保留换行，> 折叠为一行"""
+    body = []
+    block_indent = None
+    while i < len(lines):
+        line = lines[i]
+        if line.strip() and _indent(line) <= parent_indent:
+            break
+        if line.strip() and block_indent is None:
+            block_indent = _indent(line)
+        body.append(line[block_indent:] if block_indent and line.strip() else line.strip())
+        i += 1
+    while body and not body[-1]:
+        body.pop()
+    if style.startswith(">"):
+        return " ".join(l for l in body if l) + "\n", i
+    return "\n".join(body) + "\n", i
+
+
+def _parse_block(lines, i, indent):
+    """从第 i 行开始解析缩进为 indent 的块，返回 (值, 下一行)"""
+    while i < len(lines) and _skip(lines[i]):
+        i += 1
+    if i >= len(lines):
+        return None, i
+    if lines[i].lstrip().startswith("- ") or lines[i].strip() == "-":
+        return _parse_list(lines, i, _indent(lines[i]))
+    return _parse_map(lines, i, indent)
+
+
+def _parse_list(lines, i, indent):
+    items = []
+    while i < len(lines):
+        line = lines[i]
+        if _skip(line):
+            i += 1
+            continue
+        if _indent(line) != indent or not line.lstrip().startswith("-"):
+            break
+        rest = line.strip()[1:].strip()
+        i += 1
+        if rest:
+            items.append(_scalar(rest))
+        else:
+            value, i = _parse_block(lines, i, indent + 1)
+            items.append(value)
+    return items, i
+
+
+def _parse_map(lines, i, indent):
+    result = {}
+    while i < len(lines):
+        line = lines[i]
+        if _skip(line):
+            i += 1
+            continue
+        current = _indent(line)
+        if current < indent or (result and current != indent):
+            break
+        key, sep, rest = line.strip().partition(":")
+        if not sep:
+            raise ValueError(f"无法解析的行: {line}")
+        key = _scalar(key)
+        rest = rest.strip()
+        i += 1
+        if rest.startswith(("|", ">")):
+            result[key], i = _block_scalar(lines, i, current, rest)
+        elif rest:
+            result[key] = _scalar(rest)
+        else:
+            # 值在下一行：嵌套映射或列表
+            j = i
+            while j < len(lines) and _skip(lines[j]):
+                j += 1
+            if j < len(lines) and (_indent(lines[j]) > current or lines[j].lstrip().startswith("- ")):
+                result[key], i = _parse_block(lines, j, _indent(lines[j]))
+            else:
+                result[key] = None
+    return result, i
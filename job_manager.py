@@ -0,0 +1,147 @@
+import os
+import time
+import logging
+import itertools
+import threading
+from collections import deque
+from datetime import datetime
+
+logger = logging.getLogger("JobManager")
+
+# 每个后台任务在内存中保留的最近输出行数 (完整输出写入日志文件)
+TAIL_LINES = 200
+
+
+class Job:
+    """一个后台任务的状态"""
+    def __init__(self, job_id, command, is_python_code, log_path, executor):
+        self.id = job_id
+        self.command = command
+        self.is_python_code = is_python_code
+        self.log_path = log_path
+        self.status = "running" # running / succeeded / failed / timeout / cancelled
+        self.returncode = None
+        self.started_at = time.time()
+        self.finished_at = None
+        self.executor = executor # 本任务独占的 SandboxExecutor
+        self.tail = deque(maxlen=TAIL_LINES)
+        self.done = threading.Event()
+        self._partial = "" # 尚未遇到换行的输出
+
+    @property
+    def elapsed(self):
+        return (self.finished_at or time.time()) - self.started_at
+
+    def summary(self):
+        """一行摘要：ID、状态、耗时与命令开头"""
+        lang = "python" if self.is_python_code else "bash"
+        first_line = self.command.strip().splitlines()[0] if self.command.strip() else ""
+        if len(first_line) > 60:
+            first_line = first_line[:60] + "..."
+        status = self.status
+        if self.returncode not in (None, 0):
+            status += f", 退出码 {self.returncode}"
+        return f"{self.id} [{status}, {self.elapsed:.0f}s] ({lang}) {first_line}"
+
+
+class JobManager:
+    """
+    后台任务管理器
+    以 ```bash background / ```python background 标注的代码块不再阻塞回合：
+    立即返回任务 ID，命令在独立的执行通道中运行 (不受 120 秒超时与回合中断影响)，
+    输出实时写入 log_dir 下的日志文件。完成的任务会生成一条通知，由 Agent 在下次刷新上下文时注入。
+    """
+    def __init__(self, new_executor, log_dir, timeout=None, on_finish=None):
+        self.new_executor = new_executor # () -> SandboxExecutor，每个任务独占一个
+        self.log_dir = log_dir
+        self.timeout = timeout # 单个任务的最长运行时间 (秒)，None 表示不限
+        self.on_finish = on_finish # 可选回调 (job)，在任务线程中调用
+        self.jobs = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._notifications = []
+
+    def start(self, command, is_python_code=False):
+        """启动一个后台任务，立即返回 Job"""
+        os.makedirs(self.log_dir, exist_ok=True)
+        executor = self.new_executor()
+        with self._lock:
+            job_id = f"job-{next(self._ids)}"
+            log_path = os.path.join(self.log_dir, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{job_id}.log")
+            job = Job(job_id, command, is_python_code, log_path, executor)
+            self.jobs[job_id] = job
+        threading.Thread(target=self._run, args=(job,), name=f"alice-{job_id}", daemon=True).start()
+        logger.info(f"后台任务 {job_id} 已启动: {command[:200]}")
+        return job
+
+    def _run(self, job):
+        with open(job.log_path, 'a', encoding='utf-8') as log_file:
+            def on_output(stream, data):
+                log_file.write(data)
+                log_file.flush()
+                text = job._partial + data
+                lines = text.split("\n")
+                job._partial = lines.pop()
+                job.tail.extend(lines)
+
+            try:
+                result = job.executor.run(job.command, is_python_code=job.is_python_code, timeout=self.timeout, on_output=on_output)
+                # 被 cancel() 中断的任务保持 cancelled 状态
+                if job.status != "cancelled":
+                    if result["timed_out"]:
+                        job.status = "timeout"
+                    else:
+                        job.returncode = result["returncode"]
+                        job.status = "succeeded" if job.returncode == 0 else "failed"
+            except Exception as e:
+                logger.error(f"后台任务 {job.id} 执行异常: {e}")
+                log_file.write(f"\n[执行过程中出错: {e}]\n")
+                job.tail.append(f"[执行过程中出错: {e}]")
+                if job.status != "cancelled":
+                    job.status = "failed"
+            finally:
+                if job._partial:
+                    job.tail.append(job._partial)
+                    job._partial = ""
+                job.finished_at = time.time()
+
+        with self._lock:
+            self._notifications.append(job)
+        job.done.set()
+        logger.info(f"后台任务结束: {job.summary()}")
+        if self.on_finish:
+            self.on_finish(job)
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def running(self):
+        return [j for j in self.jobs.values() if not j.done.is_set()]
+
+    def cancel(self, job_id):
+        """硬中断任务 (杀死其在容器内的整个进程组)，返回是否确有任务被中断"""
+        job = self.jobs.get(job_id)
+        if job is None or job.done.is_set():
+            return False
+        job.status = "cancelled"
+        job.executor.cancel_all()
+        return True
+
+    def cancel_all(self):
+        for job in self.running():
+            self.cancel(job.id)
+
+    def tail(self, job_id, lines=50):
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        recent = list(job.tail)[-lines:]
+        if job._partial:
+            recent.append(job._partial)
+        return "\n".join(recent)
+
+    def drain_notifications(self):
+        """取出自上次调用以来结束的任务"""
+        with self._lock:
+            finished, self._notifications = self._notifications, []
+        return finished
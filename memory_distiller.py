@@ -0,0 +1,111 @@
+import logging
+import threading
+from datetime import datetime, timedelta
+
+logger = logging.getLogger("MemoryDistiller")
+
+NOTHING_NEW = "无重要更新"
+
+
+class MemoryDistiller:
+    """
+    后台增量记忆提炼
+    短期记忆按日过期：每个过期日期单独调用一次 LLM 提炼 (只发送当天的记录)，成功后在同一事务内
+    写入长期记忆、记录检查点并删除当天的短期记忆，已有检查点的日期不会重复提炼。
+    失败时按指数退避重试；每提炼完一天间隔 spacing 秒，把长时间离开后积压的工作分散开。
+    """
+    def __init__(self, store, client, model_name, lock=None, on_update=None,
+                 retention_days=7, interval=3600, spacing=5, base_backoff=30, max_backoff=3600):
+        self.store = store
+        self.client = client
+        self.model_name = model_name
+        self.lock = lock or threading.Lock() # 与 memory 指令互斥的写锁
+        self.on_update = on_update
+        self.retention_days = retention_days
+        self.interval = interval
+        self.spacing = spacing
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.failures = 0
+        self._thread = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+
+    def start(self, progress=None):
+        """启动后台调度线程 (立即返回)；progress 只接收首轮的进度，首轮结束时收到空字符串"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._loop, args=(progress,), name="alice-memory-distill", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def wake(self):
+        """提前触发一轮检查"""
+        self._wake.set()
+
+    def _loop(self, progress):
+        while not self._stop.is_set():
+            delay = self.interval
+            report = progress or (lambda detail: None)
+            try:
+                self.run_pending(report)
+                self.failures = 0
+            except Exception as e:
+                self.failures += 1
+                delay = min(self.base_backoff * 2 ** (self.failures - 1), self.max_backoff)
+                logger.warning(f"记忆提炼失败 (连续第 {self.failures} 次)，{delay:.0f}s 后重试: {e}")
+                report(f"[系统]: 记忆提炼失败，稍后自动重试: {e}")
+            if progress:
+                progress("") # 首轮结束
+                progress = None
+            self._wake.wait(delay)
+            self._wake.clear()
+
+    def due_dates(self):
+        expiry = (datetime.now().date() - timedelta(days=self.retention_days)).strftime("%Y-%m-%d")
+        return self.store.stm_dates_before(expiry)
+
+    def run_pending(self, progress=None):
+        """按日期从旧到新处理所有过期的短期记忆；出错时抛出，已完成的日期保留检查点"""
+        progress = progress or (lambda detail: None)
+        dates = self.due_dates()
+        if dates:
+            progress(f"[系统]: 发现过期短期记忆 ({len(dates)} 天)，正在后台逐日提炼...")
+        for date in dates:
+            if self._stop.is_set():
+                return
+            if self.store.checkpoint(date):
+                # 已提炼过 (如人工编辑视图后旧日期重新出现)，只清理不重复提炼
+                with self.lock:
+                    self.store.delete_stm_dates([date])
+                logger.info(f"{date} 已有提炼检查点，直接清理")
+            else:
+                summary = self.distill_day(date)
+                with self.lock:
+                    self.store.complete_distill([date], summary, distill_date=date)
+                logger.info(f"{date} 的短期记忆已提炼{'并写入长期记忆' if summary else ' (无重要更新)'}")
+                progress(f"[系统]: 已提炼 {date} 的短期记忆。")
+            if self.on_update:
+                self.on_update()
+            self._stop.wait(self.spacing)
+
+    def distill_day(self, date):
+        """提炼某一天的短期记忆，返回提炼结果 (没有长期价值时返回 None)"""
+        day_text = self.store.stm_text([date])
+        distill_prompt = (
+            f"你是一个记忆提炼专家。以下是用户 {date} 的短期记忆记录，即将从短期记忆中删除：\n\n{day_text}\n\n"
+            "请从中提炼出具有长期价值的：\n"
+            "1. 用户的新习惯或偏好变更。\n"
+            "2. 重要的项目决策或里程碑进展。\n"
+            "3. 用户提到的重要个人事实。\n\n"
+            f"请以 Markdown 列表格式输出提炼结果，保持简洁。如果没有值得记录的长期价值，请回复“{NOTHING_NEW}”。"
+        )
+        response = self.client.chat.completions.create(
+            model=self.model_name,
+            messages=[{"role": "user", "content": distill_prompt}]
+        )
+        summary = (response.choices[0].message.content or "").strip()
+        return summary if summary and NOTHING_NEW not in summary else None
@@ -0,0 +1,329 @@
+import os
+import re
+import json
+import math
+import hashlib
+import logging
+import threading
+from collections import Counter
+
+from context_builder import file_fingerprint
+from token_counter import count_tokens
+
+logger = logging.getLogger("MemoryIndex")
+
+# 英文/数字按单词切分，中日韩文本按相邻二字切分 (单字词保留单字)
+_TOKEN_RE = re.compile(r'[a-z0-9_]+|[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+')
+_LIST_ITEM_RE = re.compile(r'^(?:[-*+]|\d+[.)])\s')
+
+# BM25 参数
+K1 = 1.5
+B = 0.75
+
+# 向量检索与 BM25 结果按倒数排名融合 (RRF) 时的平滑常数
+RRF_K = 60
+
+# 条目按从新到旧存放的小节 (长期记忆的经验教训新条目插在最前，见 MemoryStore.add_lesson)，其余小节按时间顺序追加
+NEWEST_FIRST_HEADINGS = ("经验教训",)
+# 条目正文开头的 [YYYY-MM-DD] / [HH:MM] 与小节标题中的日期
+_ENTRY_DATE_RE = re.compile(r'^(?:[-*+]\s+)?\[(\d{4}-\d{2}-\d{2})(?:[ T](\d{2}:\d{2}))?')
+_ENTRY_TIME_RE = re.compile(r'^(?:[-*+]\s+)?\[(\d{2}:\d{2})\]')
+_HEADING_DATE_RE = re.compile(r'(\d{4}-\d{2}-\d{2})')
+
+
+def tokenize(text):
+    tokens = []
+    for match in _TOKEN_RE.finditer(text.lower()):
+        word = match.group()
+        if word.isascii() or len(word) == 1:
+            tokens.append(word)
+        else:
+            tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+    return tokens
+
+
+def split_entries(text):
+    """
+    按 markdown 结构切分记忆文件，返回 [(小节标题, 正文), ...]
+    列表项各为一条 (缩进的续行归入上一项)，其余段落按空行分段；一级标题下的文件说明不计入。
+    """
+    entries = []
+    heading, level = "", 0
+    buf = []
+
+    def flush():
+        if buf and level != 1:
+            body = "\n".join(buf).strip()
+            if body:
+                entries.append((heading, body))
+        buf.clear()
+
+    for line in text.splitlines():
+        stripped = line.strip()
+        if stripped.startswith("#"):
+            flush()
+            level = len(stripped) - len(stripped.lstrip("#"))
+            heading = stripped.lstrip("#").strip()
+        elif not stripped:
+            flush()
+        elif _LIST_ITEM_RE.match(stripped) and not (line[:1] in " \t" and buf):
+            flush()
+            buf.append(stripped)
+        else:
+            buf.append(line.rstrip())
+    flush()
+    return entries
+
+
+class MemoryEntry:
+    """一条记忆：来源 (ltm / stm)、所在小节、正文及其在文件中的位置"""
+    __slots__ = ("id", "source", "heading", "text", "position", "terms", "length", "tokens")
+
+    def __init__(self, source, heading, text, position):
+        self.id = hashlib.sha1(f"{source}\0{heading}\0{text}".encode("utf-8")).hexdigest()[:16]
+        self.source = source
+        self.heading = heading
+        self.text = text
+        self.position = position
+        terms = tokenize(f"{heading} {text}")
+        self.terms = Counter(terms)
+        self.length = len(terms)
+        self.tokens = count_tokens(text) + 1
+
+
+def entry_timestamp(entry):
+    """条目记录的时间 "YYYY-MM-DD HH:MM" (没有时间时只有日期，都没有时为空字符串)"""
+    match = _ENTRY_DATE_RE.match(entry.text)
+    if match:
+        date, time = match.group(1), match.group(2)
+    else:
+        heading = _HEADING_DATE_RE.search(entry.heading)
+        if not heading:
+            return ""
+        date = heading.group(1)
+        time_match = _ENTRY_TIME_RE.match(entry.text)
+        time = time_match.group(1) if time_match else None
+    return f"{date} {time}" if time else date
+
+
+def format_entries(entries):
+    """按文件中的原始顺序输出，同一小节的条目归在一个标题下"""
+    lines = []
+    heading = None
+    for entry in sorted(entries, key=lambda e: e.position):
+        if entry.heading != heading:
+            heading = entry.heading
+            if heading:
+                if lines:
+                    lines.append("")
+                lines.append(f"## {heading}")
+        lines.append(entry.text)
+    return "\n".join(lines)
+
+
+class MemoryIndex:
+    """
+    长期/短期记忆的本地检索索引
+    记忆文件按条目切分后建立 BM25 倒排统计；文件指纹 (mtime/size) 变化时只增删发生变化的条目。
+    提供 embed(texts) -> [向量, ...] 时额外做向量检索，条目向量按正文哈希缓存在磁盘上，
+    只为新条目计算；两路结果按倒数排名融合。
+    """
+    def __init__(self, sources, embed=None, embedding_path=None):
+        self.sources = sources # {"ltm": 路径, "stm": 路径}
+        self.embed = embed
+        self.embedding_path = embedding_path
+        self.entries = {} # id -> MemoryEntry
+        self._by_source = {name: [] for name in sources} # 来源 -> [id, ...] (文件顺序)
+        self._fingerprints = {}
+        self._df = Counter()
+        self._total_length = 0
+        self._vectors = None # 正文哈希 -> 向量 (首次使用时从磁盘加载)
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # 增量更新
+    # ------------------------------------------------------------------
+    def sync(self):
+        """按文件指纹增量同步各来源，返回本次新增与移除的条目数"""
+        with self._lock:
+            added = removed = 0
+            for name, path in self.sources.items():
+                fp = file_fingerprint(path)
+                if fp == self._fingerprints.get(name):
+                    continue
+                self._fingerprints[name] = fp
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        text = f.read()
+                except OSError:
+                    text = ""
+                a, r = self._replace_source(name, text)
+                added += a
+                removed += r
+            if added or removed:
+                logger.info(f"记忆索引已更新: +{added} / -{removed}，共 {len(self.entries)} 条")
+                self._embed_missing()
+            return added, removed
+
+    def _replace_source(self, name, text):
+        fresh = []
+        seen = set()
+        for heading, body in split_entries(text):
+            entry = MemoryEntry(name, heading, body, (name, len(fresh)))
+            if entry.id in seen:
+                continue # 完全相同的重复条目只索引一次
+            seen.add(entry.id)
+            fresh.append(entry)
+
+        old_ids = set(self._by_source[name])
+        new_ids = {e.id for e in fresh}
+        for entry_id in old_ids - new_ids:
+            self._remove(self.entries[entry_id])
+        for entry in fresh:
+            if entry.id in self.entries:
+                self.entries[entry.id].position = entry.position # 条目未变，只更新位置
+            else:
+                self._add(entry)
+        self._by_source[name] = [e.id for e in fresh]
+        return len(new_ids - old_ids), len(old_ids - new_ids)
+
+    def _add(self, entry):
+        self.entries[entry.id] = entry
+        self._df.update(entry.terms.keys())
+        self._total_length += entry.length
+
+    def _remove(self, entry):
+        del self.entries[entry.id]
+        self._df.subtract(entry.terms.keys())
+        self._total_length -= entry.length
+
+    # ------------------------------------------------------------------
+    # 向量 (可选)
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _text_key(entry):
+        return hashlib.sha1(f"{entry.heading}\0{entry.text}".encode("utf-8")).hexdigest()
+
+    def _load_vectors(self):
+        if self._vectors is None:
+            self._vectors = {}
+            if self.embedding_path and os.path.exists(self.embedding_path):
+                try:
+                    with open(self.embedding_path, "r", encoding="utf-8") as f:
+                        self._vectors = json.load(f)
+                except (OSError, ValueError) as e:
+                    logger.warning(f"记忆向量缓存读取失败，将重新计算: {e}")
+        return self._vectors
+
+    def _embed_missing(self):
+        if not self.embed:
+            return
+        vectors = self._load_vectors()
+        missing = [e for e in self.entries.values() if self._text_key(e) not in vectors]
+        if not missing:
+            return
+        try:
+            for i in range(0, len(missing), 64):
+                batch = missing[i:i + 64]
+                for entry, vector in zip(batch, self.embed([f"{e.heading}\n{e.text}" for e in batch])):
+                    vectors[self._text_key(entry)] = vector
+        except Exception as e:
+            logger.warning(f"记忆向量计算失败，本次仅使用 BM25: {e}")
+        # 只保留仍在索引中的条目
+        live = {self._text_key(e) for e in self.entries.values()}
+        for key in [k for k in vectors if k not in live]:
+            del vectors[key]
+        if self.embedding_path:
+            os.makedirs(os.path.dirname(self.embedding_path), exist_ok=True)
+            tmp = self.embedding_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(vectors, f)
+            os.replace(tmp, self.embedding_path)
+
+    def _vector_ranking(self, query):
+        vectors = self._load_vectors()
+        try:
+            q = self.embed([query])[0]
+        except Exception as e:
+            logger.warning(f"查询向量计算失败，本次仅使用 BM25: {e}")
+            return []
+        q_norm = math.sqrt(sum(x * x for x in q)) or 1.0
+        scored = []
+        for entry in self.entries.values():
+            v = vectors.get(self._text_key(entry))
+            if v is None:
+                continue
+            v_norm = math.sqrt(sum(x * x for x in v)) or 1.0
+            scored.append((sum(a * b for a, b in zip(q, v)) / (q_norm * v_norm), entry.id))
+        scored.sort(reverse=True)
+        return [entry_id for _, entry_id in scored]
+
+    # ------------------------------------------------------------------
+    # 检索
+    # ------------------------------------------------------------------
+    def _bm25_ranking(self, query):
+        terms = set(tokenize(query))
+        if not terms or not self.entries:
+            return []
+        n = len(self.entries)
+        avg_len = self._total_length / n or 1.0
+        idf = {t: math.log(1 + (n - self._df[t] + 0.5) / (self._df[t] + 0.5)) for t in terms if self._df[t] > 0}
+        scored = []
+        for entry in self.entries.values():
+            score = 0.0
+            for t, w in idf.items():
+                tf = entry.terms.get(t)
+                if tf:
+                    score += w * tf * (K1 + 1) / (tf + K1 * (1 - B + B * entry.length / avg_len))
+            if score > 0:
+                scored.append((score, entry.id))
+        scored.sort(reverse=True)
+        return [entry_id for _, entry_id in scored]
+
+    def _take(self, ranking, k, token_budget):
+        """按排名取条目，不超过 k 条与 token 预算 (放不下的条目跳过，继续尝试更短的)"""
+        chosen = []
+        remaining = token_budget
+        for entry_id in ranking:
+            entry = self.entries[entry_id]
+            if entry.tokens > remaining:
+                continue
+            chosen.append(entry)
+            remaining -= entry.tokens
+            if len(chosen) >= k:
+                break
+        return chosen
+
+    def search(self, query, k=20, token_budget=2000):
+        """返回与 query 最相关的条目 (最多 k 条，总 token 数不超过预算)"""
+        with self._lock:
+            ranking = self._bm25_ranking(query)
+            if self.embed:
+                fused = Counter()
+                for ranks in (ranking, self._vector_ranking(query)[:max(k * 4, 50)]):
+                    for rank, entry_id in enumerate(ranks):
+                        fused[entry_id] += 1.0 / (RRF_K + rank)
+                ranking = [entry_id for entry_id, _ in fused.most_common()]
+            return self._take(ranking, k, token_budget)
+
+    def recent(self, k=20, token_budget=2000):
+        """
+        没有检索词时的兜底：短期记忆从新到旧，其次是长期记忆中最新的条目
+        按条目记录的时间排序；时间相同或缺失时按所在小节的存放方向判断先后 (经验教训从新到旧，其余从旧到新)
+        """
+        with self._lock:
+            ranking = []
+            for name in ("stm", "ltm"):
+                ids = self._by_source.get(name, [])
+
+                def newness(item):
+                    index, entry_id = item
+                    entry = self.entries[entry_id]
+                    order = -index if entry.heading in NEWEST_FIRST_HEADINGS else index
+                    return (entry_timestamp(entry), order)
+                ranking.extend(entry_id for _, entry_id in sorted(enumerate(ids), key=newness, reverse=True))
+            return self._take(ranking, k, token_budget)
+
+    def count(self, source):
+        with self._lock:
+            return len(self._by_source.get(source, []))
@@ -0,0 +1,310 @@
+import os
+import re
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+
+from context_builder import file_fingerprint
+
+logger = logging.getLogger("MemoryStore")
+
+LTM_PREAMBLE = "# Alice 的长期记忆\n这是 Alice 的个人记忆空间，用于存储用户信息、偏好和重要事实。"
+STM_PREAMBLE = (
+    "# Alice 的短期记忆 (最近 7 天)\n"
+    "这是 Alice 的短期记忆空间，以“时间-事件-行动”格式记录最近 7 天的有价值交互。系统会自动滚动清理并提炼长期记忆。"
+)
+LESSONS_HEADER = "## 经验教训"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS stm_entries (
+    id INTEGER PRIMARY KEY,
+    date TEXT NOT NULL,
+    time TEXT,
+    content TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_stm_date ON stm_entries(date);
+CREATE TABLE IF NOT EXISTS ltm_entries (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    date TEXT,
+    content TEXT NOT NULL,
+    position REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_ltm_kind ON ltm_entries(kind, position);
+CREATE TABLE IF NOT EXISTS distill_checkpoints (
+    date TEXT PRIMARY KEY,
+    distilled_at TEXT NOT NULL,
+    outcome TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+_DATE_HEADER_RE = re.compile(r'^## (\d{4}-\d{2}-\d{2})')
+_STM_LINE_RE = re.compile(r'^- \[(\d{2}:\d{2})\] (.*)$')
+_DISTILLED_RE = re.compile(r'^### 自动提炼记忆 \((\d{4}-\d{2}-\d{2})\)')
+
+
+def _write_view(path, content):
+    """原子地写出 markdown 视图"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(tmp, path)
+
+
+class MemoryStore:
+    """
+    长期/短期记忆的 SQLite 存储 (WAL 模式)
+    短期记忆按日期建索引，过期滚动是一条按日期的 DELETE；长期记忆分为经验教训 (lesson)、
+    自动提炼记忆 (distilled) 与其他手写段落 (text)；distill_checkpoints 记录每个日期的提炼结果。
+    memory/alice_memory.md 与 memory/short_term_memory.md 由数据库渲染生成，供提示词与人工阅读；
+    视图在数据库之外被修改过 (或首次启用) 时，先把视图内容导入数据库再继续写入。
+    """
+    def __init__(self, db_path, ltm_path, stm_path):
+        self.db_path = db_path
+        self.ltm_path = ltm_path
+        self.stm_path = stm_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.RLock()
+        self._sync_views()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # ------------------------------------------------------------------
+    # 元数据与视图同步
+    # ------------------------------------------------------------------
+    def _get_meta(self, key, default=None):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, key, value):
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    @staticmethod
+    def _fingerprint_text(path):
+        fp = file_fingerprint(path)
+        return f"{fp[0]}:{fp[1]}" if fp else "missing"
+
+    def _sync_views(self):
+        """视图文件与上次渲染时不一致 (人工编辑或首次启用) 时，以视图内容为准导入数据库"""
+        for name, path, importer in (("ltm", self.ltm_path, self._import_ltm), ("stm", self.stm_path, self._import_stm)):
+            current = self._fingerprint_text(path)
+            if current == self._get_meta(f"view:{name}"):
+                continue
+            text = ""
+            if os.path.exists(path):
+                with open(path, "r", encoding="utf-8") as f:
+                    text = f.read()
+            with self._transaction():
+                importer(text)
+            logger.info(f"已从 {path} 导入{'长期' if name == 'ltm' else '短期'}记忆")
+            self._render(name)
+
+    def _transaction(self):
+        return _Transaction(self._conn)
+
+    # ------------------------------------------------------------------
+    # 导入 (markdown -> 数据库)
+    # ------------------------------------------------------------------
+    def _import_stm(self, text):
+        self._conn.execute("DELETE FROM stm_entries")
+        preamble, date = [], None
+        rows = []
+        for line in text.splitlines():
+            match = _DATE_HEADER_RE.match(line)
+            if match:
+                date = match.group(1)
+            elif date is None:
+                preamble.append(line)
+            elif line.strip():
+                entry = _STM_LINE_RE.match(line)
+                rows.append((date, entry.group(1), entry.group(2)) if entry else (date, None, line.rstrip()))
+        self._conn.executemany("INSERT INTO stm_entries (date, time, content) VALUES (?, ?, ?)", rows)
+        self._set_meta("stm_preamble", "\n".join(preamble).strip() or STM_PREAMBLE)
+
+    def _import_ltm(self, text):
+        self._conn.execute("DELETE FROM ltm_entries")
+        lines = text.splitlines()
+        preamble = []
+        while lines and not lines[0].startswith("## "):
+            preamble.append(lines.pop(0))
+
+        # 按二/三级标题切块：经验教训下的列表项各为一条，自动提炼记忆各为一块，其余按原文保留
+        rows = []
+        kind, date, buf = None, None, []
+
+        def flush():
+            body = "\n".join(buf).strip()
+            if kind == "lesson":
+                for item in re.split(r'\n(?=- )', body):
+                    item = item.strip()
+                    if item:
+                        rows.append(("lesson", None, item[2:] if item.startswith("- ") else item))
+            elif body:
+                rows.append((kind, date, body))
+            buf.clear()
+
+        for line in lines:
+            if line.startswith("## ") or line.startswith("### "):
+                flush()
+                distilled = _DISTILLED_RE.match(line)
+                if line.strip() == LESSONS_HEADER:
+                    kind, date = "lesson", None
+                elif distilled:
+                    kind, date = "distilled", distilled.group(1)
+                else:
+                    kind, date = "text", None
+                    buf.append(line)
+            else:
+                if kind is None:
+                    kind = "text"
+                buf.append(line)
+        flush()
+        self._conn.executemany(
+            "INSERT INTO ltm_entries (kind, date, content, position) VALUES (?, ?, ?, ?)",
+            [(k, d, c, i) for i, (k, d, c) in enumerate(rows)]
+        )
+        self._set_meta("ltm_preamble", "\n".join(preamble).strip() or LTM_PREAMBLE)
+
+    # ------------------------------------------------------------------
+    # 渲染 (数据库 -> markdown)
+    # ------------------------------------------------------------------
+    def render_stm(self):
+        out = [self._get_meta("stm_preamble", STM_PREAMBLE), "\n"]
+        date = None
+        for d, t, content in self._conn.execute("SELECT date, time, content FROM stm_entries ORDER BY date, id"):
+            if d != date:
+                date = d
+                out.append(f"\n## {d}")
+            out.append(f"- [{t}] {content}" if t else content)
+        return "\n".join(out) + "\n"
+
+    def render_ltm(self):
+        out = [self._get_meta("ltm_preamble", LTM_PREAMBLE), "", LESSONS_HEADER]
+        for (content,) in self._conn.execute("SELECT content FROM ltm_entries WHERE kind = 'lesson' ORDER BY position"):
+            out.append(f"- {content}")
+        for kind, date, content in self._conn.execute(
+            "SELECT kind, date, content FROM ltm_entries WHERE kind != 'lesson' ORDER BY position"
+        ):
+            out.append("")
+            if kind == "distilled":
+                out.append(f"### 自动提炼记忆 ({date})")
+            out.append(content)
+        return "\n".join(out) + "\n"
+
+    def _render(self, *names):
+        for name in names:
+            path, text = (self.ltm_path, self.render_ltm()) if name == "ltm" else (self.stm_path, self.render_stm())
+            _write_view(path, text)
+            self._set_meta(f"view:{name}", self._fingerprint_text(path))
+
+    # ------------------------------------------------------------------
+    # 写入
+    # ------------------------------------------------------------------
+    def add_stm(self, content, when=None):
+        """追加一条短期记忆 (按日期归组)"""
+        when = when or datetime.now()
+        with self._lock:
+            self._sync_views()
+            self._conn.execute(
+                "INSERT INTO stm_entries (date, time, content) VALUES (?, ?, ?)",
+                (when.strftime("%Y-%m-%d"), when.strftime("%H:%M"), content)
+            )
+            self._render("stm")
+
+    def add_lesson(self, content):
+        """新增一条经验教训 (最新的排在最前)"""
+        with self._lock:
+            self._sync_views()
+            row = self._conn.execute("SELECT MIN(position) FROM ltm_entries WHERE kind = 'lesson'").fetchone()
+            position = (row[0] if row[0] is not None else 0) - 1
+            self._conn.execute(
+                "INSERT INTO ltm_entries (kind, date, content, position) VALUES ('lesson', NULL, ?, ?)",
+                (content, position)
+            )
+            self._render("ltm")
+
+    # ------------------------------------------------------------------
+    # 滚动与提炼
+    # ------------------------------------------------------------------
+    def stm_dates_before(self, date):
+        """早于指定日期 (YYYY-MM-DD) 的短期记忆日期"""
+        with self._lock:
+            self._sync_views()
+            rows = self._conn.execute("SELECT DISTINCT date FROM stm_entries WHERE date < ? ORDER BY date", (date,))
+            return [r[0] for r in rows]
+
+    def stm_text(self, dates=None):
+        """指定日期 (默认全部) 的短期记忆 markdown"""
+        with self._lock:
+            if dates is None:
+                return self.render_stm()
+            out = []
+            for d in dates:
+                out.append(f"## {d}")
+                rows = self._conn.execute("SELECT time, content FROM stm_entries WHERE date = ? ORDER BY id", (d,))
+                out.extend(f"- [{t}] {c}" if t else c for t, c in rows)
+            return "\n".join(out) + "\n"
+
+    def checkpoint(self, date):
+        """某个日期的提炼记录 (distilled_at, outcome)，未提炼过时返回 None"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT distilled_at, outcome FROM distill_checkpoints WHERE date = ?", (date,)
+            ).fetchone()
+
+    def complete_distill(self, dates, summary=None, distill_date=None):
+        """
+        一次事务内完成提炼的收尾：写入提炼结果 (可为空)、记录各日期的检查点、删除这些日期的短期记忆
+        """
+        distill_date = distill_date or datetime.now().strftime("%Y-%m-%d")
+        now = datetime.now().isoformat(timespec="seconds")
+        with self._lock:
+            self._sync_views()
+            with self._transaction():
+                if summary:
+                    row = self._conn.execute("SELECT MAX(position) FROM ltm_entries").fetchone()
+                    self._conn.execute(
+                        "INSERT INTO ltm_entries (kind, date, content, position) VALUES ('distilled', ?, ?, ?)",
+                        (distill_date, summary, (row[0] if row[0] is not None else 0) + 1)
+                    )
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO distill_checkpoints (date, distilled_at, outcome) VALUES (?, ?, ?)",
+                    [(d, now, "distilled" if summary else "nothing") for d in dates]
+                )
+                self._conn.executemany("DELETE FROM stm_entries WHERE date = ?", [(d,) for d in dates])
+            self._render("ltm", "stm")
+
+
+    def delete_stm_dates(self, dates):
+        """删除指定日期的短期记忆 (已有检查点、无需再次提炼的日期)"""
+        with self._lock:
+            self._sync_views()
+            with self._transaction():
+                self._conn.executemany("DELETE FROM stm_entries WHERE date = ?", [(d,) for d in dates])
+            self._render("stm")
+
+
+class _Transaction:
+    """显式 BEGIN/COMMIT (连接处于 autocommit 模式)，异常时回滚"""
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
@@ -0,0 +1,119 @@
+import os
+import itertools
+from collections import deque
+from datetime import datetime
+
+_log_ids = itertools.count(1)
+
+
+class _BoundedStream:
+    """
+    单个输出流的缓冲：bound() 之前完整保留；之后只保留开头 head_bytes 与结尾 tail_bytes，中间部分只计数
+    """
+    def __init__(self):
+        self.head_bytes = None # None 表示尚未受限
+        self.tail_bytes = None
+        self.head = [] # [(文本, 字节数), ...]
+        self.head_size = 0
+        self.tail = deque()
+        self.tail_size = 0
+        self.dropped = 0 # 被丢弃的中间字节数
+
+    def bound(self, head_bytes, tail_bytes):
+        """总输出超限后调用：把已保留的内容按头/尾限额重新分配"""
+        chunks, self.head, self.head_size = self.head, [], 0
+        self.head_bytes, self.tail_bytes = head_bytes, tail_bytes
+        for data, size in chunks:
+            self.write(data, size)
+
+    def write(self, data, size):
+        if self.head_bytes is None or self.head_size < self.head_bytes:
+            self.head.append((data, size))
+            self.head_size += size
+            return
+        self.tail.append((data, size))
+        self.tail_size += size
+        while self.tail_size > self.tail_bytes and len(self.tail) > 1:
+            _, old_size = self.tail.popleft()
+            self.tail_size -= old_size
+            self.dropped += old_size
+
+    def render(self, log_path=None):
+        text = "".join(d for d, _ in self.head)
+        if self.dropped:
+            where = f"，完整输出已保存至 {log_path}" if log_path else ""
+            text += f"\n...[中间 {self.dropped} 字节已省略{where}]...\n"
+        return text + "".join(d for d, _ in self.tail)
+
+
+class OutputCapture:
+    """
+    工具输出的有界捕获器
+    - 总量未超过 max_bytes 时，完整保留在内存中，不做任何截断
+    - 一旦超限，先将已有内容连同后续输出全部落盘到 spill_dir 下的日志文件，
+      再截断内存中的内容：每个流只保留 max_bytes / 4 的头部与尾部 (环形缓冲)
+    这样失控的 `cat` 等命令不会把数百 MB 输出塞进宿主机内存和下一轮提示词。
+    """
+    def __init__(self, max_bytes=256 * 1024, spill_dir=None, name="exec"):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.name = name
+        self.streams = {"stdout": _BoundedStream(), "stderr": _BoundedStream()}
+        self.total_bytes = 0
+        self.log_path = None
+        self._log_file = None
+        self._pending = [] # 超限前的原始输出 (按到达顺序)，落盘时一次性写出
+        self._bounded = False
+
+    def write(self, stream, data):
+        if not data:
+            return
+        size = len(data.encode('utf-8', errors='replace'))
+        self.total_bytes += size
+        self.streams[stream].write(data, size)
+
+        if self._log_file is not None:
+            self._log_file.write(self._tag(stream, data))
+        elif self.spill_dir:
+            self._pending.append((stream, data))
+        if self.total_bytes > self.max_bytes and not self._bounded:
+            # 首次超限：完整输出落盘之后才截断内存中的内容
+            if self.spill_dir:
+                self._spill()
+            self._bounded = True
+            quarter = self.max_bytes // 4
+            for buf in self.streams.values():
+                buf.bound(quarter, quarter)
+
+    def _tag(self, stream, data):
+        return data if stream == "stdout" else f"[stderr] {data}"
+
+    def _spill(self):
+        os.makedirs(self.spill_dir, exist_ok=True)
+        filename = f"{self.name}-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(_log_ids)}.log"
+        self.log_path = os.path.join(self.spill_dir, filename)
+        self._log_file = open(self.log_path, 'w', encoding='utf-8', errors='replace')
+        for stream, data in self._pending:
+            self._log_file.write(self._tag(stream, data))
+        self._pending = []
+
+    def close(self):
+        if self._log_file is not None:
+            self._log_file.close()
+            self._log_file = None
+        self._pending = []
+
+    def render(self, stream):
+        return self.streams[stream].render(self.log_path)
+
+    def result(self, returncode, timed_out=False):
+        """生成与 SandboxExecutor.run 一致的结果字典"""
+        self.close()
+        return {
+            "stdout": self.render("stdout"),
+            "stderr": self.render("stderr"),
+            "returncode": returncode,
+            "timed_out": timed_out,
+            "log_path": self.log_path,
+            "total_bytes": self.total_bytes
+        }
@@ -0,0 +1,164 @@
+import os
+import json
+import time
+import queue
+import logging
+import itertools
+import threading
+import subprocess
+
+logger = logging.getLogger("PythonKernel")
+
+# 容器内内核源码 (以 python3 -c 方式注入)
+KERNEL_SOURCE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sandbox", "alice_kernel.py")
+
+
+class PythonKernel:
+    """
+    会话级持久化 Python 内核 (类似 Jupyter Kernel)
+    所有 ```python 代码块在同一个容器内解释器中执行，全局变量与已导入模块在块之间保留。
+    支持中断 (SIGINT)、重启 (reset) 与内存上限。
+    """
+    def __init__(self, container_name, executor, workdir="/app", memory_limit_mb=0, startup_timeout=30):
+        self.container_name = container_name
+        self.executor = executor # 用于发送中断信号等控制指令
+        self.workdir = workdir
+        self.memory_limit_mb = memory_limit_mb
+        self.startup_timeout = startup_timeout
+
+        self._proc = None
+        self._pid = None # 容器内内核 PID
+        self._events = queue.Queue()
+        self._run_lock = threading.RLock() # 内核同一时间只执行一个代码块；重启也须等待当前代码块结束 (超时重启时已持有)
+        self._ids = itertools.count(1)
+        self.busy = False
+
+    def _kernel_command(self):
+        with open(KERNEL_SOURCE_PATH, 'r', encoding='utf-8') as f:
+            source = f.read()
+        return [
+            "docker", "exec", "-i",
+            "-w", self.workdir,
+            self.container_name,
+            "python3", "-u", "-c", source, str(self.memory_limit_mb)
+        ]
+
+    def alive(self):
+        return self._proc is not None and self._proc.poll() is None
+
+    def start(self):
+        """启动内核并等待就绪信号"""
+        self._events = queue.Queue()
+        self._proc = subprocess.Popen(
+            self._kernel_command(),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            encoding='utf-8',
+            errors='replace',
+            bufsize=1
+        )
+        threading.Thread(target=self._read_loop, args=(self._proc, self._events), daemon=True).start()
+        threading.Thread(target=self._stderr_loop, args=(self._proc,), daemon=True).start()
+
+        try:
+            msg = self._events.get(timeout=self.startup_timeout)
+        except queue.Empty:
+            msg = None
+        if not msg or msg.get("event") != "ready":
+            self.shutdown()
+            raise RuntimeError("Python 内核启动失败")
+        self._pid = msg.get("pid")
+        logger.info(f"Python 内核已就绪 (容器内 PID: {self._pid})")
+
+    def _read_loop(self, proc, events):
+        for line in proc.stdout:
+            try:
+                events.put(json.loads(line))
+            except ValueError:
+                continue
+        proc.stdout.close()
+        events.put({"event": "lost"})
+
+    def _stderr_loop(self, proc):
+        for line in proc.stderr:
+            if line.strip():
+                logger.warning(f"Python 内核 stderr: {line.rstrip()}")
+        proc.stderr.close()
+
+    def shutdown(self):
+        proc = self._proc
+        self._proc = None
+        self._pid = None
+        if proc is None:
+            return
+        try:
+            proc.stdin.close()
+            proc.wait(timeout=5)
+        except Exception:
+            proc.kill()
+
+    def restart(self):
+        """重启内核，清空所有全局变量 (等待正在执行的代码块结束，不会在执行中途关闭内核)"""
+        with self._run_lock:
+            logger.info("正在重启 Python 内核...")
+            self.shutdown()
+            self.start()
+
+    def interrupt(self):
+        """向容器内内核发送 SIGINT，中断正在执行的代码块"""
+        if not self.busy or not self._pid:
+            return False
+        logger.info(f"正在中断 Python 内核 (PID: {self._pid})")
+        self.executor.run(f"kill -INT {self._pid}", timeout=10)
+        return True
+
+    def run(self, code, timeout=120, on_output=None):
+        """
+        在持久化内核中执行代码块
+        返回格式与 SandboxExecutor.run 一致 (共用其有界输出捕获与实时回调)
+        """
+        with self._run_lock:
+            if not self.alive():
+                self.start()
+
+            req_id = f"k{next(self._ids)}"
+            capture = self.executor.new_capture()
+            self.busy = True
+            try:
+                self._proc.stdin.write(json.dumps({"id": req_id, "op": "exec", "code": code}, ensure_ascii=False) + "\n")
+                self._proc.stdin.flush()
+
+                interrupted_for_timeout = False
+                # 截止时间只计算一次：持续输出的代码块同样会在 timeout 秒后被中断
+                deadline = time.monotonic() + timeout
+                while True:
+                    try:
+                        msg = self._events.get(timeout=max(0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        if not interrupted_for_timeout:
+                            # 超时先尝试软中断，保留内核状态
+                            interrupted_for_timeout = True
+                            self.interrupt()
+                            deadline = time.monotonic() + 10
+                            continue
+                        # 中断无响应，只能重启内核
+                        logger.warning("Python 内核中断无响应，正在重启。")
+                        self.restart()
+                        capture.write("stderr", "\n[内核无响应，已重启，之前的变量已丢失]")
+                        return capture.result(None, timed_out=True)
+
+                    event = msg.get("event")
+                    if event == "lost":
+                        self.shutdown()
+                        capture.write("stderr", "\n[Python 内核意外退出 (可能超出内存上限)，之前的变量已丢失]")
+                        return capture.result(-1)
+                    if msg.get("id") != req_id:
+                        continue
+                    if event in ("stdout", "stderr"):
+                        self.executor.emit_output(capture, on_output, event, msg["data"])
+                    elif event == "exit":
+                        return capture.result(msg.get("code"), timed_out=interrupted_for_timeout)
+            finally:
+                self.busy = False
@@ -0,0 +1,162 @@
+"""
+Alice 容器内常驻执行守护进程 (alice-execd)
+
+宿主机通过一条长期存活的 `docker exec -i` 通道启动本脚本，之后所有代码块都经由
+stdin/stdout 上的 JSON Lines 协议下发，避免每次执行都付出 docker exec 的启动开销。
+本脚本只依赖标准库，会以 `python3 -c` 的方式注入容器，无需预先打包进镜像。
+
+请求 (宿主机 -> 容器):
+    {"id": "r1", "op": "exec", "lang": "bash" | "python", "code": "...", "timeout": 120, "cwd": "/app"}
+    {"id": "r2", "op": "kill", "target": "r1"}
+    {"id": "r3", "op": "ping"}
+
+响应 (容器 -> 宿主机):
+    {"id": "r1", "event": "stdout" | "stderr", "data": "..."}
+    {"id": "r1", "event": "exit", "code": 0, "timed_out": false}
+    {"id": "r3", "event": "pong", "pid": 42}
+    {"id": "r1", "event": "error", "message": "..."}
+"""
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+# 单行读取上限，防止无换行的超长输出 (如二进制文件) 一次性占满内存
+READ_CHUNK_LIMIT = 64 * 1024
+# 命令退出后等待输出转发完毕的上限 (秒)；后台子进程 (`cmd &`) 继承管道时读取端不会结束
+PUMP_JOIN_TIMEOUT = 5
+
+_out = sys.stdout
+_write_lock = threading.Lock()
+_procs = {}  # 请求 ID -> Popen
+_killed = set()  # 在子进程启动前就收到 kill 的请求 ID
+_procs_lock = threading.Lock()
+
+
+def send(msg):
+    """线程安全地向宿主机写出一条协议消息"""
+    line = json.dumps(msg, ensure_ascii=False)
+    with _write_lock:
+        _out.write(line + "\n")
+        _out.flush()
+
+
+def _pump(req_id, stream, name, finished):
+    """逐行转发子进程输出；finished 置位 (exit 已发出) 后只读取丢弃，避免后台子进程写满管道而阻塞"""
+    try:
+        while True:
+            data = stream.readline(READ_CHUNK_LIMIT)
+            if not data:
+                break
+            if not finished.is_set():
+                send({"id": req_id, "event": name, "data": data.decode("utf-8", errors="replace")})
+    except Exception:
+        pass
+    finally:
+        stream.close()
+
+
+def _kill_group(proc):
+    """杀死整个进程组，确保 bash 派生的子进程一并退出"""
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def _run(req):
+    req_id = req["id"]
+    code = req.get("code", "")
+    if req.get("lang") == "python":
+        argv = [sys.executable, "-c", code]
+    else:
+        argv = ["bash", "-c", code]
+
+    try:
+        proc = subprocess.Popen(
+            argv,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            cwd=req.get("cwd") or None,
+            start_new_session=True,  # 独立进程组，便于超时/中断时整组清理
+        )
+    except Exception as e:
+        send({"id": req_id, "event": "error", "message": str(e)})
+        return
+
+    with _procs_lock:
+        _procs[req_id] = proc
+        killed_early = req_id in _killed
+        _killed.discard(req_id)
+    if killed_early:
+        _kill_group(proc)
+
+    finished = threading.Event()
+    pumps = [
+        threading.Thread(target=_pump, args=(req_id, proc.stdout, "stdout", finished), daemon=True),
+        threading.Thread(target=_pump, args=(req_id, proc.stderr, "stderr", finished), daemon=True),
+    ]
+    for t in pumps:
+        t.start()
+
+    timed_out = False
+    try:
+        proc.wait(timeout=req.get("timeout"))
+    except subprocess.TimeoutExpired:
+        timed_out = True
+        _kill_group(proc)
+        proc.wait()
+
+    deadline = time.monotonic() + PUMP_JOIN_TIMEOUT
+    for t in pumps:
+        t.join(max(0, deadline - time.monotonic()))
+
+    with _procs_lock:
+        _procs.pop(req_id, None)
+    finished.set()
+    send({"id": req_id, "event": "exit", "code": proc.returncode, "timed_out": timed_out})
+
+
+def _kill(req):
+    with _procs_lock:
+        proc = _procs.get(req.get("target"))
+        if proc is None:
+            # exec 请求可能还未来得及启动子进程，记下以便启动后立即清理
+            _killed.add(req.get("target"))
+    if proc is not None:
+        _kill_group(proc)
+    send({"id": req["id"], "event": "killed", "found": proc is not None})
+
+
+def main():
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            req = json.loads(line)
+        except ValueError:
+            continue
+
+        op = req.get("op")
+        if op == "exec":
+            threading.Thread(target=_run, args=(req,), daemon=True).start()
+        elif op == "kill":
+            _kill(req)
+        elif op == "ping":
+            send({"id": req.get("id"), "event": "pong", "pid": os.getpid()})
+        else:
+            send({"id": req.get("id"), "event": "error", "message": f"unknown op: {op}"})
+
+    # 宿主机断开通道：清理所有仍在运行的子进程
+    with _procs_lock:
+        for proc in list(_procs.values()):
+            _kill_group(proc)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Alice 容器内持久化 Python 内核 (alice-kernel)
+
+与 alice_execd 使用相同风格的 JSON Lines 协议，但所有 ```python 代码块共享同一个
+解释器与全局命名空间：变量、已导入的模块 (pandas / akshare / matplotlib ...) 在块之间保留。
+
+启动参数:  python3 -u -c <本脚本> [内存上限 MB，0 表示不限制]
+
+请求 (宿主机 -> 容器):
+    {"id": "k1", "op": "exec", "code": "..."}
+    {"id": "k2", "op": "ping"}
+
+响应 (容器 -> 宿主机):
+    {"event": "ready", "pid": 42}
+    {"id": "k1", "event": "stdout" | "stderr", "data": "..."}
+    {"id": "k1", "event": "exit", "code": 0, "interrupted": false}
+    {"id": "k2", "event": "pong", "pid": 42}
+
+中断: 宿主机向内核进程发送 SIGINT，正在执行的代码块会收到 KeyboardInterrupt。
+"""
+import io
+import os
+import sys
+import json
+import time
+import fcntl
+import signal
+import termios
+import threading
+import traceback
+
+# 协议通道使用独立复制出的文件描述符，避免用户代码或其派生子进程写 fd 1/2 时破坏协议
+_proto = os.fdopen(os.dup(1), "w", encoding="utf-8", buffering=1)
+_write_lock = threading.Lock()
+_current_id = None
+
+
+def send(msg):
+    line = json.dumps(msg, ensure_ascii=False)
+    with _write_lock:
+        _proto.write(line + "\n")
+        _proto.flush()
+
+
+class _StreamWriter(io.TextIOBase):
+    """替换 sys.stdout / sys.stderr，把 Python 层输出直接转发为当前请求的事件"""
+    def __init__(self, name):
+        self.name = name
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        if data and _current_id is not None:
+            send({"id": _current_id, "event": self.name, "data": data})
+        return len(data)
+
+
+def _redirect_fd(fd, name):
+    """把 fd 级输出 (os.system、子进程等) 接到管道，由后台线程转发"""
+    r, w = os.pipe()
+    os.dup2(w, fd)
+    os.close(w)
+
+    def pump():
+        with os.fdopen(r, "rb", buffering=0) as f:
+            while True:
+                data = f.read(65536)
+                if not data:
+                    break
+                if _current_id is not None:
+                    send({"id": _current_id, "event": name, "data": data.decode("utf-8", errors="replace")})
+
+    threading.Thread(target=pump, daemon=True).start()
+    return r
+
+
+def _drain(fds, limit=0.5):
+    """等待 fd 级管道中的残留输出被转发完毕，保证 exit 事件在输出之后"""
+    deadline = time.monotonic() + limit
+    buf = bytearray(4)
+    while time.monotonic() < deadline:
+        pending = 0
+        for fd in fds:
+            try:
+                fcntl.ioctl(fd, termios.FIONREAD, buf)
+                pending += int.from_bytes(buf, sys.byteorder)
+            except OSError:
+                pass
+        if not pending:
+            return
+        time.sleep(0.005)
+
+
+def _apply_memory_limit(limit_mb):
+    if limit_mb <= 0:
+        return
+    try:
+        import resource
+        limit = limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except Exception as e:
+        sys.stderr.write(f"[alice-kernel] 设置内存上限失败: {e}\n")
+
+
+def main():
+    global _current_id
+    limit_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 0
+    _apply_memory_limit(limit_mb)
+
+    stdin = sys.stdin
+    pipe_fds = [_redirect_fd(1, "stdout"), _redirect_fd(2, "stderr")]
+    sys.stdout = _StreamWriter("stdout")
+    sys.stderr = _StreamWriter("stderr")
+    # 非交互后端，避免 plt.show() 阻塞
+    os.environ.setdefault("MPLBACKEND", "Agg")
+
+    namespace = {"__name__": "__main__", "__builtins__": __builtins__}
+    send({"event": "ready", "pid": os.getpid()})
+
+    while True:
+        try:
+            line = stdin.readline()
+        except KeyboardInterrupt:
+            # 空闲时收到的中断信号直接忽略
+            continue
+        if not line:
+            break
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            req = json.loads(line)
+        except ValueError:
+            continue
+
+        if req.get("op") == "ping":
+            send({"id": req.get("id"), "event": "pong", "pid": os.getpid()})
+            continue
+        if req.get("op") != "exec":
+            continue
+
+        _current_id = req["id"]
+        code, interrupted = 0, False
+        try:
+            exec(compile(req.get("code", ""), "<cell>", "exec"), namespace)
+        except KeyboardInterrupt:
+            code, interrupted = 130, True
+            sys.stderr.write("KeyboardInterrupt: 代码块已被中断\n")
+        except SystemExit as e:
+            code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+        except MemoryError:
+            code = 137
+            sys.stderr.write("MemoryError: 超出内核内存上限\n")
+        except BaseException:
+            code = 1
+            # 去掉内核自身的栈帧，只保留用户代码部分
+            etype, value, tb = sys.exc_info()
+            sys.stderr.write("".join(traceback.format_exception(etype, value, tb.tb_next)))
+        finally:
+            try:
+                _drain(pipe_fds)
+            except KeyboardInterrupt:
+                pass
+            send({"id": _current_id, "event": "exit", "code": code, "interrupted": interrupted})
+            _current_id = None
+
+
+if __name__ == "__main__":
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    main()
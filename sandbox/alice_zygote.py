@@ -0,0 +1,287 @@
+"""
+Alice 容器内技能预热进程 (alice-zygote)
+
+技能脚本 (如 skills/akshare/akshare_tool.py) 每次以新的 python 进程启动，往往要先花数秒导入
+akshare / pandas / openpyxl / playwright 才开始干活。本脚本作为 fork server 常驻容器：
+启动时一次性导入一组重量级模块，之后每次技能调用都 fork 一个子进程执行，子进程借助写时复制
+直接继承已导入的模块，启动耗时降到毫秒级。
+
+本脚本只依赖标准库，同时充当服务端与客户端 (启动器)：
+    python3 alice_zygote.py serve --socket /tmp/alice_zygote.sock --preload pandas,akshare
+    python3 alice_zygote.py run skills/xxx/tool.py --arg value
+
+协议 (Unix Socket，客户端 -> 服务端):
+    一条消息：4 字节大端长度 + JSON {"argv": [...], "cwd": "...", "env": {...}}，
+    并通过 SCM_RIGHTS 附带客户端的 stdin / stdout / stderr 三个文件描述符。
+服务端 -> 客户端:
+    "P<pid>\\n"  子进程已启动
+    "X<code>\\n" 子进程已退出 (被信号杀死时为负的信号值)
+
+子进程在独立的进程组中运行，直接读写客户端的 0/1/2，因此管道、重定向与退出码语义与
+`python script.py` 一致。客户端被杀死 (连接断开) 时，服务端会杀死对应子进程的整个进程组；
+服务端不可用时客户端直接 exec 普通的 python 进程。
+"""
+import io
+import json
+import os
+import runpy
+import selectors
+import signal
+import socket
+import struct
+import sys
+import time
+import traceback
+
+DEFAULT_SOCKET = "/tmp/alice_zygote.sock"
+_LENGTH = struct.Struct(">I")
+
+
+# ----------------------------------------------------------------------
+# 服务端
+# ----------------------------------------------------------------------
+def _preload(modules):
+    for name in modules:
+        started = time.monotonic()
+        try:
+            __import__(name)
+            print(f"[alice-zygote] 已预加载 {name} ({time.monotonic() - started:.2f}s)", file=sys.stderr)
+        except Exception as e:
+            print(f"[alice-zygote] 预加载 {name} 失败: {e}", file=sys.stderr)
+
+
+def _recv_request(conn):
+    """读取一条请求，返回 (请求, [fd, ...])"""
+    data, fds, _, _ = socket.recv_fds(conn, 1 << 20, 3)
+    if not data:
+        return None, fds # 探测连接 (见 serve 开头)
+    if len(data) < _LENGTH.size:
+        raise ValueError("请求过短")
+    size = _LENGTH.unpack(data[:_LENGTH.size])[0]
+    body = data[_LENGTH.size:]
+    while len(body) < size:
+        chunk = conn.recv(size - len(body))
+        if not chunk:
+            raise ValueError("请求不完整")
+        body += chunk
+    return json.loads(body), fds
+
+
+def _child_main(req, fds):
+    """fork 出的子进程：接管客户端的标准流后以 __main__ 身份运行技能脚本，不返回"""
+    code = 1
+    try:
+        os.setsid() # 独立进程组，便于整组清理
+        for target, fd in enumerate(fds):
+            os.dup2(fd, target)
+            if fd > 2:
+                os.close(fd)
+        sys.stdin = io.TextIOWrapper(io.FileIO(0, "r", closefd=False), line_buffering=False)
+        sys.stdout = io.TextIOWrapper(io.FileIO(1, "w", closefd=False), write_through=True)
+        sys.stderr = io.TextIOWrapper(io.FileIO(2, "w", closefd=False), write_through=True)
+
+        os.chdir(req.get("cwd") or "/")
+        os.environ.clear()
+        os.environ.update(req.get("env") or {})
+        argv = req["argv"]
+        sys.argv = list(argv)
+        sys.path[0] = os.path.dirname(os.path.abspath(argv[0]))
+        try:
+            runpy.run_path(argv[0], run_name="__main__")
+            code = 0
+        except SystemExit as e:
+            if e.code is None:
+                code = 0
+            elif isinstance(e.code, int):
+                code = e.code
+            else:
+                print(e.code, file=sys.stderr)
+                code = 1
+        except BaseException:
+            traceback.print_exc()
+            code = 1
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        except Exception:
+            pass
+        os._exit(code)
+
+
+def serve(socket_path, preload):
+    # 已有存活的服务端时直接退出
+    if os.path.exists(socket_path):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(socket_path)
+            probe.close()
+            return
+        except OSError:
+            os.unlink(socket_path)
+
+    _preload(preload)
+
+    # 在单线程事件循环中同时处理新连接与子进程退出 (SIGCHLD 经 wakeup fd 唤醒)，fork 前不存在其他线程
+    wake_r, wake_w = os.pipe()
+    os.set_blocking(wake_w, False)
+    signal.set_wakeup_fd(wake_w)
+    signal.signal(signal.SIGCHLD, lambda *_: None)
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path + ".tmp")
+    os.replace(socket_path + ".tmp", socket_path)
+    server.listen(64)
+
+    sel = selectors.DefaultSelector()
+    sel.register(server, selectors.EVENT_READ, "accept")
+    sel.register(wake_r, selectors.EVENT_READ, "sigchld")
+    children = {} # pid -> 客户端连接
+    print(f"[alice-zygote] 就绪 (PID {os.getpid()})", file=sys.stderr)
+
+    while True:
+        for key, _ in sel.select():
+            if key.data == "accept":
+                conn, _ = server.accept()
+                try:
+                    req, fds = _recv_request(conn)
+                except Exception as e:
+                    print(f"[alice-zygote] 无效请求: {e}", file=sys.stderr)
+                    req, fds = None, []
+                if req is None:
+                    for fd in fds:
+                        os.close(fd)
+                    conn.close()
+                    continue
+                try:
+                    pid = os.fork()
+                except OSError as e:
+                    # 客户端收不到 P 行时会自行回退到普通进程
+                    print(f"[alice-zygote] fork 失败: {e}", file=sys.stderr)
+                    for fd in fds:
+                        os.close(fd)
+                    conn.close()
+                    continue
+                if pid == 0:
+                    sel.close()
+                    server.close()
+                    conn.close()
+                    for c in children.values():
+                        c.close()
+                    signal.set_wakeup_fd(-1)
+                    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                    os.close(wake_r)
+                    os.close(wake_w)
+                    _child_main(req, fds)
+                for fd in fds:
+                    os.close(fd)
+                children[pid] = conn
+                sel.register(conn, selectors.EVENT_READ, pid)
+                try:
+                    conn.sendall(f"P{pid}\n".encode())
+                except OSError:
+                    pass
+
+            elif key.data == "sigchld":
+                try:
+                    os.read(wake_r, 4096)
+                except BlockingIOError:
+                    pass
+                while True:
+                    try:
+                        pid, status = os.waitpid(-1, os.WNOHANG)
+                    except ChildProcessError:
+                        break
+                    if pid == 0:
+                        break
+                    conn = children.pop(pid, None)
+                    if conn is None:
+                        continue
+                    sel.unregister(conn)
+                    try:
+                        conn.sendall(f"X{os.waitstatus_to_exitcode(status)}\n".encode())
+                    except OSError:
+                        pass
+                    conn.close()
+
+            else:
+                # 客户端连接上出现可读事件只可能是断开：客户端已被杀死，清理子进程组
+                pid = key.data
+                conn = key.fileobj
+                if conn.recv(1):
+                    continue
+                # 子进程退出后仍由上面的 waitpid 循环回收
+                children.pop(pid, None)
+                sel.unregister(conn)
+                conn.close()
+                try:
+                    os.killpg(pid, signal.SIGKILL)
+                except (ProcessLookupError, PermissionError):
+                    pass
+
+
+# ----------------------------------------------------------------------
+# 客户端 (启动器)
+# ----------------------------------------------------------------------
+def _exec_cold(argv):
+    """服务端不可用：以普通 python 进程运行"""
+    os.execvp(sys.executable, [sys.executable] + argv)
+
+
+def run(argv, socket_path):
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        conn.connect(socket_path)
+    except OSError:
+        conn.close()
+        _exec_cold(argv)
+
+    body = json.dumps({"argv": argv, "cwd": os.getcwd(), "env": dict(os.environ)}).encode("utf-8")
+    socket.send_fds(conn, [_LENGTH.pack(len(body)) + body], [0, 1, 2])
+
+    reader = conn.makefile("rb")
+    line = reader.readline()
+    if not line.startswith(b"P"):
+        # 服务端在 fork 前出错，此时子进程尚未启动，可安全回退
+        conn.close()
+        _exec_cold(argv)
+    pid = int(line[1:])
+
+    # 把 Ctrl+C / 终止信号转发给子进程组
+    def forward(signum, _frame):
+        try:
+            os.killpg(pid, signum)
+        except (ProcessLookupError, PermissionError):
+            pass
+    for signum in (signal.SIGINT, signal.SIGTERM, signal.SIGHUP):
+        signal.signal(signum, forward)
+
+    line = reader.readline()
+    if not line.startswith(b"X"):
+        sys.exit(1)
+    code = int(line[1:])
+    sys.exit(128 - code if code < 0 else code)
+
+
+def main():
+    args = sys.argv[1:]
+    socket_path = os.environ.get("ALICE_ZYGOTE_SOCKET", DEFAULT_SOCKET)
+    if args and args[0] == "serve":
+        preload = []
+        rest = args[1:]
+        while rest:
+            opt = rest.pop(0)
+            if opt == "--socket" and rest:
+                socket_path = rest.pop(0)
+            elif opt == "--preload" and rest:
+                preload = [m for m in rest.pop(0).split(",") if m]
+        serve(socket_path, preload)
+    elif len(args) >= 2 and args[0] == "run":
+        run(args[1:], socket_path)
+    else:
+        print("用法: alice_zygote.py serve [--socket PATH] [--preload m1,m2] | run SCRIPT [ARGS...]", file=sys.stderr)
+        sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
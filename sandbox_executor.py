@@ -0,0 +1,418 @@
+import os
+import json
+import queue
+import time
+import codecs
+import logging
+import itertools
+import threading
+import subprocess
+import http.client
+import config
+from output_capture import OutputCapture
+
+logger = logging.getLogger("SandboxExecutor")
+
+# 容器内守护进程源码 (以 python3 -c 方式注入，无需重建镜像)
+DAEMON_SOURCE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sandbox", "alice_execd.py")
+
+# 单行读取上限，防止无换行的超长输出一次性占满内存
+READ_CHUNK_LIMIT = 64 * 1024
+
+# 进程退出后等待输出读取线程结束的上限 (秒)；容器内遗留的后台子进程可能一直占着管道
+PUMP_JOIN_TIMEOUT = 5
+
+# 回退路径下记录容器内进程组 ID 的 pidfile，用于硬中断时整组清理
+PIDFILE_DIR = "/tmp"
+
+# 回退路径的包装脚本：setsid 使 bash 成为新进程组的组长，其 PID 即进程组 ID
+_GROUP_WRAPPER = 'echo $$ > "$0"; "$@"; rc=$?; rm -f "$0"; exit $rc'
+
+
+class SandboxExecutor:
+    """
+    容器执行器
+    优先通过常驻守护进程 (sandbox/alice_execd.py) 复用同一条 docker exec 通道执行指令，
+    守护进程不可用时自动回退到逐次 exec：有 Docker Engine API 客户端时直接调用 API，否则调用 `docker exec`。
+    """
+    def __init__(self, container_name, workdir="/app", use_daemon=True, startup_timeout=10,
+                 max_output_bytes=None, spill_dir=None, api=None, stream_all_output=False):
+        self.container_name = container_name
+        self.api = api # docker_api.DockerAPI，可选
+        self.workdir = workdir
+        self.use_daemon = use_daemon
+        self.startup_timeout = startup_timeout
+        self.max_output_bytes = max_output_bytes or config.TOOL_OUTPUT_MAX_BYTES
+        self.spill_dir = spill_dir or os.path.join(config.ALICE_OUTPUT_DIR, "logs")
+        # 为 True 时实时回调接收全部输出 (由调用方自行持久化，如后台任务日志)，捕获上限只作用于返回结果且不再另行落盘
+        self.stream_all_output = stream_all_output
+
+        self._proc = None
+        self._pending = {} # 请求 ID -> 事件队列
+        self._lock = threading.RLock() # 守护进程的启动、握手与关闭 (握手时会在持锁状态下发送请求)
+        self._write_lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._daemon_failed = False # 启动失败后不再反复尝试，直接走回退路径
+        # 正在执行的请求：请求 ID -> ("daemon", None) | ("exec", (docker exec 客户端, pidfile)) | ("api", (ExecStream, pidfile))
+        self._active = {}
+        self._active_lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # 守护进程生命周期
+    # ------------------------------------------------------------------
+    def _daemon_command(self):
+        with open(DAEMON_SOURCE_PATH, 'r', encoding='utf-8') as f:
+            source = f.read()
+        return [
+            "docker", "exec", "-i",
+            "-w", self.workdir,
+            self.container_name,
+            "python3", "-u", "-c", source
+        ]
+
+    def _daemon_alive(self):
+        return self._proc is not None and self._proc.poll() is None
+
+    def _ensure_daemon(self):
+        """按需启动守护进程，返回其是否可用 (握手在锁内完成，其他调用方不会拿到尚未就绪的守护进程)"""
+        if not self.use_daemon or self._daemon_failed:
+            return False
+        with self._lock:
+            if self._daemon_failed:
+                return False
+            if self._daemon_alive():
+                return True
+            try:
+                self._proc = subprocess.Popen(
+                    self._daemon_command(),
+                    stdin=subprocess.PIPE,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    text=True,
+                    encoding='utf-8',
+                    errors='replace',
+                    bufsize=1
+                )
+            except Exception as e:
+                logger.warning(f"执行守护进程启动失败，回退到 docker exec: {e}")
+                self._daemon_failed = True
+                return False
+
+            threading.Thread(target=self._read_loop, args=(self._proc,), daemon=True).start()
+            threading.Thread(target=self._stderr_loop, args=(self._proc,), daemon=True).start()
+
+            # 握手确认守护进程已就绪
+            msg = None
+            try:
+                req_id, events = self._request({"op": "ping"})
+                try:
+                    msg = events.get(timeout=self.startup_timeout)
+                except queue.Empty:
+                    pass
+                finally:
+                    self._pending.pop(req_id, None)
+            except OSError:
+                pass
+            if not msg or msg.get("event") != "pong":
+                logger.warning("执行守护进程握手失败，回退到 docker exec。")
+                self._daemon_failed = True
+                self.close()
+                return False
+            logger.info(f"执行守护进程已就绪 (容器内 PID: {msg.get('pid')})")
+            return True
+
+    def warm_up(self):
+        """预先启动守护进程 (沙盒就绪后在后台调用)，返回其是否可用"""
+        return self._ensure_daemon()
+
+    def _read_loop(self, proc):
+        """读取守护进程输出并按请求 ID 分发"""
+        for line in proc.stdout:
+            try:
+                msg = json.loads(line)
+            except ValueError:
+                continue
+            events = self._pending.get(msg.get("id"))
+            if events is not None:
+                events.put(msg)
+
+        # 通道断开：通知所有等待中的请求
+        logger.warning("执行守护进程通道已断开。")
+        for events in list(self._pending.values()):
+            events.put({"event": "lost"})
+
+    def _stderr_loop(self, proc):
+        for line in proc.stderr:
+            if line.strip():
+                logger.warning(f"执行守护进程 stderr: {line.rstrip()}")
+
+    def _send(self, payload):
+        """写出一条请求，返回其请求 ID (不关心回复的请求无需登记事件队列)"""
+        req_id = payload.setdefault("id", f"r{next(self._ids)}")
+        with self._lock:
+            proc = self._proc
+        if proc is None:
+            # 守护进程已关闭：按写入失败处理，调用方回退到逐次 exec
+            raise BrokenPipeError("执行守护进程未运行")
+        with self._write_lock:
+            proc.stdin.write(json.dumps(payload, ensure_ascii=False) + "\n")
+            proc.stdin.flush()
+        return req_id
+
+    def _request(self, payload):
+        req_id = f"r{next(self._ids)}"
+        events = queue.Queue()
+        self._pending[req_id] = events
+        payload["id"] = req_id
+        self._send(payload)
+        return req_id, events
+
+    def cancel_request(self, req_id):
+        """
+        硬中断单个请求：杀死其在容器内的整个进程组
+        守护进程路径下发 kill 指令；回退路径先杀掉本地 docker exec 客户端，再异步清理容器内进程组。
+        """
+        with self._active_lock:
+            entry = self._active.get(req_id)
+        if entry is None:
+            return False
+        kind, handle = entry
+        if kind == "daemon":
+            try:
+                self._send({"op": "kill", "target": req_id})
+            except (OSError, AttributeError) as e:
+                logger.warning(f"下发 kill 指令失败: {e}")
+            return True
+        client, pidfile = handle
+        if kind == "api":
+            client.close()
+        else:
+            client.kill()
+        self._kill_group(pidfile)
+        return True
+
+    def _kill_group(self, pidfile):
+        """按 pidfile 杀死容器内的进程组，不等待结果，避免 exec 的启动开销计入中断耗时"""
+        self.spawn_detached(["bash", "-c", f'kill -KILL -- -"$(cat {pidfile})" 2>/dev/null; rm -f {pidfile}'])
+
+    def spawn_detached(self, argv):
+        """在容器内启动一个后台进程，不等待也不收集输出"""
+        if self.api:
+            try:
+                self.api.exec_start(self.api.exec_create(self.container_name, argv, workdir=self.workdir), detach=True)
+                return
+            except Exception as e:
+                logger.warning(f"经由 Docker API 启动后台进程失败，改用 docker exec: {e}")
+        subprocess.Popen(
+            ["docker", "exec", "-d", "-w", self.workdir, self.container_name] + argv,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+
+    def cancel_all(self):
+        """硬中断所有正在执行的请求，返回被中断的请求数量"""
+        with self._active_lock:
+            active = list(self._active)
+        if active:
+            logger.info(f"正在硬中断 {len(active)} 个执行请求: {active}")
+        return sum(1 for req_id in active if self.cancel_request(req_id))
+
+    def close(self):
+        """关闭守护进程通道 (容器内子进程会随 stdin 关闭一并清理)"""
+        with self._lock:
+            proc = self._proc
+            self._proc = None
+        if proc is None:
+            return
+        try:
+            proc.stdin.close()
+            proc.wait(timeout=5)
+        except Exception:
+            proc.kill()
+
+    # ------------------------------------------------------------------
+    # 执行入口
+    # ------------------------------------------------------------------
+    def new_capture(self):
+        spill_dir = None if self.stream_all_output else self.spill_dir
+        return OutputCapture(max_bytes=self.max_output_bytes, spill_dir=spill_dir)
+
+    def run(self, command, is_python_code=False, timeout=120, on_output=None):
+        """
+        在容器内执行指令
+        on_output(stream, data): 可选回调，输出按行实时推送 ("stdout" / "stderr")
+        返回 OutputCapture.result() 格式的字典 (stdout/stderr 已做有界截断，超限部分落盘至 log_path)
+        """
+        capture = self.new_capture()
+        if self._ensure_daemon():
+            try:
+                return self._run_via_daemon(command, is_python_code, timeout, capture, on_output)
+            except (BrokenPipeError, OSError) as e:
+                logger.warning(f"执行守护进程写入失败，本次回退到逐次 exec: {e}")
+                capture = self.new_capture()
+        if self.api:
+            try:
+                return self._run_via_api(command, is_python_code, timeout, capture, on_output)
+            except (OSError, http.client.HTTPException) as e:
+                logger.warning(f"Docker API 调用失败，本次回退到 docker exec: {e}")
+                capture = self.new_capture()
+        return self._run_via_exec(command, is_python_code, timeout, capture, on_output)
+
+    def emit_output(self, capture, on_output, stream, data):
+        """
+        记录一段输出并推送给实时回调
+        超过捕获上限后停止回显，避免把海量输出灌进 TUI；stream_all_output 为 True 时始终推送
+        """
+        was_over = capture.total_bytes > capture.max_bytes
+        capture.write(stream, data)
+        if not on_output or (was_over and not self.stream_all_output):
+            return
+        if capture.total_bytes > capture.max_bytes and not self.stream_all_output:
+            data = f"\n[输出过多，已暂停实时回显，完整日志: {capture.log_path or '未落盘'}]\n"
+            stream = "stderr"
+        try:
+            on_output(stream, data)
+        except Exception as e:
+            logger.debug(f"输出回调异常: {e}")
+
+    def _run_via_daemon(self, command, is_python_code, timeout, capture, on_output):
+        # 请求写入失败 (OSError) 时尚未执行，调用方可安全回退；写入成功之后的异常不再向外抛出 OSError，避免重复执行
+        req_id, events = self._request({
+            "op": "exec",
+            "lang": "python" if is_python_code else "bash",
+            "code": command,
+            "timeout": timeout,
+            "cwd": self.workdir
+        })
+        with self._active_lock:
+            self._active[req_id] = ("daemon", None)
+        try:
+            while True:
+                try:
+                    # 容器侧负责超时清理，这里额外留出余量以防通道卡死
+                    msg = events.get(timeout=timeout + 5)
+                except queue.Empty:
+                    try:
+                        self._send({"op": "kill", "target": req_id})
+                    except OSError as e:
+                        logger.warning(f"下发 kill 指令失败: {e}")
+                    return capture.result(None, timed_out=True)
+
+                event = msg.get("event")
+                if event in ("stdout", "stderr"):
+                    self.emit_output(capture, on_output, event, msg["data"])
+                elif event == "exit":
+                    return capture.result(msg.get("code"), timed_out=msg.get("timed_out", False))
+                elif event == "error":
+                    capture.write("stderr", msg.get("message", ""))
+                    return capture.result(-1)
+                elif event == "lost":
+                    capture.write("stderr", "\n[执行守护进程意外退出，输出可能不完整]")
+                    return capture.result(-1)
+        finally:
+            self._pending.pop(req_id, None)
+            with self._active_lock:
+                self._active.pop(req_id, None)
+
+    def _group_argv(self, command, is_python_code, pidfile):
+        """逐次 exec 的容器内命令：以独立进程组运行，中断时可通过 pidfile 整组清理"""
+        argv = ["setsid", "-w", "bash", "-c", _GROUP_WRAPPER, pidfile]
+        if is_python_code:
+            return argv + ["python3", "-c", command]
+        return argv + ["bash", "-c", command]
+
+    def _run_via_api(self, command, is_python_code, timeout, capture, on_output):
+        """回退路径：经由 Docker Engine API 创建 exec 并读取多路复用输出流"""
+        req_id = f"x{next(self._ids)}"
+        pidfile = f"{PIDFILE_DIR}/alice-exec-{os.getpid()}-{req_id}.pid"
+        exec_id = self.api.exec_create(self.container_name, self._group_argv(command, is_python_code, pidfile), workdir=self.workdir)
+        stream = self.api.exec_start(exec_id)
+        with self._active_lock:
+            self._active[req_id] = ("api", (stream, pidfile))
+
+        def pump():
+            # 帧边界可能切断多字节字符，按流分别增量解码
+            decoders = {}
+            for name, data in stream.frames():
+                decoder = decoders.setdefault(name, codecs.getincrementaldecoder("utf-8")(errors="replace"))
+                text = decoder.decode(data)
+                if text:
+                    self.emit_output(capture, on_output, name, text)
+            stream.close()
+
+        reader = threading.Thread(target=pump, daemon=True)
+        reader.start()
+        try:
+            reader.join(timeout)
+            if reader.is_alive():
+                self.cancel_request(req_id)
+                reader.join(1)
+                return capture.result(None, timed_out=True)
+        finally:
+            with self._active_lock:
+                self._active.pop(req_id, None)
+        # 输出流关闭与退出码写入之间存在短暂窗口
+        for _ in range(50):
+            info = self.api.exec_inspect(exec_id)
+            if not info.get("Running"):
+                break
+            time.sleep(0.02)
+        return capture.result(info.get("ExitCode"))
+
+    def _run_via_exec(self, command, is_python_code, timeout, capture, on_output):
+        """回退路径：逐次 docker exec (采用 List 模式避免 Shell 转义陷阱)"""
+        req_id = f"x{next(self._ids)}"
+        pidfile = f"{PIDFILE_DIR}/alice-exec-{os.getpid()}-{req_id}.pid"
+        # 在容器内以独立进程组运行，中断时可通过 pidfile 整组清理 (而不只是杀掉本地客户端)
+        full_command = [
+            "docker", "exec",
+            "-w", self.workdir,
+            self.container_name
+        ] + self._group_argv(command, is_python_code, pidfile)
+
+        proc = subprocess.Popen(
+            full_command,
+            shell=False, # 核心修复：禁用宿主机 Shell 解析
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            encoding='utf-8',
+            errors='replace',
+            env=os.environ
+        )
+        with self._active_lock:
+            self._active[req_id] = ("exec", (proc, pidfile))
+        lock = threading.Lock()
+
+        def pump(stream, name):
+            for line in iter(lambda: stream.readline(READ_CHUNK_LIMIT), ""):
+                with lock:
+                    self.emit_output(capture, on_output, name, line)
+            stream.close()
+
+        pumps = [
+            threading.Thread(target=pump, args=(proc.stdout, "stdout"), daemon=True),
+            threading.Thread(target=pump, args=(proc.stderr, "stderr"), daemon=True),
+        ]
+        for t in pumps:
+            t.start()
+        try:
+            proc.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            self.cancel_request(req_id)
+            try:
+                proc.wait(timeout=PUMP_JOIN_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                logger.warning(f"docker exec 客户端未能及时退出: {req_id}")
+            for t in pumps:
+                t.join(timeout=1)
+            return capture.result(None, timed_out=True)
+        finally:
+            with self._active_lock:
+                self._active.pop(req_id, None)
+        for t in pumps:
+            t.join(timeout=PUMP_JOIN_TIMEOUT)
+            if t.is_alive():
+                logger.warning(f"输出读取线程未在 {PUMP_JOIN_TIMEOUT}s 内结束 (可能有后台子进程仍占用输出管道)，按已收到的输出返回")
+        with lock:
+            return capture.result(proc.returncode)
@@ -0,0 +1,224 @@
+import os
+import json
+import time
+import fcntl
+import logging
+import threading
+
+logger = logging.getLogger("SandboxPool")
+
+# 归还时的轻量重置：杀掉除 init 以外的所有进程，清空 /tmp 与 /app 下除挂载目录以外的内容
+RESET_SCRIPT = (
+    "kill -KILL -1 2>/dev/null; "
+    "rm -rf /tmp/* /tmp/.[!.]* 2>/dev/null; "
+    "find /app -mindepth 1 -maxdepth 1 ! -name skills ! -name alice_output -exec rm -rf {} + 2>/dev/null; "
+    "true"
+)
+
+
+class Lease:
+    """一次容器租约，持有期间独占对应的池中容器"""
+    def __init__(self, pool, slot, container_name, lock_file):
+        self.pool = pool
+        self.slot = slot
+        self.container_name = container_name
+        self.lock_file = lock_file
+        self.acquired_at = time.monotonic()
+
+    def release(self):
+        self.pool.release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class SandboxPool:
+    """
+    预热的沙盒容器池
+    - 池中固定保持 size 个由同一镜像启动的容器 (名称为 <prefix>-<序号>)
+    - 租约通过 lease_dir 下的文件锁 (flock) 实现，可跨进程使用：多个 Alice 会话各自租用一个容器，
+      互不共享进程空间与工作目录；持有者进程意外退出时锁由内核自动释放
+    - 归还时执行轻量重置；使用次数达到 max_uses 或上一位持有者未正常归还时，下次租出前先重置/重建
+    """
+    def __init__(self, api, container_config, size=2, name_prefix="alice-sandbox-pool",
+                 max_uses=50, lease_dir=".alice_cache/sandbox_pool"):
+        self.api = api # docker_api.DockerAPI
+        self.container_config = container_config # Engine API 的容器创建配置
+        self.size = size
+        self.name_prefix = name_prefix
+        self.max_uses = max_uses
+        self.lease_dir = lease_dir
+        os.makedirs(lease_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._stats = {
+            "acquired": 0,
+            "released": 0,
+            "resets": 0,
+            "recycles": 0,
+            "wait_ms_total": 0,
+            "wait_ms_max": 0,
+        }
+
+    def container_name(self, slot):
+        return f"{self.name_prefix}-{slot}"
+
+    def _state_path(self, slot):
+        return os.path.join(self.lease_dir, f"slot-{slot}.json")
+
+    def _load_state(self, slot):
+        try:
+            with open(self._state_path(slot), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"uses": 0, "clean": True}
+
+    def _save_state(self, slot, state):
+        path = self._state_path(slot)
+        tmp = f"{path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp, path)
+
+    # ------------------------------------------------------------------
+    # 容器生命周期
+    # ------------------------------------------------------------------
+    def _ensure_container(self, slot):
+        """确保序号为 slot 的容器存在并处于运行状态"""
+        name = self.container_name(slot)
+        info = self.api.inspect_container(name)
+        if info is None:
+            logger.info(f"正在创建池容器 {name}")
+            config = dict(self.container_config)
+            config["Labels"] = dict(config.get("Labels") or {}, **{"alice.pool": self.name_prefix})
+            self.api.create_container(name, config)
+            self.api.start_container(name)
+        elif info["State"]["Status"].lower() != "running":
+            self.api.start_container(name)
+
+    def _exec(self, name, script):
+        exec_id = self.api.exec_create(name, ["bash", "-c", script])
+        stream = self.api.exec_start(exec_id)
+        for _ in stream.frames():
+            pass
+        stream.close()
+
+    def _reset(self, slot):
+        """轻量重置：清理残留进程与临时文件，保留已安装的依赖"""
+        self._exec(self.container_name(slot), RESET_SCRIPT)
+        with self._lock:
+            self._stats["resets"] += 1
+
+    def _recycle(self, slot):
+        """重建容器，彻底丢弃累积的状态 (如 pip 安装的包)"""
+        name = self.container_name(slot)
+        logger.info(f"池容器 {name} 使用次数已达上限，正在重建")
+        self.api.remove_container(name, force=True)
+        self._ensure_container(slot)
+        with self._lock:
+            self._stats["recycles"] += 1
+
+    def ensure_warm(self):
+        """预热：启动池中所有容器 (已运行的容器只需一次 inspect)"""
+        for slot in range(self.size):
+            self._ensure_container(slot)
+
+    # ------------------------------------------------------------------
+    # 租约
+    # ------------------------------------------------------------------
+    def _try_lock(self, slot):
+        f = open(os.path.join(self.lease_dir, f"slot-{slot}.lock"), 'a+')
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return f
+        except OSError:
+            f.close()
+            return None
+
+    def acquire(self, timeout=None, poll_interval=0.2):
+        """
+        租用一个空闲容器，全部被占用时等待，超时抛出 TimeoutError
+        返回 Lease
+        """
+        started = time.monotonic()
+        while True:
+            for slot in range(self.size):
+                lock_file = self._try_lock(slot)
+                if lock_file is None:
+                    continue
+                try:
+                    self._prepare(slot)
+                except Exception:
+                    lock_file.close()
+                    raise
+                wait_ms = int((time.monotonic() - started) * 1000)
+                with self._lock:
+                    self._stats["acquired"] += 1
+                    self._stats["wait_ms_total"] += wait_ms
+                    self._stats["wait_ms_max"] = max(self._stats["wait_ms_max"], wait_ms)
+                lease = Lease(self, slot, self.container_name(slot), lock_file)
+                logger.info(f"已租用池容器 {lease.container_name} (等待 {wait_ms} ms)")
+                return lease
+            if timeout is not None and time.monotonic() - started > timeout:
+                raise TimeoutError(f"沙盒容器池 ({self.size} 个) 已全部被占用")
+            time.sleep(poll_interval)
+
+    def _prepare(self, slot):
+        """租出前的检查：按需重建或补做重置，并记录使用次数"""
+        state = self._load_state(slot)
+        if state["uses"] >= self.max_uses:
+            self._recycle(slot)
+            state = {"uses": 0, "clean": True}
+        else:
+            self._ensure_container(slot)
+            if not state.get("clean", True):
+                # 上一位持有者未正常归还 (如进程崩溃)
+                self._reset(slot)
+        state["uses"] += 1
+        state["clean"] = False
+        self._save_state(slot, state)
+
+    def release(self, lease):
+        """归还容器：先重置再释放文件锁"""
+        if lease.lock_file is None:
+            return
+        try:
+            self._reset(lease.slot)
+            state = self._load_state(lease.slot)
+            state["clean"] = True
+            self._save_state(lease.slot, state)
+        except Exception as e:
+            logger.warning(f"重置池容器 {lease.container_name} 失败，将在下次租出前重试: {e}")
+        finally:
+            lease.lock_file.close()
+            lease.lock_file = None
+        with self._lock:
+            self._stats["released"] += 1
+        logger.info(f"已归还池容器 {lease.container_name}，持有 {time.monotonic() - lease.acquired_at:.1f}s")
+
+    # ------------------------------------------------------------------
+    # 指标
+    # ------------------------------------------------------------------
+    def metrics(self):
+        """池指标：容量、当前被占用的槽位 (含其他进程持有的)、各槽位使用次数与本进程的租用统计"""
+        leased = []
+        for slot in range(self.size):
+            lock_file = self._try_lock(slot)
+            if lock_file is None:
+                leased.append(slot)
+            else:
+                lock_file.close()
+        with self._lock:
+            stats = dict(self._stats)
+        acquired = stats["acquired"]
+        stats["wait_ms_avg"] = stats["wait_ms_total"] // acquired if acquired else 0
+        return {
+            "size": self.size,
+            "leased": len(leased),
+            "idle": self.size - len(leased),
+            "uses": {self.container_name(s): self._load_state(s)["uses"] for s in range(self.size)},
+            **stats,
+        }
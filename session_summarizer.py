@@ -0,0 +1,100 @@
+import logging
+import threading
+
+from token_counter import count_tokens
+
+logger = logging.getLogger("SessionSummarizer")
+
+# 每条被移出的消息最多保留的字符数 (工具反馈可能很长，头尾各保留一部分)
+MAX_MESSAGE_CHARS = 4000
+
+
+def _clip(text, limit=MAX_MESSAGE_CHARS):
+    if len(text) <= limit:
+        return text
+    head = limit * 2 // 3
+    return f"{text[:head]}\n...[省略 {len(text) - limit} 字]...\n{text[-(limit - head):]}"
+
+
+def _format_messages(messages):
+    lines = []
+    for m in messages:
+        content = str(m.get("content", ""))
+        if m.get("role") == "assistant":
+            speaker = "Alice"
+        elif content.startswith("容器执行反馈"):
+            speaker = "执行反馈"
+        else:
+            speaker = "用户"
+        lines.append(f"[{speaker}]\n{_clip(content)}")
+    return "\n\n".join(lines)
+
+
+class SessionSummarizer:
+    """
+    会话滚动摘要
+    上下文截断时被移出的消息经 evict() 交给后台线程 (立即返回)，后台线程把它们与现有摘要合并为新的摘要，
+    供下一次上下文构建注入，避免在长会话中遗忘早先的工具结果而重复执行。
+    模型调用失败时保留待合并的消息，下次有新消息被移出时一并重试。
+    """
+    def __init__(self, client, model_name, max_tokens=800, on_update=None):
+        self.client = client
+        self.model_name = model_name
+        self.max_tokens = max_tokens
+        self.on_update = on_update
+        self.summary = ""
+        self._pending = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def evict(self, messages):
+        """提交被移出上下文的消息，不阻塞调用方"""
+        messages = [m for m in messages if m.get("role") != "system"]
+        if not messages:
+            return
+        with self._lock:
+            self._pending.extend(messages)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="alice-session-summary", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def _loop(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            with self._lock:
+                batch, self._pending = self._pending, []
+                summary = self.summary
+            if not batch:
+                continue
+            try:
+                merged = self._merge(summary, batch)
+            except Exception as e:
+                logger.warning(f"会话摘要更新失败，待下次重试 ({len(batch)} 条消息): {e}")
+                with self._lock:
+                    self._pending = batch + self._pending
+                continue
+            with self._lock:
+                self.summary = merged
+            logger.info(f"会话摘要已更新: 合并 {len(batch)} 条消息，约 {count_tokens(merged)} tokens")
+            if self.on_update:
+                self.on_update()
+
+    def _merge(self, summary, batch):
+        prompt = (
+            "你是会话记录员。下面是本次会话此前的滚动摘要，以及刚刚被移出上下文窗口的对话记录。\n"
+            "请把两者合并为一份新的会话摘要，重点保留：\n"
+            "1. 已执行过的命令/脚本及其关键结果 (文件路径、数据、结论、报错原因)，避免之后重复执行。\n"
+            "2. 用户提出的需求与约束、已做出的决定。\n"
+            "3. 尚未完成的事项。\n"
+            f"使用简洁的 Markdown 列表，总长度不超过 {self.max_tokens} tokens，只输出摘要本身。\n\n"
+            f"### 此前的摘要\n{summary or '(无)'}\n\n"
+            f"### 被移出的对话\n{_format_messages(batch)}"
+        )
+        response = self.client.chat.completions.create(
+            model=self.model_name,
+            messages=[{"role": "user", "content": prompt}]
+        )
+        return (response.choices[0].message.content or "").strip() or summary
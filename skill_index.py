@@ -0,0 +1,205 @@
+import os
+import json
+import math
+import hashlib
+import logging
+import threading
+from collections import Counter
+
+from front_matter import split_front_matter
+from memory_index import tokenize, K1, B, RRF_K
+
+logger = logging.getLogger("SkillIndex")
+
+# 名称与描述比正文更能代表技能用途，建立词频时重复计入
+NAME_WEIGHT = 3
+DESCRIPTION_WEIGHT = 2
+# 参与向量计算的正文长度 (字符)
+EMBED_BODY_CHARS = 1000
+# BM25 得分低于最高分该比例的技能视为无关 (只是碰巧共享「实时」「生成」之类的常见词)
+MIN_RELATIVE_SCORE = 0.25
+
+
+class SkillDoc:
+    """一个技能的检索文档：名称、描述与 SKILL.md 正文 (去掉 front matter)"""
+    __slots__ = ("name", "description", "path", "key", "terms", "length", "embed_text")
+
+    def __init__(self, name, description, path, key, body):
+        self.name = name
+        self.description = description
+        self.path = path
+        self.key = key
+        terms = tokenize(name.replace("-", " ").replace("_", " ")) * NAME_WEIGHT
+        terms += tokenize(description) * DESCRIPTION_WEIGHT
+        terms += tokenize(body)
+        self.terms = Counter(terms)
+        self.length = len(terms)
+        self.embed_text = f"{name}\n{description}\n{body[:EMBED_BODY_CHARS]}"
+
+
+class SkillIndex:
+    """
+    技能的本地检索索引
+    对技能名称、描述与正文建立 BM25 统计；sync 时按 SKILL.md 的 (mtime, size) 只重新读取变化的技能。
+    提供 embed(texts) -> [向量, ...] 时额外做向量检索，向量按文本哈希缓存在磁盘上，两路结果按倒数排名融合。
+    """
+    def __init__(self, embed=None, embedding_path=None):
+        self.embed = embed
+        self.embedding_path = embedding_path
+        self.docs = {} # 技能名 -> SkillDoc
+        self._df = Counter()
+        self._total_length = 0
+        self._vectors = None # 文本哈希 -> 向量 (首次使用时从磁盘加载)
+        self._embed_pending = False # 上次向量计算失败，下次 sync 时重试
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # 增量更新
+    # ------------------------------------------------------------------
+    def sync(self, skills):
+        """skills 为 SnapshotManager 的技能注册表 {技能名: {"description", "path", ...}}"""
+        with self._lock:
+            added = removed = 0
+            for name in [n for n in self.docs if n not in skills]:
+                self._remove(self.docs[name])
+                removed += 1
+            for name, skill in skills.items():
+                path = skill["path"]
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                key = (path, st.st_mtime_ns, st.st_size, skill["description"])
+                old = self.docs.get(name)
+                if old and old.key == key:
+                    continue
+                try:
+                    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+                        _, body = split_front_matter(f.read())
+                except OSError:
+                    body = ""
+                if old:
+                    self._remove(old)
+                self._add(SkillDoc(name, skill["description"], path, key, body))
+                added += 1
+            if added or removed:
+                logger.info(f"技能索引已更新: +{added} / -{removed}，共 {len(self.docs)} 个")
+            if added or removed or self._embed_pending:
+                self._embed_missing()
+            return added, removed
+
+    def _add(self, doc):
+        self.docs[doc.name] = doc
+        self._df.update(doc.terms.keys())
+        self._total_length += doc.length
+
+    def _remove(self, doc):
+        del self.docs[doc.name]
+        self._df.subtract(doc.terms.keys())
+        self._total_length -= doc.length
+
+    # ------------------------------------------------------------------
+    # 向量 (可选)
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _text_key(doc):
+        return hashlib.sha1(doc.embed_text.encode("utf-8")).hexdigest()
+
+    def _load_vectors(self):
+        if self._vectors is None:
+            self._vectors = {}
+            if self.embedding_path and os.path.exists(self.embedding_path):
+                try:
+                    with open(self.embedding_path, "r", encoding="utf-8") as f:
+                        self._vectors = json.load(f)
+                except (OSError, ValueError) as e:
+                    logger.warning(f"技能向量缓存读取失败，将重新计算: {e}")
+        return self._vectors
+
+    def _embed_missing(self):
+        if not self.embed:
+            return
+        vectors = self._load_vectors()
+        missing = [d for d in self.docs.values() if self._text_key(d) not in vectors]
+        if not missing:
+            return
+        try:
+            for i in range(0, len(missing), 64):
+                batch = missing[i:i + 64]
+                for doc, vector in zip(batch, self.embed([d.embed_text for d in batch])):
+                    vectors[self._text_key(doc)] = vector
+            self._embed_pending = False
+        except Exception as e:
+            self._embed_pending = True
+            logger.warning(f"技能向量计算失败，本次仅使用 BM25: {e}")
+        live = {self._text_key(d) for d in self.docs.values()}
+        for key in [k for k in vectors if k not in live]:
+            del vectors[key]
+        if self.embedding_path:
+            try:
+                os.makedirs(os.path.dirname(self.embedding_path), exist_ok=True)
+                tmp = self.embedding_path + ".tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(vectors, f)
+                os.replace(tmp, self.embedding_path)
+            except OSError as e:
+                # 缓存只是优化，写入失败时保留内存中的向量，下次启动重新计算
+                logger.warning(f"技能向量缓存写入失败: {e}")
+
+    def _vector_ranking(self, query):
+        vectors = self._load_vectors()
+        try:
+            q = self.embed([query])[0]
+        except Exception as e:
+            logger.warning(f"查询向量计算失败，本次仅使用 BM25: {e}")
+            return []
+        q_norm = math.sqrt(sum(x * x for x in q)) or 1.0
+        scored = []
+        for doc in self.docs.values():
+            v = vectors.get(self._text_key(doc))
+            if v is None:
+                continue
+            v_norm = math.sqrt(sum(x * x for x in v)) or 1.0
+            scored.append((sum(a * b for a, b in zip(q, v)) / (q_norm * v_norm), doc.name))
+        scored.sort(reverse=True)
+        return [name for _, name in scored]
+
+    # ------------------------------------------------------------------
+    # 检索
+    # ------------------------------------------------------------------
+    def _bm25_ranking(self, query):
+        terms = set(tokenize(query))
+        if not terms or not self.docs:
+            return []
+        n = len(self.docs)
+        avg_len = self._total_length / n or 1.0
+        idf = {t: math.log(1 + (n - self._df[t] + 0.5) / (self._df[t] + 0.5)) for t in terms if self._df[t] > 0}
+        scored = []
+        for doc in self.docs.values():
+            score = 0.0
+            for t, w in idf.items():
+                tf = doc.terms.get(t)
+                if tf:
+                    score += w * tf * (K1 + 1) / (tf + K1 * (1 - B + B * doc.length / avg_len))
+            if score > 0:
+                scored.append((score, doc.name))
+        scored.sort(reverse=True)
+        cutoff = scored[0][0] * MIN_RELATIVE_SCORE if scored else 0
+        return [name for score, name in scored if score >= cutoff]
+
+    def search(self, query, k=8):
+        """返回与 query 最相关的技能 [SkillDoc, ...] (最多 k 个)"""
+        with self._lock:
+            ranking = self._bm25_ranking(query)
+            if self.embed and self.docs:
+                # 向量检索总能给出排名，只取前 k 个参与融合，避免把无关技能带进结果
+                fused = Counter()
+                for ranks in (ranking, self._vector_ranking(query)[:k]):
+                    for rank, name in enumerate(ranks):
+                        fused[name] += 1.0 / (RRF_K + rank)
+                ranking = [name for name, _ in fused.most_common()]
+            return [self.docs[name] for name in ranking[:k]]
+
+    def count(self):
+        with self._lock:
+            return len(self.docs)
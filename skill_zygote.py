@@ -0,0 +1,117 @@
+import os
+import re
+import base64
+import logging
+
+logger = logging.getLogger("SkillZygote")
+
+# 容器内预热进程源码 (写入容器 /tmp 后常驻运行，同一文件也是技能调用的启动器)
+ZYGOTE_SOURCE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sandbox", "alice_zygote.py")
+CONTAINER_SCRIPT = "/tmp/alice_zygote.py"
+CONTAINER_SOCKET = "/tmp/alice_zygote.sock"
+
+# 把源码写入容器后原地 exec 为服务端 (源码经 argv 以 base64 传入，无需 stdin 或重建镜像)
+_BOOTSTRAP = (
+    "import base64, os, sys; "
+    "p = sys.argv[1]; open(p + '.tmp', 'wb').write(base64.b64decode(sys.argv[2])); os.replace(p + '.tmp', p); "
+    "os.execv(sys.executable, [sys.executable, p] + sys.argv[3:])"
+)
+
+# 技能调用：位于命令位置的 `python[3] skills/xxx.py`
+_SKILL_CALL_RE = re.compile(r'python3?[ \t]+(skills/[^\s;&|()<>\'"\\$`]+\.py)(?=[ \t\n;&|)<>]|$)')
+# 其后开始一条新命令的控制符 (&& / || 逐字符处理即可)
+_COMMAND_SEPARATORS = ";&|(\n"
+
+
+def _skill_call_spans(command):
+    """
+    找出处于命令位置 (行首或 ; && || | & ( 之后，且不在引号内) 的技能调用，返回 [(起, 止, 脚本路径), ...]
+    含 heredoc 或反引号时无法可靠判断哪些文本是命令，返回空列表 (保持命令不变)。
+    """
+    if "<<" in command or "`" in command:
+        return []
+    spans = []
+    at_command = True
+    quote = None
+    i, n = 0, len(command)
+    while i < n:
+        ch = command[i]
+        if quote == "'":
+            if ch == "'":
+                quote = None
+        elif quote == '"':
+            if ch == "\\":
+                i += 1
+            elif ch == '"':
+                quote = None
+        elif ch in " \t":
+            pass
+        elif ch in _COMMAND_SEPARATORS:
+            at_command = True
+        elif ch == "#" and (i == 0 or command[i - 1] in " \t\n;&|("):
+            # 注释：跳到行尾
+            while i < n and command[i] != "\n":
+                i += 1
+            continue
+        else:
+            if at_command:
+                match = _SKILL_CALL_RE.match(command, i)
+                if match:
+                    spans.append((match.start(), match.end(), match.group(1)))
+                    i = match.end()
+                    at_command = False
+                    continue
+            at_command = False
+            if ch in "'\"":
+                quote = ch
+            elif ch == "\\":
+                i += 1
+        i += 1
+    return spans
+
+
+class SkillZygote:
+    """
+    技能预热进程 (fork server) 的宿主机侧管理
+    start() 在容器内拉起 sandbox/alice_zygote.py，预先导入 preload 中的重量级模块；
+    rewrite() 把 bash 代码块中的 `python skills/xxx.py ...` 改写为经由预热进程启动，
+    参数、标准流、管道与退出码语义不变，预热进程不可用时启动器自动回退为普通 python 进程。
+    """
+    def __init__(self, executor, preload):
+        self.executor = executor
+        self.preload = [m.strip() for m in preload if m.strip()]
+        self.ready = False
+
+    def start(self):
+        """启动预热进程 (沙盒就绪后在后台调用)，返回启动器是否可用"""
+        with open(ZYGOTE_SOURCE_PATH, 'rb') as f:
+            payload = base64.b64encode(f.read()).decode("ascii")
+        argv = ["python3", "-c", _BOOTSTRAP, CONTAINER_SCRIPT, payload,
+                "serve", "--socket", CONTAINER_SOCKET, "--preload", ",".join(self.preload)]
+        try:
+            self.executor.spawn_detached(argv)
+            # 只需确认启动器脚本已落盘；模块预加载期间的调用会自动回退为普通进程
+            result = self.executor.run(
+                f"for i in $(seq 50); do [ -f {CONTAINER_SCRIPT} ] && exit 0; sleep 0.1; done; exit 1",
+                timeout=10
+            )
+        except Exception as e:
+            logger.warning(f"技能预热进程启动失败: {e}")
+            return False
+        self.ready = result["returncode"] == 0
+        if self.ready:
+            logger.info(f"技能预热进程已启动，预加载模块: {self.preload}")
+        else:
+            logger.warning("技能预热进程启动失败：启动器脚本未写入容器。")
+        return self.ready
+
+    def rewrite(self, command):
+        """把 bash 代码块中的技能调用改写为经由预热进程启动"""
+        if not self.ready:
+            return command
+        rewritten = command
+        for start, end, script in reversed(_skill_call_spans(command)):
+            rewritten = f"{rewritten[:start]}python3 {CONTAINER_SCRIPT} run {script}{rewritten[end:]}"
+        if rewritten != command:
+            logger.info(f"技能调用经由预热进程启动: {rewritten[:200]}")
+        return rewritten
@@ -1,13 +1,96 @@
 import os
-import time
 import re
+import json
+import time
+import ctypes
+import ctypes.util
+import struct
+import logging
+import threading
+
+from front_matter import parse_front_matter
+
+logger = logging.getLogger("SnapshotManager")
+
+# inotify 常量 (见 <sys/inotify.h>)
+IN_MODIFY = 0x002
+IN_ATTRIB = 0x004
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_MOVE_SELF = 0x800
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+               | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+_EVENT = struct.Struct("iIII")
+
+# 技能注册表缓存格式版本，解析逻辑或记录字段变化时加一使旧缓存失效
+REGISTRY_CACHE_VERSION = 1
+
+
+class Inotify:
+    """Linux inotify 的最小封装 (ctypes)，非 Linux 或不可用时构造抛出 OSError / AttributeError"""
+    def __init__(self):
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        self._paths = {} # wd -> 目录
+        self._wds = {} # 目录 -> wd
+
+    def watch(self, directory):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(directory), _WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch 失败: {directory}")
+        self._paths[wd] = directory
+        self._wds[directory] = wd
+
+    def is_watching(self, directory):
+        return directory in self._wds
+
+    def poll(self):
+        """返回上次调用以来收到事件的目录集合，事件队列溢出时返回 None (需要全面检查)"""
+        dirty = set()
+        overflow = False
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = _EVENT.unpack_from(data, offset)
+                offset += _EVENT.size + length
+                if mask & IN_Q_OVERFLOW:
+                    overflow = True
+                    continue
+                path = self._paths.get(wd)
+                if path is not None:
+                    dirty.add(path)
+                if mask & IN_IGNORED:
+                    # 目录已删除，监视随之失效
+                    self._paths.pop(wd, None)
+                    if path is not None and self._wds.get(path) == wd:
+                        del self._wds[path]
+        return None if overflow else dirty
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
 
 class SnapshotManager:
     """
     Alice 的快照索引管理器
     负责扫描核心文件并生成内存快照摘要，以节省上下文空间。
     """
-    def __init__(self, core_paths=None):
+    def __init__(self, core_paths=None, use_inotify=False, cache_path=None):
         self.core_paths = core_paths or [
             "prompts/alice.md",
             "skills"
@@ -15,6 +98,22 @@ class SnapshotManager:
         self.snapshots = {}
         self.skills = {} # 技能注册表
         self.skill_content_cache = {} # 技能文件内容缓存 {path: {"content": str, "mtime": float}}
+        self.version = 0 # 快照每变化一次加一，供上下文构建判断是否需要重建
+        self.events = [] # 最近一次刷新的变化事件
+        self._stats = {} # 路径 -> 生成摘要时的 (mtime_ns, size)
+        self._children = {} # 核心目录 -> [技能目录, ...]
+        self._index_texts = {} # include_skills -> 索引文本缓存
+        self._scanned = False
+        self._lock = threading.RLock() # 上下文刷新与 toolkit refresh 可能在不同线程中调用
+        self._watcher = None
+        self.cache_path = cache_path
+        self._registry_cache = self._load_cache() # SKILL.md 路径 -> 上次解析的记录
+        self._cache_dirty = False
+        if use_inotify:
+            try:
+                self._watcher = Inotify()
+            except (OSError, AttributeError) as e:
+                logger.info(f"inotify 不可用，按 mtime 检查快照: {e}")
         self.refresh()
 
     def _get_summary(self, path):
@@ -23,8 +122,9 @@ class SnapshotManager:
             return None
         
         try:
-            mtime = time.ctime(os.path.getmtime(path))
-            size = os.path.getsize(path)
+            st = os.stat(path) # 读取内容前 stat，写入缓存的 mtime 不会新于解析的内容
+            mtime = time.ctime(st.st_mtime)
+            size = st.st_size
             
             summary = f"[文件: {path}, 大小: {size} bytes, 修改时间: {mtime}]"
             
@@ -32,26 +132,12 @@ class SnapshotManager:
                 with open(path, 'r', encoding='utf-8', errors='ignore') as f:
                     content = f.read()
                 
-                # 针对 SKILL.md 提取 description 并注册技能
+                # 针对 SKILL.md 解析 front matter 并注册技能
                 if path.endswith("SKILL.md"):
-                    # 提取 YAML 块
-                    yaml_match = re.match(r'^---\n(.*?)\n---\n', content, re.DOTALL)
-                    yaml_content = yaml_match.group(1) if yaml_match else ""
-                    
-                    # 解析 description 用于快照
-                    desc_match = re.search(r'description:\s*(.*)', yaml_content) if yaml_content else re.search(r'description:\s*(.*)', content)
-                    desc = desc_match.group(1).strip() if desc_match else "无描述"
-                    
-                    summary += f" 功能: {desc}"
-                    
-                    # 注册到技能表 (使用目录名作为 key)
-                    skill_name = os.path.basename(os.path.dirname(path))
-                    self.skills[skill_name] = {
-                        "name": skill_name,
-                        "description": desc,
-                        "yaml": yaml_content,
-                        "path": path
-                    }
+                    record = self._parse_skill(content, st)
+                    self._registry_cache[path] = record
+                    self._cache_dirty = True
+                    summary += f" 功能: {self._register_skill(path, record)}"
                 else:
                     lines = content.splitlines()[:2]
                     first_content = " | ".join([l.strip() for l in lines if l.strip()])
@@ -65,35 +151,224 @@ class SnapshotManager:
         except Exception as e:
             return f"[路径: {path}, 状态: 无法读取 ({str(e)})]"
 
-    def refresh(self):
-        """刷新所有快照和技能注册表"""
+    @staticmethod
+    def _parse_skill(content, st):
+        """解析 SKILL.md 的 front matter，返回可写入注册表缓存的记录"""
+        metadata, yaml_content = parse_front_matter(content)
+        desc = metadata.get("description")
+        if desc is None and not yaml_content:
+            # 没有 front matter 时沿用正文中的 description: 行
+            desc_match = re.search(r'description:\s*(.*)', content)
+            desc = desc_match.group(1) if desc_match else None
+        desc = " ".join(str(desc).split()) if desc is not None else ""
+        return {
+            "mtime_ns": st.st_mtime_ns,
+            "size": st.st_size,
+            "name": str(metadata.get("name") or ""),
+            "description": desc or "无描述",
+            "yaml": yaml_content,
+            "metadata": metadata
+        }
+
+    def _register_skill(self, path, record):
+        """注册到技能表 (使用目录名作为 key)，返回用于快照的描述"""
+        skill_name = os.path.basename(os.path.dirname(path))
+        self.skills[skill_name] = {
+            "name": skill_name,
+            "description": record["description"],
+            "yaml": record["yaml"],
+            "metadata": record["metadata"],
+            "path": path
+        }
+        return record["description"]
+
+    def _cached_summary(self, path, key):
+        """注册表缓存中 (mtime, size) 与磁盘一致时，不读文件直接由缓存记录生成摘要"""
+        record = self._registry_cache.get(path)
+        if not record or (record.get("mtime_ns"), record.get("size")) != key:
+            return None
+        mtime = time.ctime(key[0] / 1e9)
+        desc = self._register_skill(path, record)
+        return f"[文件: {path}, 大小: {key[1]} bytes, 修改时间: {mtime}] 功能: {desc}"
+
+    # ------------------------------------------------------------------
+    # 注册表磁盘缓存
+    # ------------------------------------------------------------------
+    def _load_cache(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return {}
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"技能注册表缓存无法读取，将重新解析: {e}")
+            return {}
+        if not isinstance(data, dict) or data.get("version") != REGISTRY_CACHE_VERSION:
+            logger.info("技能注册表缓存版本不匹配，将重新解析")
+            return {}
+        skills = data.get("skills")
+        return skills if isinstance(skills, dict) else {}
+
+    def _save_cache(self):
+        """只保留当前仍存在的 SKILL.md 记录，先写临时文件再原子替换"""
+        live = {p: r for p, r in self._registry_cache.items() if p in self.snapshots}
+        if not self._cache_dirty and len(live) == len(self._registry_cache):
+            return
+        self._registry_cache = live
+        self._cache_dirty = False
+        if not self.cache_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+            tmp = f"{self.cache_path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"version": REGISTRY_CACHE_VERSION, "skills": live}, f, ensure_ascii=False)
+            os.replace(tmp, self.cache_path)
+        except OSError as e:
+            logger.warning(f"技能注册表缓存写入失败: {e}")
+
+    def _stat_key(self, path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _check(self, directory, dirty):
+        """dirty 为 None 时表示没有 inotify 信息，需要逐个 stat"""
+        return dirty is None or directory in dirty
+
+    def _summary(self, path, key, new_snapshots):
+        """状态 (mtime, size) 未变时复用上次的摘要，否则重新生成 (SKILL.md 同时重新注册技能)"""
+        if key is None:
+            return
+        if self._stats.get(path) == key and path in self.snapshots:
+            new_snapshots[path] = self.snapshots[path]
+            return
+        self._stats[path] = key
+        summary = self._cached_summary(path, key) if path.endswith("SKILL.md") else None
+        new_snapshots[path] = summary or self._get_summary(path)
+
+    def _list_skill_dirs(self, root):
+        dirs = []
+        for item in sorted(os.listdir(root)):
+            item_path = os.path.join(root, item)
+            if os.path.isdir(item_path):
+                dirs.append(item_path)
+        return dirs
+
+    def refresh(self, full=False):
+        """
+        增量刷新快照与技能注册表，返回本次的变化事件 [("added" | "changed" | "removed", 路径), ...]
+        - 目录的 mtime 未变时不重新 listdir (技能目录的增删会改变其 mtime)
+        - 只有 mtime/size 变化的 SKILL.md 才重新读取解析
+        - 启用 inotify 时只检查收到事件的目录，没有事件时不产生任何文件系统调用
+        - 启动时 SKILL.md 的 mtime/size 与磁盘缓存 (cache_path) 一致则直接使用缓存的解析结果
+        full=True 时丢弃全部缓存重新扫描。
+        """
+        with self._lock:
+            return self._refresh(full)
+
+    def _refresh(self, full):
+        if full:
+            self._stats.clear()
+            self._children.clear()
+            self._registry_cache.clear()
+            self._cache_dirty = True
+        dirty = None
+        if self._watcher and self._scanned and not full:
+            dirty = self._watcher.poll()
+            if dirty is not None and not dirty:
+                self.events = []
+                return []
+
         new_snapshots = {}
-        self.skills = {} # 重置注册表
         for path in self.core_paths:
-            if os.path.isfile(path):
-                new_snapshots[path] = self._get_summary(path)
-            elif os.path.isdir(path):
-                # 记录目录快照，并深入一层记录关键技能
-                new_snapshots[path] = self._get_summary(path)
-                if os.path.exists(path):
-                    for item in sorted(os.listdir(path)):
-                        item_path = os.path.join(path, item)
-                        if os.path.isdir(item_path):
-                            skill_md = os.path.join(item_path, "SKILL.md")
-                            if os.path.exists(skill_md):
-                                new_snapshots[skill_md] = self._get_summary(skill_md)
+            if os.path.isdir(path):
+                if self._check(path, dirty) or path not in self._children:
+                    self._watch(path)
+                    key = self._stat_key(path)
+                    # 目录 mtime 变化说明有技能目录增删，才需要重新列目录
+                    if self._stats.get(path) != key or path not in self._children:
+                        self._children[path] = self._list_skill_dirs(path)
+                    self._summary(path, key, new_snapshots)
+                elif path in self.snapshots:
+                    new_snapshots[path] = self.snapshots[path]
+                for skill_dir in self._children[path]:
+                    skill_md = os.path.join(skill_dir, "SKILL.md")
+                    if self._check(skill_dir, dirty) or not self._watching(skill_dir):
+                        self._watch(skill_dir) # 先加监视再 stat，避免漏掉两者之间的写入
+                        self._summary(skill_md, self._stat_key(skill_md), new_snapshots)
+                    elif skill_md in self.snapshots:
+                        new_snapshots[skill_md] = self.snapshots[skill_md]
+            else:
+                parent = os.path.dirname(path) or "."
+                if self._check(parent, dirty) or not self._watching(parent):
+                    self._watch(parent)
+                    self._summary(path, self._stat_key(path), new_snapshots)
+                elif path in self.snapshots:
+                    new_snapshots[path] = self.snapshots[path]
+        self._scanned = True
+
+        # 与上次的快照比较，生成变化事件
+        events = [("removed", p) for p in self.snapshots if p not in new_snapshots]
+        for p, summary in new_snapshots.items():
+            if p not in self.snapshots:
+                events.append(("added", p))
+            elif self.snapshots[p] != summary:
+                events.append(("changed", p))
+        for p in [p for p in self._stats if p not in new_snapshots]:
+            del self._stats[p]
+        # 移除已删除的技能
+        live = {os.path.basename(os.path.dirname(p)) for p in new_snapshots if p.endswith("SKILL.md")}
+        for name in [n for n in self.skills if n not in live]:
+            del self.skills[name]
+
         self.snapshots = new_snapshots
+        self.events = events
+        self._save_cache()
+        if events:
+            self.version += 1
+            self._index_texts.clear()
+            logger.info("快照变化: " + ", ".join(f"{kind} {p}" for kind, p in events[:20]) + (" ..." if len(events) > 20 else ""))
+        return events
 
-    def get_index_text(self):
-        """生成注入上下文的索引文本"""
+    def _watch(self, directory):
+        if not self._watcher:
+            return
+        try:
+            if not self._watcher.is_watching(directory):
+                self._watcher.watch(directory)
+        except OSError as e:
+            # 如达到 max_user_watches 上限：退回到按 mtime 检查
+            logger.warning(f"inotify 监视 {directory} 失败，改为按 mtime 检查: {e}")
+            self._watcher.close()
+            self._watcher = None
+
+    def _watching(self, directory):
+        return self._watcher is not None and self._watcher.is_watching(directory)
+
+    def get_index_text(self, include_skills=True):
+        """
+        生成注入上下文的索引文本 (快照未变化时直接返回缓存)
+        include_skills=False 时不逐条列出 SKILL.md，只给出技能总数 (相关技能按当前输入另行注入)
+        """
+        cached = self._index_texts.get(include_skills)
+        if cached is not None:
+            return cached
         if not self.snapshots:
             return "暂无快照数据。"
 
         lines = ["你目前拥有以下文件/目录的最新内存快照摘要："]
         for path, summary in self.snapshots.items():
-            lines.append(f"- {summary}")
+            if include_skills or not path.endswith("SKILL.md"):
+                lines.append(f"- {summary}")
+        if not include_skills:
+            lines.append(f"- [技能库: 共 {len(self.skills)} 个技能，每轮只列出与当前输入相关的技能；可用 `toolkit search <关键词>` 检索，`toolkit list` 列出全部]")
         lines.append("\n**提示**：如果你需要获取上述文件的详细内容（例如具体的任务进度、过往记忆或技能用法），请直接调用相应的工具（如 `cat` 或 `file_explorer`）读取全文。快照仅供快速定位参考。")
-        return "\n".join(lines)
+        text = "\n".join(lines)
+        self._index_texts[include_skills] = text
+        return text
 
     def read_skill_file(self, relative_path):
         """
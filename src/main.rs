@@ -25,11 +25,37 @@ use std::{
 #[derive(Debug, Deserialize, Serialize)]
 #[serde(tag = "type", rename_all = "lowercase")]
 enum BridgeMessage {
-    Status { content: String },
+    Status {
+        content: String,
+        /// 中断到空闲的耗时 (仅在中断后的 done 消息中出现)
+        #[serde(default)]
+        interrupt_latency_ms: Option<u64>,
+        /// 后台启动任务名称与进度 (仅 background 状态消息携带)
+        #[serde(default)]
+        task: Option<String>,
+        #[serde(default)]
+        detail: Option<String>,
+    },
     Thinking { content: String },
     Content { content: String },
-    Tokens { total: usize, prompt: usize, completion: usize },
+    Tokens {
+        total: usize,
+        prompt: usize,
+        completion: usize,
+        /// 命中服务端前缀缓存的提示词 token 数 (服务端不返回时为 0)
+        #[serde(default)]
+        cached: usize,
+    },
+    /// 本次请求各上下文组件的本地 token 统计 (按从大到小排序)
+    #[serde(rename = "tokens_breakdown")]
+    TokensBreakdown {
+        total: usize,
+        components: Vec<(String, usize)>,
+    },
     Error { content: String },
+    /// 工具执行过程中的实时输出 (逐行推送)
+    #[serde(rename = "tool_output")]
+    ToolOutput { content: String },
 }
 
 /// 消息作者
@@ -72,6 +98,13 @@ struct App {
     total_tokens: usize,
     prompt_tokens: usize,
     completion_tokens: usize,
+    cached_tokens: usize,
+    // 最近一次请求的上下文分项 (组件, token 数)
+    token_breakdown: Vec<(String, usize)>,
+    // 最近一次中断的响应耗时 (毫秒)
+    last_interrupt_ms: Option<u64>,
+    // 后台启动任务进度 (任务名, 进度描述)
+    background_tasks: Vec<(String, String)>,
     list_state: ListState,
     // 区域记录，用于鼠标碰撞检测
     chat_area: Rect,
@@ -103,6 +136,10 @@ impl App {
             total_tokens: 0,
             prompt_tokens: 0,
             completion_tokens: 0,
+            cached_tokens: 0,
+            token_breakdown: Vec::new(),
+            last_interrupt_ms: None,
+            background_tasks: Vec::new(),
             list_state: ListState::default(),
             chat_area: Rect::default(),
             sidebar_area: Rect::default(),
@@ -220,7 +257,7 @@ fn main() -> Result<(), Box<dyn Error>> {
         // 处理来自后端的通信消息
         while let Ok(msg) = rx.try_recv() {
             match msg {
-                BridgeMessage::Status { content } => match content.as_str() {
+                BridgeMessage::Status { content, interrupt_latency_ms, task, detail } => match content.as_str() {
                     "ready" => {
                         app.status = AgentStatus::Idle;
                         if let Some(msg) = app.messages.last_mut() {
@@ -229,10 +266,21 @@ fn main() -> Result<(), Box<dyn Error>> {
                             }
                         }
                     }
+                    "background" => {
+                        let task = task.unwrap_or_default();
+                        let detail = detail.unwrap_or_default();
+                        app.background_tasks.retain(|(name, _)| name != &task);
+                        if !detail.is_empty() {
+                            app.background_tasks.push((task, detail));
+                        }
+                    }
                     "thinking" => app.status = AgentStatus::Thinking,
                     "executing_tool" => app.status = AgentStatus::ExecutingTool,
                     "done" => {
                         app.status = AgentStatus::Idle;
+                        if interrupt_latency_ms.is_some() {
+                            app.last_interrupt_ms = interrupt_latency_ms;
+                        }
                         if let Some(msg) = app.messages.last_mut() {
                             msg.is_complete = true;
                         }
@@ -255,10 +303,22 @@ fn main() -> Result<(), Box<dyn Error>> {
                         }
                     }
                 }
-                BridgeMessage::Tokens { total, prompt, completion } => {
+                BridgeMessage::Tokens { total, prompt, completion, cached } => {
                     app.total_tokens = total;
                     app.prompt_tokens = prompt;
                     app.completion_tokens = completion;
+                    app.cached_tokens = cached;
+                }
+                BridgeMessage::TokensBreakdown { components, .. } => {
+                    app.token_breakdown = components;
+                }
+                BridgeMessage::ToolOutput { content } => {
+                    app.status = AgentStatus::ExecutingTool;
+                    if let Some(msg) = app.messages.last_mut() {
+                        if msg.author == Author::Assistant {
+                            msg.thinking.push_str(&content);
+                        }
+                    }
                 }
                 BridgeMessage::Error { content } => {
                     app.messages.push(Message {
@@ -419,11 +479,28 @@ fn ui(f: &mut Frame, app: &mut App) {
 
     let thinking_hint = if app.show_thinking { "显示思考过程 (Ctrl+O 隐藏)" } else { "隐藏思考过程 (Ctrl+O 显示)" };
     
-    let token_info = if app.total_tokens > 0 {
-        format!(" | Tokens: {} (P:{} C:{})", app.total_tokens, app.prompt_tokens, app.completion_tokens)
+    let mut token_info = if app.total_tokens > 0 {
+        let mut info = format!(" | Tokens: {} (P:{} C:{})", app.total_tokens, app.prompt_tokens, app.completion_tokens);
+        if app.cached_tokens > 0 {
+            info.push_str(&format!(" 缓存命中: {}", app.cached_tokens));
+        }
+        info
     } else {
         "".to_string()
     };
+    if !app.token_breakdown.is_empty() {
+        // 只显示占比最大的三项
+        let top: Vec<String> = app.token_breakdown.iter().take(3)
+            .map(|(name, n)| format!("{} {}", name, n))
+            .collect();
+        token_info.push_str(&format!(" | 上下文: {}", top.join(" ")));
+    }
+    if let Some(ms) = app.last_interrupt_ms {
+        token_info.push_str(&format!(" | 中断耗时: {}ms", ms));
+    }
+    for (_, detail) in &app.background_tasks {
+        token_info.push_str(&format!(" | 后台: {}", detail));
+    }
 
     let header_line = Line::from(vec![
         Span::styled(" ALICE ASSISTANT ", Style::default().fg(Color::Cyan).add_modifier(Modifier::BOLD)),
@@ -0,0 +1,167 @@
+import re
+import logging
+
+logger = logging.getLogger("StreamManager")
+
+
+class StreamManager:
+    """流式数据管理器，使用缓冲区预判代码块状态，确保 UI 分流精确"""
+    def __init__(self, max_buffer_size=10*1024*1024, window_size=20, on_code_block=None):  # 10MB 默认限制
+        self.buffer = ""
+        self.in_code_block = False
+        self.current_end_tag = "```"
+        self.current_start_tag_len = 3
+        self.max_buffer_size = max_buffer_size
+        self.window_size = window_size # 滑动预判窗口大小
+        # 可执行代码块 (```python / ```bash) 闭合时的回调，参数为完整的代码块文本
+        self.on_code_block = on_code_block
+        self.block_text = ""
+
+    def process_chunk(self, chunk_text):
+        """处理新到达的文本块"""
+        self.buffer += chunk_text
+
+        # P0 修复: 防止缓冲区无限增长导致 OOM
+        if len(self.buffer) > self.max_buffer_size:
+            logger.warning(f"StreamManager 缓冲区超限 ({len(self.buffer)} > {self.max_buffer_size})，强制冲刷")
+            output = self._try_dispatch(is_final=True)
+            self.buffer = ""  # 清空缓冲区
+            self.in_code_block = False  # 重置状态
+            return output
+
+        return self._try_dispatch()
+
+    def _try_dispatch(self, is_final=False):
+        """尝试分发数据。如果非最后一次，则保留窗口余量以供预判"""
+        output_msgs = []
+        just_entered_code_block = False
+        
+        while True:
+            if not self.buffer:
+                break
+
+            if not self.in_code_block:
+                # 兼容多种标记形式，增加 tool_call, python, cat 等识别判断
+                markers = [
+                    ("```python", "```"),
+                    ("```bash", "```"),
+                    ("```", "```"),
+                    ("<thought>", "</thought>"),
+                    ("<reasoning>", "</reasoning>"),
+                    ("<thinking>", "</thinking>"),
+                    ("<tool_call>", "</tool_call>"),
+                    ("<python>", "</python>"),
+                ]
+                
+                # 裸关键词识别 (通常出现在行首或空白后)
+                naked_keywords = ["python ", "cat ", "ls ", "grep ", "mkdir "]
+                
+                found_marker = None
+                start_idx = -1
+                
+                # 1. 优先匹配显式标记
+                for start_tag, end_tag in markers:
+                    idx = self.buffer.find(start_tag)
+                    if idx != -1 and (start_idx == -1 or idx < start_idx):
+                        start_idx = idx
+                        found_marker = (start_tag, end_tag)
+                
+                # 2. 匹配裸关键词 (防止代码直接出现在正文)
+                for kw in naked_keywords:
+                    # 使用正则检测行首或特定位置的关键词
+                    kw_match = re.search(r'(?:^|\n)' + re.escape(kw), self.buffer)
+                    if kw_match:
+                        idx = kw_match.start()
+                        if start_idx == -1 or idx < start_idx:
+                            start_idx = idx
+                            # 对于裸关键词，我们假设它会持续到下一个双换行或 buffer 结束，或者被包裹在虚拟思考区
+                            found_marker = (kw_match.group(), "\n\n") 
+
+                if start_idx == -1:
+                    if not is_final:
+                        # 智能前缀保留 (滑动延迟检测)
+                        # 保留 window_size 长度，或者保留标记的前缀
+                        hold_back = self.window_size
+                        for start_tag, _ in markers:
+                            for i in range(len(start_tag)-1, 0, -1):
+                                if self.buffer.endswith(start_tag[:i]):
+                                    hold_back = max(hold_back, i)
+                                    break
+                        
+                        # 额外检查 naked_keywords 的前缀
+                        for kw in naked_keywords:
+                            for i in range(len(kw)-1, 0, -1):
+                                if self.buffer.endswith(kw[:i]):
+                                    hold_back = max(hold_back, i)
+                                    break
+
+                        safe_len = len(self.buffer) - hold_back
+                        if safe_len > 0:
+                            output_msgs.append({"type": "content", "content": self.buffer[:safe_len]})
+                            self.buffer = self.buffer[safe_len:]
+                        break
+                    else:
+                        output_msgs.append({"type": "content", "content": self.buffer})
+                        self.buffer = ""
+                        break
+                else:
+                    # 发现起始标记，处理之前的正文
+                    if start_idx > 0:
+                        output_msgs.append({"type": "content", "content": self.buffer[:start_idx]})
+                    
+                    self.in_code_block = True
+                    self.current_end_tag = found_marker[1]
+                    self.current_start_tag_len = len(found_marker[0])
+                    self.block_text = ""
+                    just_entered_code_block = True
+                    self.buffer = self.buffer[start_idx:]
+            else:
+                # 已经在隔离块中，寻找结束标记
+                search_offset = self.current_start_tag_len if just_entered_code_block else 0
+                end_idx = self.buffer.find(self.current_end_tag, search_offset)
+
+                # P0 修复: 仅在找到结束标签或输出内容后才重置标志
+                if end_idx == -1:
+                    if not is_final:
+                        # 同样需要保留结束标签的前缀
+                        hold_back = 0
+                        for i in range(len(self.current_end_tag)-1, 0, -1):
+                            if self.buffer.endswith(self.current_end_tag[:i]):
+                                hold_back = i
+                                break
+                        
+                        safe_len = len(self.buffer) - hold_back
+                        if safe_len > 0:
+                            output_msgs.append({"type": "thinking", "content": self.buffer[:safe_len]})
+                            self.block_text += self.buffer[:safe_len]
+                            self.buffer = self.buffer[safe_len:]
+                        break
+                    else:
+                        output_msgs.append({"type": "thinking", "content": self.buffer})
+                        self.buffer = ""
+                        break
+                else:
+                    # 发现结束标记，闭合思考块
+                    thinking_end = end_idx + len(self.current_end_tag)
+                    output_msgs.append({"type": "thinking", "content": self.buffer[:thinking_end]})
+                    self.block_text += self.buffer[:thinking_end]
+                    self.buffer = self.buffer[thinking_end:]
+                    self.in_code_block = False
+                    just_entered_code_block = False  # 找到结束标签后重置
+                    self._notify_code_block()
+        
+        return output_msgs
+
+    def _notify_code_block(self):
+        """可执行代码块已完整闭合，通知调用方 (用于流式期间提前派发执行)"""
+        block_text, self.block_text = self.block_text, ""
+        # 按块文本前缀判断：流式分片时起始标记可能先以通用 ``` 形式被识别
+        if self.on_code_block and block_text.startswith(("```python", "```bash")):
+            try:
+                self.on_code_block(block_text)
+            except Exception as e:
+                logger.error(f"代码块闭合回调异常: {e}")
+
+    def flush(self):
+        """强制冲刷所有剩余数据"""
+        return self._try_dispatch(is_final=True)
@@ -0,0 +1,76 @@
+"""
+容器内执行守护进程 sandbox/alice_execd.py 的测试 (直接在本机运行，代替容器)
+
+用法 (在项目根目录执行):
+    python -m pytest -q tests
+"""
+import os
+import sys
+import json
+import time
+import queue
+import signal
+import threading
+import subprocess
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sandbox.alice_execd import PUMP_JOIN_TIMEOUT
+
+
+class ExecDaemonTest(unittest.TestCase):
+    def setUp(self):
+        self.proc = subprocess.Popen(
+            [sys.executable, "-u", os.path.join(ROOT, "sandbox", "alice_execd.py")],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, bufsize=1
+        )
+        self.events = queue.Queue()
+        threading.Thread(target=self._read_loop, daemon=True).start()
+
+    def tearDown(self):
+        self.proc.stdin.close()
+        self.proc.wait(10)
+        self.proc.stdout.close()
+
+    def _read_loop(self):
+        for line in self.proc.stdout:
+            self.events.put(json.loads(line))
+
+    def exec(self, req_id, code, timeout=30):
+        self.proc.stdin.write(json.dumps({"id": req_id, "op": "exec", "lang": "bash", "code": code, "timeout": timeout}) + "\n")
+        self.proc.stdin.flush()
+
+    def wait_exit(self, req_id, limit):
+        output = []
+        deadline = time.monotonic() + limit
+        while True:
+            msg = self.events.get(timeout=max(0, deadline - time.monotonic()))
+            if msg.get("id") != req_id:
+                continue
+            if msg["event"] == "exit":
+                return msg, "".join(output)
+            output.append(msg["data"])
+
+    def test_output_and_exit_code(self):
+        self.exec("r1", "echo out; echo err >&2; exit 3")
+        msg, output = self.wait_exit("r1", 10)
+        self.assertEqual(msg["code"], 3)
+        self.assertFalse(msg["timed_out"])
+        self.assertIn("out\n", output)
+        self.assertIn("err\n", output)
+
+    def test_background_child_holding_pipes_does_not_block_exit(self):
+        # 后台子进程继承了 stdout/stderr：命令本身立即退出，exit 事件不应等到子进程结束
+        self.exec("r1", "sleep 30 & echo $!")
+        started = time.monotonic()
+        msg, output = self.wait_exit("r1", PUMP_JOIN_TIMEOUT + 5)
+        os.kill(int(output.strip()), signal.SIGKILL)
+        self.assertEqual(msg["code"], 0)
+        self.assertFalse(msg["timed_out"])
+        self.assertLess(time.monotonic() - started, PUMP_JOIN_TIMEOUT + 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+"""
+只读工具命令结果缓存的测试
+
+用法 (在项目根目录执行):
+    python -m pytest -q tests
+"""
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from command_cache import CommandCache
+
+
+class CommandCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix="alice-command-cache-")
+        self.skills = os.path.join(self.root, "skills")
+        self.output = os.path.join(self.root, "alice_output")
+        os.makedirs(os.path.join(self.skills, "demo"))
+        os.makedirs(self.output)
+        self.write("skills/demo/SKILL.md", "# demo\n")
+        self.cache = CommandCache({"skills": self.skills, "alice_output": self.output}, max_bytes=1000)
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def write(self, rel, text, mtime_ns=None):
+        path = os.path.join(self.root, rel)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        if mtime_ns is not None:
+            os.utime(path, ns=(mtime_ns, mtime_ns))
+        return path
+
+    def test_hit_until_file_changes(self):
+        key = self.cache.key_for("cat skills/demo/SKILL.md")
+        self.assertIsNotNone(key)
+        self.cache.put(key, "# demo\n")
+        self.assertEqual(self.cache.get(self.cache.key_for("cat skills/demo/SKILL.md")), "# demo\n")
+        # 内容长度不变、仅 mtime 变化同样失效
+        self.write("skills/demo/SKILL.md", "# DEMO\n", mtime_ns=1_000_000_000)
+        self.assertNotEqual(self.cache.key_for("cat skills/demo/SKILL.md"), key)
+        self.assertIsNone(self.cache.get(self.cache.key_for("cat skills/demo/SKILL.md")))
+
+    def test_container_path_maps_to_mount(self):
+        self.assertEqual(self.cache.key_for("cat /app/skills/demo/SKILL.md")[1][0][1],
+                         self.cache.key_for("cat skills/demo/SKILL.md")[1][0][1])
+
+    def test_directory_listing_changes_with_new_file(self):
+        key = self.cache.key_for("ls -la skills/demo")
+        self.write("skills/demo/run.py", "print(1)\n")
+        self.assertNotEqual(self.cache.key_for("ls -la skills/demo"), key)
+
+    def test_working_directory_scope_follows_write_epoch(self):
+        key = self.cache.key_for("ls")
+        self.assertEqual(self.cache.key_for("ls /app"), (("ls", "/app"), key[1]))
+        self.cache.bump()
+        self.assertNotEqual(self.cache.key_for("ls"), key)
+        # 后台任务运行期间不缓存作用于整个工作目录的命令
+        self.assertIsNone(self.cache.key_for("ls", allow_container_scope=False))
+        self.assertIsNotNone(self.cache.key_for("ls skills", allow_container_scope=False))
+
+    def test_uncacheable_commands(self):
+        for command in [
+            "cat skills/demo/SKILL.md | head",
+            "cat skills/demo/SKILL.md > copy.md",
+            "ls $HOME",
+            "cat skills/*/SKILL.md",
+            "tail -f alice_output/run.log",
+            "cat",
+            "rm skills/demo/SKILL.md",
+            "python3 skills/demo/run.py",
+            "cat /etc/passwd",
+            "cat skills/../../etc/passwd",
+            "head -n",
+        ]:
+            with self.subTest(command=command):
+                self.assertIsNone(self.cache.key_for(command))
+
+    def test_symlink_is_not_cached(self):
+        os.symlink("/etc/hostname", os.path.join(self.skills, "demo", "link"))
+        self.assertIsNone(self.cache.key_for("cat skills/demo/link"))
+        self.assertIsNone(self.cache.key_for("ls skills"))
+
+    def test_lru_eviction_by_bytes(self):
+        cache = CommandCache({"skills": self.skills, "alice_output": self.output}, max_bytes=1000, max_entry_bytes=850)
+        keys = [cache.key_for(f"cat alice_output/f{i}.txt") for i in range(4)]
+        for key in keys[:3]:
+            cache.put(key, "x" * 100)
+        cache.get(keys[0]) # 最近使用，不被淘汰
+        cache.put(keys[3], "y" * 850)
+        self.assertEqual(cache.stats()["bytes"], 950)
+        self.assertIsNotNone(cache.get(keys[0]))
+        self.assertIsNone(cache.get(keys[1]))
+        self.assertIsNone(cache.get(keys[2]))
+
+    def test_oversized_entry_is_not_cached(self):
+        # 单条超过 max_entry_bytes (默认 max_bytes / 8) 的输出不缓存
+        key = self.cache.key_for("cat alice_output/big.txt")
+        self.cache.put(key, "z" * 200)
+        self.assertIsNone(self.cache.get(key))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,232 @@
+"""
+Docker Engine API 客户端的测试 (以 Unix Socket 上的假守护进程代替 dockerd)
+
+用法 (在项目根目录执行):
+    python -m pytest -q tests
+"""
+import os
+import sys
+import json
+import time
+import socket
+import shutil
+import struct
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from docker_api import DockerAPI, DockerAPIError
+
+
+def frame(stream_type, data):
+    return struct.pack(">BxxxL", stream_type, len(data)) + data
+
+
+def http_response(status, body=b"", reason="OK", extra_headers=""):
+    head = f"HTTP/1.1 {status} {reason}\r\nContent-Length: {len(body)}\r\n{extra_headers}\r\n"
+    return head.encode("ascii") + body
+
+
+class FakeDockerd:
+    """
+    在临时目录的 Unix Socket 上监听，每条连接按顺序读取请求并交给 handler(method, path, body) 处理
+    handler 返回要写回的字节串 (None 表示直接关闭连接)；返回 (字节串, True) 时写回后关闭连接
+    """
+    def __init__(self, handler):
+        self.handler = handler
+        self.dir = tempfile.mkdtemp(prefix="alice-fake-dockerd-")
+        self.path = os.path.join(self.dir, "docker.sock")
+        self.requests = []
+        self.connections = 0
+        self.closed = threading.Semaphore(0) # 服务端每关闭一条连接释放一次
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(self.path)
+        self.server.listen(8)
+        self._thread = threading.Thread(target=self._accept_loop, daemon=True)
+        self._thread.start()
+
+    def _accept_loop(self):
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                return
+            self.connections += 1
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    @staticmethod
+    def _read_request(rfile):
+        line = rfile.readline()
+        if not line:
+            return None
+        method, path, _ = line.decode("ascii").split(" ", 2)
+        length = 0
+        while True:
+            header = rfile.readline().decode("ascii").strip()
+            if not header:
+                break
+            name, _, value = header.partition(":")
+            if name.lower() == "content-length":
+                length = int(value)
+        body = rfile.read(length) if length else b""
+        return method, path, body
+
+    def _serve(self, conn):
+        rfile = conn.makefile("rb")
+        try:
+            while True:
+                request = self._read_request(rfile)
+                if request is None:
+                    return
+                self.requests.append(request[:2])
+                reply = self.handler(*request)
+                close_after = False
+                if isinstance(reply, tuple):
+                    reply, close_after = reply
+                if reply is None:
+                    return
+                for chunk in reply if isinstance(reply, list) else [reply]:
+                    conn.sendall(chunk)
+                if close_after:
+                    return
+        except OSError:
+            return
+        finally:
+            rfile.close()
+            conn.close()
+            self.closed.release()
+
+    def close(self):
+        self.server.close()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+
+class DockerAPITestCase(unittest.TestCase):
+    def serve(self, handler, timeout=5):
+        fake = FakeDockerd(handler)
+        self.addCleanup(fake.close)
+        api = DockerAPI(fake.path, timeout=timeout)
+        self.addCleanup(api.close)
+        return fake, api
+
+
+class ExecStreamTest(DockerAPITestCase):
+    def start_exec(self, chunks):
+        """exec_start 返回的流由 chunks 依次写出 (用于模拟帧被拆分到多次写入)"""
+        head = b"HTTP/1.1 200 OK\r\nContent-Type: application/vnd.docker.raw-stream\r\n\r\n"
+        _, api = self.serve(lambda method, path, body: ([head] + chunks, True))
+        return api.exec_start("abc")
+
+    def test_demux_stdout_and_stderr(self):
+        stream = self.start_exec([frame(1, b"hello\n"), frame(2, b"oops\n"), frame(1, b"world\n")])
+        self.assertEqual(list(stream.frames()), [("stdout", b"hello\n"), ("stderr", b"oops\n"), ("stdout", b"world\n")])
+
+    def test_frames_split_across_writes(self):
+        data = frame(1, "中文输出".encode("utf-8")) + frame(2, b"err")
+        chunks = [data[:3], data[3:9], data[9:10], data[10:]]
+        stream = self.start_exec(chunks)
+        self.assertEqual(list(stream.frames()), [("stdout", "中文输出".encode("utf-8")), ("stderr", b"err")])
+
+    def test_empty_and_unknown_frames_are_skipped(self):
+        stream = self.start_exec([frame(1, b""), frame(0, b"stdin?"), frame(3, b"sys"), frame(1, b"ok")])
+        self.assertEqual(list(stream.frames()), [("stdout", b""), ("stdout", b"ok")])
+
+    def test_truncated_frame_ends_stream(self):
+        stream = self.start_exec([frame(1, b"complete"), frame(1, b"truncated")[:-4]])
+        self.assertEqual(list(stream.frames()), [("stdout", b"complete")])
+
+    def test_close_interrupts_blocking_read(self):
+        # 不写任何帧也不关闭连接：读取会一直阻塞，直到 close() 从其他线程关闭连接
+        head = b"HTTP/1.1 200 OK\r\nContent-Type: application/vnd.docker.raw-stream\r\n\r\n"
+        _, api = self.serve(lambda method, path, body: [head])
+        stream = api.exec_start("abc")
+        result = []
+        reader = threading.Thread(target=lambda: result.extend(stream.frames()))
+        reader.start()
+        stream.close()
+        reader.join(5)
+        self.assertFalse(reader.is_alive())
+        self.assertEqual(result, [])
+
+    def test_exec_start_error_status(self):
+        _, api = self.serve(lambda method, path, body: http_response(404, b'{"message": "No such exec instance"}', "Not Found"))
+        with self.assertRaises(DockerAPIError) as ctx:
+            api.exec_start("missing")
+        self.assertEqual(ctx.exception.status, 404)
+
+
+class ControlRequestTest(DockerAPITestCase):
+    def test_ping_ok(self):
+        _, api = self.serve(lambda method, path, body: http_response(200, b"OK"))
+        self.assertTrue(api.ping())
+
+    def test_ping_remote_disconnected(self):
+        # 连接建立后不回应直接关闭 (http.client.RemoteDisconnected)
+        _, api = self.serve(lambda method, path, body: None)
+        self.assertFalse(api.ping())
+
+    def test_ping_bad_status_line(self):
+        _, api = self.serve(lambda method, path, body: (b"garbage\r\n\r\n", True))
+        self.assertFalse(api.ping())
+
+    def test_ping_missing_socket(self):
+        api = DockerAPI(os.path.join(tempfile.gettempdir(), "alice-no-such-docker.sock"), timeout=1)
+        self.assertFalse(api.ping())
+
+    def test_inspect_container_not_found_and_error(self):
+        replies = iter([
+            http_response(404, b'{"message": "No such container"}', "Not Found"),
+            http_response(500, b'{"message": "boom"}', "Internal Server Error"),
+        ])
+        _, api = self.serve(lambda method, path, body: next(replies))
+        self.assertIsNone(api.inspect_container("alice"))
+        with self.assertRaises(DockerAPIError) as ctx:
+            api.inspect_container("alice")
+        self.assertEqual(ctx.exception.status, 500)
+        self.assertIn("boom", str(ctx.exception))
+
+    def test_reconnects_after_server_closed_keepalive(self):
+        # 每条连接回应一次后即关闭；下一个请求发出前应发现连接已失效并改用新连接
+        body = json.dumps({"Id": "exec1"}).encode("utf-8")
+        fake, api = self.serve(lambda method, path, payload: (http_response(201, body, "Created"), True))
+        self.assertEqual(api.exec_create("alice", ["true"]), "exec1")
+        self.assertTrue(fake.closed.acquire(timeout=5))
+        self.assertEqual(api.exec_create("alice", ["true"]), "exec1")
+        self.assertEqual(fake.connections, 2)
+        self.assertEqual(fake.requests, [("POST", "/containers/alice/exec")] * 2)
+
+    def test_get_is_retried_when_reused_connection_drops(self):
+        # 第二个请求送达后连接被断开 (未回应)：GET 是幂等的，在新连接上重试一次
+        replies = iter([http_response(200, b"{}"), None, http_response(200, b'{"Id": "c"}')])
+        fake, api = self.serve(lambda method, path, body: next(replies))
+        self.assertEqual(api.inspect_container("alice"), {})
+        self.assertEqual(api.inspect_container("alice"), {"Id": "c"})
+        self.assertEqual(len(fake.requests), 3)
+
+    def test_post_is_not_retried_after_it_was_sent(self):
+        # 创建容器的请求已送达但连接被断开：重试可能重复创建，直接抛出
+        replies = iter([http_response(200, b"OK"), None])
+        fake, api = self.serve(lambda method, path, body: next(replies))
+        self.assertTrue(api.ping())
+        with self.assertRaises(ConnectionError):
+            api.create_container("alice", {"Image": "alice"})
+        self.assertEqual(fake.requests[-1], ("POST", "/containers/create?name=alice"))
+        self.assertEqual(len(fake.requests), 2)
+
+    def test_timeout_is_not_retried(self):
+        # 复用的连接上请求超时：对端可能仍在处理，不重试
+        def handler(method, path, body):
+            if path != "/_ping":
+                time.sleep(1)
+            return http_response(200, b"{}")
+        fake, api = self.serve(handler, timeout=0.3)
+        self.assertTrue(api.ping())
+        with self.assertRaises(TimeoutError):
+            api.inspect_container("alice")
+        self.assertEqual(len(fake.requests), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
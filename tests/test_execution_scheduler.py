@@ -0,0 +1,159 @@
+"""
+代码块调度器与流式提前派发器的测试
+
+用法 (在项目根目录执行):
+    python -m pytest -q tests
+"""
+import os
+import sys
+import time
+import threading
+import unittest
+from concurrent.futures import Future
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from execution_scheduler import ExecutionScheduler, SpeculativeDispatcher, extract_code_blocks
+
+
+def block(code, *flags, lang="bash"):
+    return {"lang": lang, "code": code, "flags": set(flags)}
+
+
+class Recorder:
+    """记录每个块的开始与结束；gates 中的块要等对应 Event 置位后才结束"""
+    def __init__(self, gates=None):
+        self.events = []
+        self.gates = gates or {}
+        self._lock = threading.Lock()
+
+    def __call__(self, b):
+        with self._lock:
+            self.events.append(("start", b["code"]))
+        gate = self.gates.get(b["code"])
+        if gate is not None and not gate.wait(5):
+            raise RuntimeError("gate timeout")
+        if b["code"] == "fail":
+            raise ValueError("boom")
+        with self._lock:
+            self.events.append(("end", b["code"]))
+        return f"ran {b['code']}"
+
+
+class ExecutionSchedulerTest(unittest.TestCase):
+    def scheduler(self, recorder, max_workers=4):
+        s = ExecutionScheduler(recorder, max_workers=max_workers)
+        self.addCleanup(s.shutdown)
+        return s
+
+    def test_serial_blocks_run_in_source_order(self):
+        rec = Recorder()
+        results = self.scheduler(rec).run_all([block(str(i)) for i in range(6)])
+        self.assertEqual(results, [f"ran {i}" for i in range(6)])
+        expected = []
+        for i in range(6):
+            expected += [("start", str(i)), ("end", str(i))]
+        self.assertEqual(rec.events, expected)
+
+    def test_parallel_blocks_overlap_and_barrier_waits_for_all(self):
+        both_started = threading.Barrier(2, timeout=5)
+        rec = Recorder()
+
+        def run(b):
+            if "p" in b["code"]:
+                both_started.wait() # 两个 parallel 块同时在执行才能通过
+            return rec(b)
+        s = self.scheduler(run)
+        results = s.run_all([block("first"), block("p1", "parallel"), block("p2", "parallel"), block("last")])
+        self.assertEqual(results, ["ran first", "ran p1", "ran p2", "ran last"])
+        self.assertEqual(rec.events[:2], [("start", "first"), ("end", "first")])
+        self.assertEqual(rec.events[-2:], [("start", "last"), ("end", "last")])
+
+    def test_serial_block_waits_for_slow_parallel_block(self):
+        gate = threading.Event()
+        rec = Recorder({"slow": gate})
+        s = self.scheduler(rec)
+        futures = [s.submit(block("slow", "parallel")), s.submit(block("fast", "parallel")), s.submit(block("after"))]
+        futures[1].result(5)
+        time.sleep(0.1)
+        self.assertNotIn(("start", "after"), rec.events)
+        gate.set()
+        self.assertEqual(futures[2].result(5), "ran after")
+        self.assertLess(rec.events.index(("end", "slow")), rec.events.index(("start", "after")))
+
+    def test_failure_is_reported_and_does_not_block_later_blocks(self):
+        s = self.scheduler(Recorder())
+        first, second = s.submit(block("fail")), s.submit(block("next"))
+        with self.assertRaises(ValueError):
+            first.result(5)
+        self.assertEqual(second.result(5), "ran next")
+
+    def test_cancel_pending_keeps_running_block(self):
+        gate = threading.Event()
+        rec = Recorder({"running": gate})
+        s = self.scheduler(rec)
+        running, queued = s.submit(block("running")), s.submit(block("queued"))
+        self.assertEqual(s.cancel_pending(), 1)
+        gate.set()
+        self.assertEqual(running.result(5), "ran running")
+        self.assertTrue(queued.cancelled())
+        self.assertNotIn(("start", "queued"), rec.events)
+
+
+class SpeculativeDispatcherTest(unittest.TestCase):
+    def setUp(self):
+        self.submitted = []
+
+    def submit(self, b):
+        future = Future()
+        self.submitted.append((b, future))
+        return future
+
+    def stream(self, dispatcher, text, step=7):
+        """按固定大小分片喂入正文，每个分片之后都触发一次闭合回调 (模拟围栏识别过于积极的情形)"""
+        for i in range(0, len(text), step):
+            dispatcher.feed(text[i:i + step])
+            dispatcher.dispatch_text("")
+
+    def test_blocks_are_dispatched_once_in_source_order(self):
+        text = "先看目录\n```bash\nls\n```\n再统计\n```python\nprint(1)\n```\n```bash parallel\ndf -h\n```\n"
+        d = SpeculativeDispatcher(self.submit)
+        self.stream(d, text)
+        self.assertEqual([b["code"] for b, _ in self.submitted], ["ls", "print(1)", "df -h"])
+        futures = d.reconcile(extract_code_blocks(text))
+        self.assertEqual(futures, [f for _, f in self.submitted])
+
+    def test_background_block_stops_speculation(self):
+        text = "```bash\nls\n```\n```bash background\nsleep 100\n```\n```bash\npwd\n```\n"
+        d = SpeculativeDispatcher(self.submit)
+        self.stream(d, text)
+        self.assertEqual([b["code"] for b, _ in self.submitted], ["ls"])
+        self.assertEqual(d.reconcile(extract_code_blocks(text))[1:], [None, None])
+
+    def test_reconcile_cancels_unstarted_and_reuses_started_blocks(self):
+        d = SpeculativeDispatcher(self.submit)
+        self.stream(d, "```bash\nls\n```\n```bash\nrm -rf build\n```\n```bash\nmake\n```\n")
+        self.assertEqual(len(self.submitted), 3)
+        # 第二个块已开始执行，第三个尚未开始；最终回复把「make」挪到了最前面
+        self.submitted[1][1].set_running_or_notify_cancel()
+        final = extract_code_blocks("```bash\nmake\n```\n```bash\nrm -rf build\n```\n```bash\nls\n```\n")
+        futures = d.reconcile(final)
+        self.assertIsNone(futures[0])
+        self.assertIs(futures[1], self.submitted[1][1]) # 已开始的块复用结果，绝不重复执行
+        self.assertIsNone(futures[2])
+        self.assertTrue(self.submitted[0][1].cancelled())
+        self.assertTrue(self.submitted[2][1].cancelled())
+
+    def test_diverging_prefix_stops_speculation(self):
+        d = SpeculativeDispatcher(self.submit)
+        d.feed("```bash\nls\n```\n")
+        d.dispatch_text("")
+        # 完整正文重新解析后，已派发的第一个块与之不一致：停止提前派发
+        d.text = "```bash\nls -la\n```\n```bash\npwd\n```\n"
+        d.dispatch_text("")
+        self.assertTrue(d.cancelled)
+        self.assertEqual(len(self.submitted), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
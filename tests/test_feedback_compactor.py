@@ -0,0 +1,77 @@
+"""
+工具反馈压缩管线的测试
+
+用法 (在项目根目录执行):
+    python -m pytest -q tests
+"""
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from feedback_compactor import FeedbackCompactor
+from token_counter import count_tokens
+
+
+class AllocateTest(unittest.TestCase):
+    def test_small_blocks_are_satisfied_first(self):
+        compactor = FeedbackCompactor(round_budget=1000, min_block_budget=100)
+        self.assertEqual(compactor._allocate([50, 5000, 80, 5000]), [50, 435, 80, 435])
+
+    def test_floor_never_exceeds_round_budget(self):
+        # 50 块 × 每块下限 200 远超整轮预算：各块之和仍不得超过预算
+        compactor = FeedbackCompactor(round_budget=8000, min_block_budget=200)
+        budgets = compactor._allocate([10000] * 50)
+        self.assertLessEqual(sum(budgets), 8000)
+        self.assertEqual(min(budgets), 160)
+
+    def test_floor_with_mixed_sizes(self):
+        compactor = FeedbackCompactor(round_budget=1000, min_block_budget=300)
+        budgets = compactor._allocate([10, 990, 5000, 5000])
+        self.assertLessEqual(sum(budgets), 1000)
+        self.assertEqual(budgets[0], 10)
+
+    def test_no_blocks(self):
+        self.assertEqual(FeedbackCompactor()._allocate([]), [])
+
+
+class CompactTest(unittest.TestCase):
+    def setUp(self):
+        self.spill_dir = tempfile.mkdtemp(prefix="alice-feedback-")
+        self.compactor = FeedbackCompactor(round_budget=400, min_block_budget=100, spill_dir=self.spill_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.spill_dir, ignore_errors=True)
+
+    def test_clean_strips_ansi_progress_and_repeats(self):
+        text = "\x1b[32mok\x1b[0m\n 10%|██        | 1/10\n 90%|█████████ | 9/10\nsame\nsame\nsame\nend\rdone"
+        self.assertEqual(self.compactor.clean(text), "ok\n 90%|█████████ | 9/10\nsame\n...[上一行重复 2 次]\ndone")
+
+    def test_small_output_is_untouched(self):
+        [(title, text, saved)] = self.compactor.compact([("echo", "hello\nworld")])
+        self.assertEqual((title, text, saved), ("echo", "hello\nworld", 0))
+        self.assertEqual(os.listdir(self.spill_dir), [])
+
+    def test_large_outputs_share_budget_and_spill_full_text(self):
+        outputs = [f"line {i} of block {b}" for b in range(3) for i in range(400)]
+        blocks = [(f"b{b}", "\n".join(outputs[b * 400:(b + 1) * 400])) for b in range(3)]
+        result = self.compactor.compact(blocks)
+        self.assertEqual([r[0] for r in result], ["b0", "b1", "b2"])
+        for (_, original), (_, text, saved) in zip(blocks, result):
+            self.assertTrue(text.startswith("line 0 of"))
+            self.assertTrue(text.endswith("line 399 of block " + original[-1]))
+            self.assertGreater(saved, 0)
+        spilled = sorted(os.listdir(self.spill_dir))
+        self.assertEqual(len(spilled), 3)
+        with open(os.path.join(self.spill_dir, spilled[0]), encoding="utf-8") as f:
+            self.assertIn(f.read(), [original for _, original in blocks])
+        # 各块正文 (不含落盘指针行) 合计不超过整轮预算
+        body = sum(count_tokens("\n".join(l for l in text.split("\n") if "已省略" not in l)) for _, text, _ in result)
+        self.assertLessEqual(body, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
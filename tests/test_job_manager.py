@@ -0,0 +1,75 @@
+"""
+后台任务管理器的测试 (以假的执行通道代替容器)
+
+用法 (在项目根目录执行):
+    python -m pytest -q tests
+"""
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# config 要求这两个变量存在；测试不会访问模型
+os.environ.setdefault("API_KEY", "test")
+os.environ.setdefault("MODEL_NAME", "test")
+
+from job_manager import JobManager
+from sandbox_executor import SandboxExecutor
+
+LINE = "x" * 99 + "\n"
+
+
+class FakeExecExecutor(SandboxExecutor):
+    """逐次 exec 通道被替换为直接产出 lines 行输出"""
+    def __init__(self, lines, **kwargs):
+        super().__init__("alice-test", use_daemon=False, **kwargs)
+        self.lines = lines
+
+    def _run_via_exec(self, command, is_python_code, timeout, capture, on_output):
+        for _ in range(self.lines):
+            self.emit_output(capture, on_output, "stdout", LINE)
+        return capture.result(0)
+
+
+class JobOutputTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix="alice-jobs-")
+        self.log_dir = os.path.join(self.root, "jobs")
+        self.spill_dir = os.path.join(self.root, "logs")
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def run_job(self, executor):
+        manager = JobManager(lambda: executor, log_dir=self.log_dir)
+        job = manager.start("yes | head -n 10000")
+        self.assertTrue(job.done.wait(10))
+        return manager, job
+
+    def test_job_log_is_complete_past_capture_cap(self):
+        lines = 10000 # 1,000,000 字节，远超 256KB 的捕获上限
+        executor = FakeExecExecutor(lines, max_output_bytes=256 * 1024, spill_dir=self.spill_dir,
+                                    stream_all_output=True)
+        manager, job = self.run_job(executor)
+        self.assertEqual(job.status, "succeeded")
+        with open(job.log_path, encoding="utf-8") as f:
+            self.assertEqual(f.read(), LINE * lines)
+        self.assertEqual(manager.tail(job.id, lines=1), LINE.rstrip("\n"))
+        # 完整输出只写入任务日志，不再另外落盘一份 exec-*.log
+        self.assertFalse(os.path.exists(self.spill_dir))
+        self.assertEqual(os.listdir(self.log_dir), [os.path.basename(job.log_path)])
+
+    def test_foreground_echo_stops_at_cap(self):
+        executor = FakeExecExecutor(10000, max_output_bytes=256 * 1024, spill_dir=self.spill_dir)
+        echoed = []
+        result = executor.run("yes", on_output=lambda stream, data: echoed.append(data))
+        self.assertIn("已暂停实时回显", echoed[-1])
+        self.assertLess(sum(len(d) for d in echoed), 300 * 1024)
+        with open(result["log_path"], encoding="utf-8") as f:
+            self.assertEqual(len(f.read()), 10000 * len(LINE))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+"""
+记忆检索索引的测试
+
+用法 (在项目根目录执行):
+    python -m pytest -q tests
+"""
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from memory_store import MemoryStore
+from memory_index import MemoryIndex
+
+
+class RecentLessonsTest(unittest.TestCase):
+    """recent() 兜底时应先注入最新的经验教训 (视图中经验教训按从新到旧存放)"""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix="alice-memory-index-")
+        self.ltm_path = os.path.join(self.root, "alice_memory.md")
+        self.stm_path = os.path.join(self.root, "short_term_memory.md")
+        self.store = MemoryStore(os.path.join(self.root, "alice_memory.db"), self.ltm_path, self.stm_path)
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def recent_lessons(self):
+        index = MemoryIndex({"ltm": self.ltm_path, "stm": self.stm_path})
+        index.sync()
+        return [e.text for e in index.recent(k=3, token_budget=10000) if e.source == "ltm"]
+
+    def test_dated_lessons_newest_first(self):
+        for date in ("2026-01-01", "2026-02-01", "2026-03-01"):
+            self.store.add_lesson(f"[{date}] 第 {date} 的教训")
+        self.assertEqual(self.recent_lessons(), [
+            "- [2026-03-01] 第 2026-03-01 的教训",
+            "- [2026-02-01] 第 2026-02-01 的教训",
+            "- [2026-01-01] 第 2026-01-01 的教训",
+        ])
+
+    def test_same_day_lessons_use_stored_order(self):
+        for n in ("一", "二", "三"):
+            self.store.add_lesson(f"[2026-05-01] 教训{n}")
+        self.assertEqual(self.recent_lessons(), [
+            "- [2026-05-01] 教训三",
+            "- [2026-05-01] 教训二",
+            "- [2026-05-01] 教训一",
+        ])
+
+
+if __name__ == "__main__":
+    unittest.main()
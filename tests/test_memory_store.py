@@ -0,0 +1,121 @@
+"""
+长期/短期记忆 SQLite 存储的测试
+
+用法 (在项目根目录执行):
+    python -m pytest -q tests
+"""
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from memory_store import MemoryStore
+
+
+class FailingDates:
+    """第二次遍历时抛出异常：complete_distill 会在写入提炼结果与检查点之后、删除短期记忆时失败"""
+    def __init__(self, dates):
+        self.dates = dates
+        self.iterations = 0
+
+    def __iter__(self):
+        self.iterations += 1
+        if self.iterations > 1:
+            raise RuntimeError("模拟提炼收尾中途失败")
+        return iter(self.dates)
+
+
+class MemoryStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix="alice-memory-store-")
+        self.db = os.path.join(self.root, "alice_memory.db")
+        self.ltm = os.path.join(self.root, "alice_memory.md")
+        self.stm = os.path.join(self.root, "short_term_memory.md")
+        self.store = self.open()
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def open(self):
+        return MemoryStore(self.db, self.ltm, self.stm)
+
+    def reopen(self):
+        self.store.close()
+        self.store = self.open()
+
+    def read(self, path):
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+
+    def fill(self):
+        self.store.add_stm("查询了天气", when=datetime(2026, 3, 1, 9, 30))
+        self.store.add_stm("生成了周报", when=datetime(2026, 3, 1, 18, 0))
+        self.store.add_stm("整理了目录", when=datetime(2026, 3, 2, 10, 15))
+        self.store.add_lesson("[2026-03-01] 先确认路径再删除")
+        self.store.complete_distill(["2026-02-20"], "用户偏好简洁的回答", distill_date="2026-02-20")
+
+    def test_views_round_trip_through_database(self):
+        self.fill()
+        ltm, stm = self.read(self.ltm), self.read(self.stm)
+        self.assertIn("## 2026-03-01\n- [09:30] 查询了天气\n- [18:00] 生成了周报\n\n## 2026-03-02\n- [10:15] 整理了目录", stm)
+        self.assertIn("## 经验教训\n- [2026-03-01] 先确认路径再删除\n\n### 自动提炼记忆 (2026-02-20)\n用户偏好简洁的回答", ltm)
+
+        # 换一个数据库从视图导入，渲染结果不变
+        self.store.close()
+        os.remove(self.db)
+        self.store = self.open()
+        self.assertEqual(self.store.render_ltm(), ltm)
+        self.assertEqual(self.store.render_stm(), stm)
+        self.assertEqual(self.store.stm_dates_before("2026-03-02"), ["2026-03-01"])
+
+    def test_manual_edit_of_view_is_imported_before_next_write(self):
+        self.fill()
+        with open(self.ltm, "a", encoding="utf-8") as f:
+            f.write("\n## 用户信息\n用户叫小李\n")
+        os.utime(self.ltm, (1, 1))
+        self.store.add_lesson("新的教训")
+        ltm = self.read(self.ltm)
+        self.assertIn("## 用户信息\n用户叫小李", ltm)
+        self.assertIn("## 经验教训\n- 新的教训\n- [2026-03-01] 先确认路径再删除", ltm)
+
+    def test_complete_distill_checkpoints_and_deletes(self):
+        self.fill()
+        self.store.complete_distill(["2026-03-01"], "周报每周五生成", distill_date="2026-03-01")
+        self.store.complete_distill(["2026-03-02"], None)
+        self.assertEqual(self.store.checkpoint("2026-03-01")[1], "distilled")
+        self.assertEqual(self.store.checkpoint("2026-03-02")[1], "nothing")
+        self.assertIsNone(self.store.checkpoint("2026-03-03"))
+        self.assertEqual(self.store.stm_dates_before("2099-01-01"), [])
+        self.reopen()
+        self.assertIn("### 自动提炼记忆 (2026-03-01)\n周报每周五生成", self.read(self.ltm))
+        self.assertEqual(self.store.checkpoint("2026-03-01")[1], "distilled")
+
+    def test_complete_distill_is_atomic(self):
+        self.fill()
+        ltm, stm = self.read(self.ltm), self.read(self.stm)
+        with self.assertRaises(RuntimeError):
+            self.store.complete_distill(FailingDates(["2026-03-01"]), "不应写入的提炼结果", distill_date="2026-03-01")
+        # 提炼结果、检查点与删除要么全部生效，要么全部不生效
+        self.assertIsNone(self.store.checkpoint("2026-03-01"))
+        self.assertEqual(self.store.stm_dates_before("2099-01-01"), ["2026-03-01", "2026-03-02"])
+        self.assertEqual((self.read(self.ltm), self.read(self.stm)), (ltm, stm))
+        self.reopen()
+        self.assertNotIn("不应写入", self.store.render_ltm())
+        # 失败后可以正常重试
+        self.store.complete_distill(["2026-03-01"], "重试成功", distill_date="2026-03-01")
+        self.assertEqual(self.store.stm_dates_before("2099-01-01"), ["2026-03-02"])
+
+    def test_delete_stm_dates(self):
+        self.fill()
+        self.store.delete_stm_dates(["2026-03-01"])
+        self.assertNotIn("查询了天气", self.read(self.stm))
+        self.assertIn("整理了目录", self.read(self.stm))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+"""
+工具输出有界捕获器的测试
+
+用法 (在项目根目录执行):
+    python -m pytest -q tests
+"""
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from output_capture import OutputCapture
+
+
+class OutputCaptureTest(unittest.TestCase):
+    def setUp(self):
+        self.spill_dir = tempfile.mkdtemp(prefix="alice-capture-")
+
+    def tearDown(self):
+        shutil.rmtree(self.spill_dir, ignore_errors=True)
+
+    def test_output_under_cap_is_kept_intact(self):
+        capture = OutputCapture(max_bytes=1000, spill_dir=self.spill_dir)
+        for i in range(90):
+            capture.write("stdout", f"line {i:03d}\n") # 9 字节 × 90 行 + stderr < 1000
+        capture.write("stderr", "warn\n")
+        result = capture.result(0)
+        self.assertEqual(result["stdout"], "".join(f"line {i:03d}\n" for i in range(90)))
+        self.assertEqual(result["stderr"], "warn\n")
+        self.assertIsNone(result["log_path"])
+        self.assertEqual(os.listdir(self.spill_dir), [])
+
+    def test_output_over_cap_spills_everything_then_truncates(self):
+        capture = OutputCapture(max_bytes=400, spill_dir=self.spill_dir)
+        lines = [f"line {i:03d}\n" for i in range(100)]
+        for i, line in enumerate(lines):
+            capture.write("stdout", line)
+            if i == 10:
+                capture.write("stderr", "boom\n")
+        result = capture.result(1)
+
+        self.assertEqual(result["total_bytes"], 905)
+        with open(result["log_path"], encoding="utf-8") as f:
+            self.assertEqual(f.read(), "".join(lines[:11]) + "[stderr] boom\n" + "".join(lines[11:]))
+        # 内存中每个流只保留 max_bytes / 4 的头部与尾部
+        stdout = result["stdout"]
+        self.assertTrue(stdout.startswith("line 000\n"))
+        self.assertTrue(stdout.endswith("line 099\n"))
+        self.assertIn(result["log_path"], stdout)
+        self.assertLess(len(stdout.encode("utf-8")), 400)
+        self.assertEqual(result["stderr"], "boom\n")
+
+    def test_multibyte_output_is_counted_in_bytes(self):
+        capture = OutputCapture(max_bytes=30, spill_dir=self.spill_dir)
+        capture.write("stdout", "中文" * 5) # 30 字节，恰好未超限
+        self.assertIsNone(capture.result(0)["log_path"])
+
+        capture = OutputCapture(max_bytes=30, spill_dir=self.spill_dir)
+        capture.write("stdout", "中文" * 5 + "!")
+        self.assertIsNotNone(capture.result(0)["log_path"])
+
+    def test_without_spill_dir_only_truncates(self):
+        capture = OutputCapture(max_bytes=100)
+        for i in range(50):
+            capture.write("stdout", f"{i:04d}\n")
+        result = capture.result(0)
+        self.assertIsNone(result["log_path"])
+        self.assertIn("字节已省略", result["stdout"])
+        self.assertTrue(result["stdout"].endswith("0049\n"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+"""
+持久化 Python 内核的测试 (内核 sandbox/alice_kernel.py 直接在本机解释器中运行，代替容器)
+
+用法 (在项目根目录执行):
+    python -m pytest -q tests
+"""
+import os
+import sys
+import time
+import subprocess
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# config 要求这两个变量存在；测试不会访问模型
+os.environ.setdefault("API_KEY", "test")
+os.environ.setdefault("MODEL_NAME", "test")
+
+from python_kernel import PythonKernel, KERNEL_SOURCE_PATH
+from sandbox_executor import SandboxExecutor
+
+
+class LocalExecutor(SandboxExecutor):
+    """在本机执行控制指令 (内核的中断信号)"""
+    def __init__(self):
+        super().__init__("alice-test", use_daemon=False)
+
+    def run(self, command, is_python_code=False, timeout=120, on_output=None):
+        proc = subprocess.run(["bash", "-c", command], capture_output=True, text=True, timeout=timeout)
+        return {"stdout": proc.stdout, "stderr": proc.stderr, "returncode": proc.returncode, "timed_out": False}
+
+
+class LocalKernel(PythonKernel):
+    def _kernel_command(self):
+        with open(KERNEL_SOURCE_PATH, 'r', encoding='utf-8') as f:
+            source = f.read()
+        return [sys.executable, "-u", "-c", source, "0"]
+
+
+class PythonKernelTest(unittest.TestCase):
+    def setUp(self):
+        self.kernel = LocalKernel("alice-test", LocalExecutor(), startup_timeout=10)
+        self.addCleanup(self.kernel.shutdown)
+
+    def test_state_persists_between_blocks(self):
+        self.kernel.run("x = 41")
+        result = self.kernel.run("print(x + 1)")
+        self.assertEqual(result["returncode"], 0)
+        self.assertEqual(result["stdout"].strip(), "42")
+
+    def test_timeout_counts_from_start_despite_steady_output(self):
+        # 每 0.2 秒输出一次：等待不能因为收到输出而重新计时
+        started = time.monotonic()
+        result = self.kernel.run("import time\ny = 1\nwhile True:\n    print('tick')\n    time.sleep(0.2)", timeout=1)
+        self.assertTrue(result["timed_out"])
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertIn("tick", result["stdout"])
+        # 软中断保留了内核状态
+        self.assertEqual(self.kernel.run("print(y)")["stdout"].strip(), "1")
+
+    def test_restart_waits_for_running_block(self):
+        results = []
+        runner = threading.Thread(target=lambda: results.append(
+            self.kernel.run("import time\ntime.sleep(1)\nprint('done')")))
+        self.kernel.run("z = 1")
+        runner.start()
+        time.sleep(0.3)
+        self.kernel.restart()
+        runner.join(10)
+        self.assertEqual(results[0]["returncode"], 0)
+        self.assertEqual(results[0]["stdout"].strip(), "done")
+        self.assertIn("NameError", self.kernel.run("print(z)")["stderr"])
+
+
+if __name__ == "__main__":
+    unittest.main()
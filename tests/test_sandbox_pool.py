@@ -0,0 +1,119 @@
+"""
+沙盒容器池的测试 (以记录调用的假 Docker API 代替守护进程)
+
+用法 (在项目根目录执行):
+    python -m pytest -q tests
+"""
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sandbox_pool import SandboxPool, RESET_SCRIPT
+
+
+class FakeStream:
+    def frames(self):
+        return iter(())
+
+    def close(self):
+        pass
+
+
+class FakeDockerAPI:
+    """只记录调用；容器创建后即视为运行中"""
+    def __init__(self):
+        self.containers = {}
+        self.calls = []
+        self._execs = {}
+
+    def inspect_container(self, name):
+        status = self.containers.get(name)
+        return {"State": {"Status": status}} if status else None
+
+    def create_container(self, name, config):
+        self.calls.append(("create", name))
+        self.containers[name] = "created"
+        return name
+
+    def start_container(self, name):
+        self.calls.append(("start", name))
+        self.containers[name] = "running"
+
+    def remove_container(self, name, force=False):
+        self.calls.append(("remove", name))
+        self.containers.pop(name, None)
+
+    def exec_create(self, container, cmd, workdir=None, env=None):
+        exec_id = f"exec-{len(self._execs)}"
+        self._execs[exec_id] = (container, cmd)
+        return exec_id
+
+    def exec_start(self, exec_id, detach=False):
+        container, cmd = self._execs[exec_id]
+        if cmd[-1] == RESET_SCRIPT:
+            self.calls.append(("reset", container))
+        return FakeStream()
+
+
+class SandboxPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.lease_dir = tempfile.mkdtemp(prefix="alice-pool-")
+        # 清理按注册的相反顺序执行：测试中登记的租约先归还，最后删除租约目录
+        self.addCleanup(shutil.rmtree, self.lease_dir, ignore_errors=True)
+        self.api = FakeDockerAPI()
+
+    def new_pool(self, size=2, max_uses=50):
+        # 每个 SandboxPool 实例各自打开锁文件，相当于一个独立的 Alice 进程
+        return SandboxPool(self.api, {"Image": "alice"}, size=size, max_uses=max_uses, lease_dir=self.lease_dir)
+
+    def test_leases_are_exclusive_across_pools(self):
+        a, b = self.new_pool(), self.new_pool()
+        first = a.acquire(timeout=1)
+        second = b.acquire(timeout=1)
+        self.assertNotEqual(first.container_name, second.container_name)
+        self.assertEqual(a.metrics()["idle"], 0)
+        first.release()
+        third = b.acquire(timeout=1)
+        self.addCleanup(third.release)
+        self.addCleanup(second.release)
+        self.assertEqual(third.container_name, first.container_name)
+
+    def test_acquire_times_out_when_all_slots_are_held(self):
+        holder = self.new_pool(size=1).acquire(timeout=1)
+        with self.assertRaises(TimeoutError):
+            self.new_pool(size=1).acquire(timeout=0.3, poll_interval=0.05)
+        holder.release()
+
+    def test_release_resets_and_unclean_slot_is_reset_before_reuse(self):
+        pool = self.new_pool(size=1)
+        pool.acquire(timeout=1).release()
+        self.assertEqual(self.api.calls.count(("reset", "alice-sandbox-pool-0")), 1)
+
+        # 持有者未归还就退出：锁随文件关闭释放，下一位租用前补做重置
+        lease = pool.acquire(timeout=1)
+        lease.lock_file.close()
+        lease.lock_file = None
+        self.api.calls.clear()
+        self.addCleanup(self.new_pool(size=1).acquire(timeout=1).release)
+        self.assertEqual(self.api.calls, [("reset", "alice-sandbox-pool-0")])
+
+    def test_container_is_recycled_after_max_uses(self):
+        pool = self.new_pool(size=1, max_uses=2)
+        for _ in range(2):
+            pool.acquire(timeout=1).release()
+        self.api.calls.clear()
+        self.addCleanup(pool.acquire(timeout=1).release)
+        self.assertEqual(self.api.calls[:3], [
+            ("remove", "alice-sandbox-pool-0"),
+            ("create", "alice-sandbox-pool-0"),
+            ("start", "alice-sandbox-pool-0"),
+        ])
+        self.assertEqual(pool.metrics()["uses"], {"alice-sandbox-pool-0": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+"""
+即时对话背景追加式日志的测试
+
+用法 (在项目根目录执行):
+    python -m pytest -q tests
+"""
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from working_memory import WorkingMemoryJournal, VIEW_HEADER, ROUND_MARKER
+
+
+class WorkingMemoryJournalTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix="alice-working-memory-")
+        self.view = os.path.join(self.root, "working_memory.md")
+        self.journal_dir = os.path.join(self.root, "journal")
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def journal(self, max_rounds=5):
+        return WorkingMemoryJournal(self.view, self.journal_dir, max_rounds=max_rounds)
+
+    def read_view(self):
+        with open(self.view, encoding="utf-8") as f:
+            return f.read()
+
+    def test_rounds_survive_restart(self):
+        j = self.journal()
+        j.append("USER: 你好")
+        j.append("USER: 第二轮\nALICE_RESPONSE: 好的")
+        self.assertEqual(self.read_view(), VIEW_HEADER + f"{ROUND_MARKER}\nUSER: 你好\n\n{ROUND_MARKER}\nUSER: 第二轮\nALICE_RESPONSE: 好的\n\n")
+        self.assertEqual(list(self.journal().rounds), ["USER: 你好", "USER: 第二轮\nALICE_RESPONSE: 好的"])
+
+    def test_torn_tail_is_dropped_and_next_record_is_not_glued_to_it(self):
+        j = self.journal()
+        j.append("one")
+        segment = os.path.join(self.journal_dir, "seg-000001.jsonl")
+        with open(segment, "a", encoding="utf-8") as f:
+            f.write('{"round": "half wri') # 崩溃时写了一半的记录
+        j = self.journal()
+        self.assertEqual(list(j.rounds), ["one"])
+        j.append("two")
+        self.assertEqual(list(self.journal().rounds), ["one", "two"])
+        with open(segment, encoding="utf-8") as f:
+            self.assertEqual(len(f.read().splitlines()), 2)
+
+    def test_old_segments_are_compacted(self):
+        j = self.journal(max_rounds=3)
+        for i in range(10):
+            j.append(f"round {i}")
+        self.assertLessEqual(len(os.listdir(self.journal_dir)) - 1, 2) # 另有一个视图指纹文件
+        self.assertEqual(list(self.journal(max_rounds=3).rounds), ["round 7", "round 8", "round 9"])
+        self.assertNotIn("round 6", self.read_view())
+
+    def test_existing_view_is_imported(self):
+        with open(self.view, "w", encoding="utf-8") as f:
+            f.write(VIEW_HEADER + f"{ROUND_MARKER}\nold one\n\n{ROUND_MARKER}\nold two\n\n")
+        j = self.journal()
+        self.assertEqual(list(j.rounds), ["old one", "old two"])
+        j.append("new")
+        self.assertEqual(list(self.journal().rounds), ["old one", "old two", "new"])
+
+    def test_external_edit_of_view_is_kept(self):
+        j = self.journal()
+        j.append("secret")
+        j.append("keep")
+        with open(self.view, "w", encoding="utf-8") as f:
+            f.write(VIEW_HEADER + f"{ROUND_MARKER}\nkeep (edited)\n\n")
+        os.utime(self.view, (1, 1))
+        j.append("next")
+        self.assertEqual(list(j.rounds), ["keep (edited)", "next"])
+        self.assertNotIn("secret", self.read_view())
+        self.assertEqual(list(self.journal().rounds), ["keep (edited)", "next"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import re
+
+# tiktoken 为可选依赖：宿主机未安装时退化为字符级估算
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    _encoding = None
+
+# 中日韩字符通常 1 字 ≈ 1 token，其余文本约 4 字符 ≈ 1 token
+_CJK_RE = re.compile(r'[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef]')
+
+
+def count_tokens(text):
+    """估算文本的 token 数量"""
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+class TokenLedger:
+    """
+    按上下文组件的本地 token 统计
+    measure() 在构建上下文时统计各组件 (内容不变的组件复用上次结果)，record() 累计每次请求的分项，
+    report() 生成本次会话的累计报告，用于判断究竟是哪一部分撑大了请求。
+    """
+    def __init__(self):
+        self.requests = 0
+        self.totals = {} # 组件 -> 累计 token
+        self.prompt_tokens = 0 # 服务端报告的累计值
+        self.completion_tokens = 0
+        self.cached_tokens = 0
+        self._cache = {} # 组件 -> (文本, token 数)
+
+    def measure(self, parts):
+        """{组件: 文本} -> {组件: token 数}"""
+        counts = {}
+        for name, text in parts.items():
+            cached = self._cache.get(name)
+            if cached is None or cached[0] != text:
+                cached = (text, count_tokens(text))
+                self._cache[name] = cached
+            counts[name] = cached[1]
+        return counts
+
+    def record(self, counts):
+        self.requests += 1
+        for name, n in counts.items():
+            self.totals[name] = self.totals.get(name, 0) + n
+
+    def record_usage(self, prompt, completion, cached=0):
+        self.prompt_tokens += prompt or 0
+        self.completion_tokens += completion or 0
+        self.cached_tokens += cached or 0
+
+    def report(self):
+        total = sum(self.totals.values())
+        lines = [f"本次会话共 {self.requests} 次请求，本地统计提示词 {total} tokens "
+                 f"(服务端: 提示词 {self.prompt_tokens}，补全 {self.completion_tokens}，缓存命中 {self.cached_tokens})"]
+        for name, n in sorted(self.totals.items(), key=lambda kv: -kv[1]):
+            share = n / total * 100 if total else 0
+            lines.append(f"  {name}: 累计 {n} / 平均 {n // max(self.requests, 1)} tokens ({share:.1f}%)")
+        return "\n".join(lines)
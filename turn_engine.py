@@ -0,0 +1,268 @@
+import time
+import asyncio
+import logging
+import config
+from stream_manager import StreamManager
+from execution_scheduler import extract_code_blocks
+
+logger = logging.getLogger("TurnEngine")
+
+# 中断后等待被杀死的代码块真正退出的上限 (秒)
+CANCEL_SETTLE_TIMEOUT = 2
+
+# 兼容多种模型的思考字段
+THINK_NAMES = ['reasoning_content', 'reasoningContent', 'reasoning', 'thought', 'thought_content', 'thoughtContent']
+
+
+def get_val(obj, names):
+    """极度兼容的读取函数：属性、字典与 Pydantic 额外字段依次尝试"""
+    for name in names:
+        # 1. 直接属性访问
+        res = getattr(obj, name, None)
+        if res: return res
+        # 2. 字典访问
+        if isinstance(obj, dict):
+            res = obj.get(name)
+            if res: return res
+        # 3. Pydantic 额外字段访问
+        if hasattr(obj, 'model_extra') and obj.model_extra:
+            res = obj.model_extra.get(name)
+            if res: return res
+    return ""
+
+
+def cached_prompt_tokens(usage):
+    """命中服务端前缀缓存的提示词 token 数 (OpenAI: prompt_tokens_details.cached_tokens，DeepSeek: prompt_cache_hit_tokens)"""
+    details = get_val(usage, ['prompt_tokens_details'])
+    cached = get_val(details, ['cached_tokens']) if details else 0
+    return int(cached or get_val(usage, ['prompt_cache_hit_tokens']) or 0)
+
+
+class TurnEngine:
+    """
+    基于 asyncio 的回合引擎 (TUI 桥接层与控制台模式共用)
+    一个回合 = 流式请求模型 -> 执行代码块 -> 回填执行反馈 -> 再次请求，直到回复中不再包含代码块。
+    模型流与工具执行都在同一个事件循环中等待，回合本身是一个普通的 asyncio Task。
+    interrupt() 会取消该 Task：关闭模型的 HTTP 响应、取消排队中的代码块，并杀死容器内正在执行的进程组，
+    中断到空闲的耗时随 done 状态消息一并上报 (interrupt_latency_ms)。
+    所有进度通过 emit(msg) 以 TUI 桥接协议的消息格式推送。
+    """
+    def __init__(self, agent, emit):
+        self.agent = agent
+        self.emit = emit
+        self._loop = None
+        self._task = None # 当前回合的 Task
+        self._interrupt_at = None # 收到中断的时间点
+        self._futures = [] # 本轮已提交的代码块 Future
+        self._reply = {"content": "", "thinking": ""} # 当前正在生成的回复 (中断时用于更新即时记忆)
+
+    def interrupt(self):
+        """硬中断当前回合 (须在事件循环线程中调用)，返回是否确有回合被中断"""
+        task = self._task
+        if task is None or task.done() or self._interrupt_at is not None:
+            return False
+        self._interrupt_at = time.monotonic()
+        task.cancel()
+        return True
+
+    def _tool_output(self, stream, data):
+        """代码块执行线程中的实时输出，转交事件循环线程推送，保证与其他消息的先后顺序"""
+        try:
+            self._loop.call_soon_threadsafe(self.emit, {"type": "tool_output", "stream": stream, "content": data})
+        except RuntimeError:
+            pass # 事件循环已关闭
+
+    async def run_turn(self, user_input):
+        agent = self.agent
+        self._loop = asyncio.get_running_loop()
+        self._task = asyncio.current_task()
+        self._interrupt_at = None
+        self._futures = []
+        # 后台记忆提炼完成后 (或记忆需按本回合输入重新检索时)，在回合开始前载入新的记忆；
+        # 同时等待上一回合被中断时仍在线程中运行的上下文刷新结束，之后才能改动 agent.messages
+        agent.set_memory_query(user_input)
+        await self._loop.run_in_executor(None, agent.refresh_context_if_stale)
+        agent.messages.append({"role": "user", "content": user_input})
+
+        speculative = None
+        streaming = False
+        try:
+            while True:
+                # 流式提前执行：代码块一闭合即派发
+                speculative = agent.new_speculative_dispatcher(on_output=self._tool_output) if config.SPECULATIVE_EXECUTION else None
+
+                streaming = True
+                reply = await self._stream_reply(speculative)
+                streaming = False
+
+                # 检查工具调用 (保持源码顺序)
+                blocks = extract_code_blocks(reply["content"])
+                # 更新即时记忆 (过滤代码块)
+                agent._update_working_memory(user_input, reply["thinking"], reply["content"])
+                agent.messages.append({"role": "assistant", "content": reply["content"]})
+
+                if not blocks:
+                    logger.info("回复完成，未检测到工具调用。")
+                    if speculative:
+                        speculative.cancel_all()
+                    break
+
+                self.emit({"type": "status", "content": "executing_tool"})
+                results = await self._run_blocks(blocks, speculative)
+
+                agent.messages.append({"role": "user", "content": agent.build_tool_feedback(results)})
+                # 刷新上下文涉及磁盘扫描，放到线程中执行
+                await self._loop.run_in_executor(None, agent._refresh_context)
+                logger.info("系统快照已更新，反馈给 Alice。")
+        except asyncio.CancelledError:
+            logger.info("回合已被中断。")
+            if streaming:
+                reply = self._reply
+                agent._update_working_memory(user_input, reply["thinking"], reply["content"])
+            await self._abort(speculative)
+            latency_ms = int((time.monotonic() - (self._interrupt_at or time.monotonic())) * 1000)
+            logger.info(f"中断完成，耗时 {latency_ms} ms")
+            self.emit({"type": "status", "content": "done", "interrupt_latency_ms": latency_ms})
+            raise
+        finally:
+            self._task = None
+        self.emit({"type": "status", "content": "done"})
+
+    async def _stream_reply(self, speculative):
+        """流式请求模型，边接收边推送，返回完整的 {"content", "thinking"}"""
+        agent = self.agent
+        reply = self._reply = {"content": "", "thinking": ""}
+
+        logger.info("开始流式请求 (chat.completions.create)...")
+        self.emit({"type": "status", "content": "thinking"})
+        # 本地分项统计：看清是哪一部分撑大了请求
+        total, components = agent.token_breakdown()
+        logger.info(f"请求 token 分项 (本地统计 {total}): " + " | ".join(f"{name} {n}" for name, n in components))
+        self.emit({"type": "tokens_breakdown", "total": total, "components": components})
+        response = await agent.async_client.chat.completions.create(
+            model=agent.model_name,
+            messages=agent.request_messages(),
+            stream=True,
+            stream_options={"include_usage": True},
+            extra_body={"enable_thinking": True}
+        )
+
+        # 初始化流管理器 (滑动窗口预判)
+        stream_mgr = StreamManager(
+            max_buffer_size=10*1024*1024,  # 10MB 限制
+            on_code_block=speculative.dispatch_text if speculative else None
+        )
+
+        try:
+            async for chunk in response:
+                self._handle_chunk(chunk, reply, stream_mgr, speculative)
+        finally:
+            # 中断时主动关闭 HTTP 响应，立即释放连接 (服务端随之停止生成)
+            await response.close()
+
+        # 强制冲刷管理器缓冲区
+        final_msgs = stream_mgr.flush()
+        if final_msgs:
+            logger.info(f"强制冲刷 StreamManager 缓冲区: {final_msgs}")
+            for msg in final_msgs:
+                self.emit(msg)
+        return reply
+
+    def _handle_chunk(self, chunk, reply, stream_mgr, speculative=None):
+        """处理一个流式 chunk：推送 token 用量、思考内容与正文"""
+        # 获取 Token 使用情况
+        if getattr(chunk, 'usage', None):
+            usage = chunk.usage
+            cached = cached_prompt_tokens(usage)
+            self.agent.token_ledger.record_usage(usage.prompt_tokens, usage.completion_tokens, cached)
+            if cached:
+                logger.info(f"提示词前缀缓存命中 {cached}/{usage.prompt_tokens} tokens")
+            self.emit({
+                "type": "tokens",
+                "total": usage.total_tokens,
+                "prompt": usage.prompt_tokens,
+                "completion": usage.completion_tokens,
+                "cached": cached
+            })
+
+        if not chunk.choices:
+            return
+        choice = chunk.choices[0]
+        delta = getattr(choice, 'delta', None) or choice
+
+        # 诊断日志：仅在每一轮对话的第一个 chunk 记录结构
+        if not reply["content"] and not reply["thinking"]:
+            try:
+                d_keys = list(delta.keys()) if isinstance(delta, dict) else list(getattr(delta, '__dict__', {}).keys())
+                if hasattr(delta, 'model_extra') and delta.model_extra:
+                    d_keys += [f"extra:{k}" for k in delta.model_extra.keys()]
+                logger.info(f"探测到响应结构: Delta_Keys={d_keys}")
+            except Exception: pass
+
+        t_chunk = get_val(delta, THINK_NAMES)
+        # 如果 delta 里没找到，尝试在 choice 级找 (某些非标代理)
+        if not t_chunk: t_chunk = get_val(choice, THINK_NAMES)
+        c_chunk = get_val(delta, ['content'])
+
+        if t_chunk:
+            reply["thinking"] += t_chunk
+            self.emit({"type": "thinking", "content": t_chunk})
+
+        if c_chunk: # 同一 chunk 中可能同时包含两种内容
+            reply["content"] += c_chunk
+            if speculative:
+                speculative.feed(c_chunk)
+            # 通过流管理器处理内容块 (保留延迟机制，确保 UI 不出现代码块碎屑)
+            for msg in stream_mgr.process_chunk(c_chunk):
+                self.emit(msg)
+
+    async def _run_blocks(self, blocks, speculative):
+        """提交本轮代码块并在事件循环中等待全部完成，返回 [(标题, 输出文本), ...]"""
+        futures = self._futures = self.agent.submit_code_blocks(blocks, on_output=self._tool_output, speculative=speculative)
+        # asyncio.wait 不会因单个代码块被取消而抛出 CancelledError，只有回合本身被取消时才会
+        await asyncio.wait([asyncio.wrap_future(f) for f in futures])
+        return self.agent.collect_code_results(blocks, futures)
+
+    async def _abort(self, speculative):
+        """回合被取消后的清理：取消排队中的代码块，杀死正在执行的进程组，并等待其真正退出"""
+        agent = self.agent
+        futures = list(self._futures)
+        if speculative:
+            futures += [f for _, f in speculative.dispatched]
+            speculative.cancel_all()
+        # 中断内核需要经由容器执行通道发送信号，放到线程中避免阻塞事件循环
+        await self._loop.run_in_executor(None, agent.interrupt)
+        pending = [f for f in futures if not f.done()]
+        if pending:
+            _, still_running = await asyncio.wait([asyncio.wrap_future(f) for f in pending], timeout=CANCEL_SETTLE_TIMEOUT)
+            if still_running:
+                logger.warning(f"{len(still_running)} 个代码块在中断后 {CANCEL_SETTLE_TIMEOUT} 秒内仍未退出")
+        agent.interrupted = False
+
+
+class ConsoleRenderer:
+    """控制台模式下的消息渲染，把回合引擎推送的 TUI 协议消息直接打印到终端"""
+    def __init__(self, model_name):
+        self.model_name = model_name
+        self.rounds = 0
+        self.answering = False
+
+    def __call__(self, msg):
+        kind = msg.get("type")
+        if kind == "status" and msg.get("content") == "thinking":
+            if self.rounds:
+                print(f"\n{'-'*40}\n系统快照已更新，结果已反馈给 Alice，继续生成中...")
+            print(f"\n{'='*20} Alice 正在思考 ({self.model_name}) {'='*20}")
+            self.rounds += 1
+            self.answering = False
+        elif kind == "content":
+            if not self.answering:
+                print('\n\n' + "="*20 + " Alice 的回答 " + "="*20 + '\n')
+                self.answering = True
+            print(msg["content"], end='', flush=True)
+        elif kind in ("thinking", "tool_output"):
+            print(msg["content"], end='', flush=True)
+        elif kind == "status" and msg.get("interrupt_latency_ms") is not None:
+            print(f"\n[已中断，耗时 {msg['interrupt_latency_ms']} ms]")
+        elif kind == "error":
+            print(f"\n[错误]: {msg.get('content')}")
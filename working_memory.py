@@ -0,0 +1,174 @@
+import os
+import re
+import json
+import logging
+import threading
+from collections import deque
+
+from context_builder import file_fingerprint
+
+logger = logging.getLogger("WorkingMemory")
+
+VIEW_HEADER = "# Alice 的即时对话背景 (Working Memory)\n\n"
+ROUND_MARKER = "--- ROUND ---"
+
+
+def _atomic_write(path, content):
+    """先写临时文件并落盘，再原子替换，写入中途崩溃不会留下截断的文件"""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class WorkingMemoryJournal:
+    """
+    即时对话背景的追加式日志
+    每轮对话以一行 JSON 追加到当前分段 (seg-NNNNNN.jsonl)，内存中用定长环形缓冲保存最近 max_rounds 轮，
+    再原子地渲染为 markdown 视图 (memory/working_memory.md)。每轮的开销只与窗口大小有关，与历史总量无关。
+    每个分段最多 max_rounds 条记录，最近两个分段已覆盖整个窗口，更早的分段在滚动时删除 (压缩)。
+    日志目录丢失时，从现有的 markdown 视图导入历史轮次。
+    每次渲染后记录视图的指纹 (mtime/size)；视图在磁盘上被修改或清空 (人工或模型编辑) 时，
+    以视图内容为准重建日志后再追加，不会覆盖这些修改。
+    """
+    def __init__(self, view_path, journal_dir, max_rounds=30):
+        self.view_path = view_path
+        self.journal_dir = journal_dir
+        self.max_rounds = max(max_rounds, 1)
+        self.rounds = deque(maxlen=self.max_rounds)
+        self._segment = None # 当前分段编号
+        self._segment_records = 0
+        self._fingerprint_path = os.path.join(journal_dir, "view.fingerprint")
+        self._lock = threading.Lock()
+        self._load()
+
+    # ------------------------------------------------------------------
+    # 分段
+    # ------------------------------------------------------------------
+    def _segment_path(self, seq):
+        return os.path.join(self.journal_dir, f"seg-{seq:06d}.jsonl")
+
+    def _segments(self):
+        try:
+            names = os.listdir(self.journal_dir)
+        except FileNotFoundError:
+            return []
+        return sorted(int(m.group(1)) for m in (re.match(r"^seg-(\d+)\.jsonl$", n) for n in names) if m)
+
+    @staticmethod
+    def _read_segment(path):
+        """读取分段中的轮次；末尾写了一半的记录 (崩溃所致) 直接丢弃"""
+        rounds = []
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                try:
+                    rounds.append(json.loads(line)["round"])
+                except (ValueError, KeyError, TypeError):
+                    continue
+        return rounds
+
+    def _load(self):
+        os.makedirs(self.journal_dir, exist_ok=True)
+        segments = self._segments()
+        if not segments:
+            self._import_view()
+            return
+        self._repair_tail(self._segment_path(segments[-1]))
+        for seq in segments[-2:]:
+            records = self._read_segment(self._segment_path(seq))
+            self.rounds.extend(records)
+            self._segment, self._segment_records = seq, len(records)
+        self._check_view()
+
+    @staticmethod
+    def _repair_tail(path):
+        """截掉末尾未写完的记录，避免后续追加的记录与之粘连"""
+        with open(path, "rb+") as f:
+            data = f.read()
+            if data and not data.endswith(b"\n"):
+                f.truncate(data.rfind(b"\n") + 1)
+                logger.warning(f"已丢弃 {path} 末尾未写完的记录")
+
+    def _import_view(self):
+        """首次启用日志：把现有 markdown 视图中的轮次写入第一个分段"""
+        self._segment, self._segment_records = 1, 0
+        if not os.path.exists(self.view_path):
+            return
+        with open(self.view_path, "r", encoding="utf-8") as f:
+            content = f.read()
+        rounds = [r.strip() for r in re.split(rf"^{ROUND_MARKER}\n", content, flags=re.MULTILINE)]
+        # 去掉视图标题 (旧版本可能把标题重复写进了轮次中)
+        rounds = [r.replace(VIEW_HEADER.strip(), "").strip() for r in rounds]
+        rounds = [r for r in rounds if r][-self.max_rounds:]
+        if rounds:
+            with open(self._segment_path(1), "a", encoding="utf-8") as f:
+                for r in rounds:
+                    f.write(json.dumps({"round": r}, ensure_ascii=False) + "\n")
+            self.rounds.extend(rounds)
+            self._segment_records = len(rounds)
+            logger.info(f"已从 {self.view_path} 导入 {len(rounds)} 轮即时对话背景")
+
+    # ------------------------------------------------------------------
+    # 视图一致性
+    # ------------------------------------------------------------------
+    def _view_fingerprint(self):
+        fp = file_fingerprint(self.view_path)
+        return f"{fp[0]}:{fp[1]}" if fp else "missing"
+
+    def _recorded_fingerprint(self):
+        try:
+            with open(self._fingerprint_path, "r", encoding="utf-8") as f:
+                return f.read().strip()
+        except OSError:
+            return None
+
+    def _check_view(self):
+        """视图与上次渲染时不一致：丢弃日志，从视图重新导入 (尚无记录时视为一致)"""
+        recorded = self._recorded_fingerprint()
+        if recorded is None or recorded == self._view_fingerprint():
+            return
+        logger.info(f"{self.view_path} 已在外部被修改，以视图内容为准重建即时对话背景日志")
+        for seq in self._segments():
+            try:
+                os.remove(self._segment_path(seq))
+            except OSError:
+                pass
+        self.rounds.clear()
+        self._import_view()
+        _atomic_write(self._fingerprint_path, self._view_fingerprint())
+
+    def _rotate(self):
+        """当前分段写满后开启新分段，并删除窗口之外的旧分段"""
+        self._segment += 1
+        self._segment_records = 0
+        for seq in self._segments():
+            if seq < self._segment - 1:
+                try:
+                    os.remove(self._segment_path(seq))
+                except OSError:
+                    pass
+
+    # ------------------------------------------------------------------
+    # 写入与渲染
+    # ------------------------------------------------------------------
+    def append(self, round_text):
+        """追加一轮对话并刷新 markdown 视图"""
+        with self._lock:
+            self._check_view()
+            if self._segment_records >= self.max_rounds:
+                self._rotate()
+            with open(self._segment_path(self._segment), "a", encoding="utf-8") as f:
+                f.write(json.dumps({"round": round_text}, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._segment_records += 1
+            self.rounds.append(round_text)
+            self._render()
+
+    def _render(self):
+        content = VIEW_HEADER + "".join(f"{ROUND_MARKER}\n{r}\n\n" for r in self.rounds)
+        os.makedirs(os.path.dirname(self.view_path) or ".", exist_ok=True)
+        _atomic_write(self.view_path, content)
+        _atomic_write(self._fingerprint_path, self._view_fingerprint())